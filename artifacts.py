@@ -0,0 +1,181 @@
+"""静态发布产物模块
+
+为 repo.xml 生成预压缩文件（.gz / .br）和清单文件，供 nginx gzip_static /
+brotli_static 直接使用。预压缩文件和清单由仓库XML的临时文件生成，全部生成后与仓库XML
+一起重命名替换，客户端不会读到写了一半或与repo.xml内容不一致的文件。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时不生成.br文件
+    brotli = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _file_info(path: str) -> Dict[str, Any]:
+    """计算文件大小和sha256"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return {"size": os.path.getsize(path), "sha256": sha256.hexdigest()}
+
+
+def _gzip_to(source: str) -> Callable[[Any], None]:
+    def write(dst):
+        # mtime固定为0，相同内容生成相同的压缩文件
+        with open(source, "rb") as src, gzip.GzipFile(
+            filename="", mode="wb", fileobj=dst, compresslevel=9, mtime=0
+        ) as gz:
+            shutil.copyfileobj(src, gz, CHUNK_SIZE)
+
+    return write
+
+
+def _brotli_to(source: str) -> Callable[[Any], None]:
+    def write(dst):
+        compressor = brotli.Compressor(quality=11)
+        with open(source, "rb") as src:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dst.write(compressor.process(chunk))
+        dst.write(compressor.finish())
+
+    return write
+
+
+def manifest_path(xml_file: str) -> str:
+    """清单文件路径"""
+    return f"{xml_file}.manifest.json"
+
+
+class ArtifactWriter:
+    """由仓库XML的临时文件生成预压缩文件和清单，与仓库XML文件一起替换
+
+    使用方法：
+        artifacts = ArtifactWriter("repo.xml")
+        artifacts.prepare("repo.xml.tmp", cachechk)
+        artifacts.commit("repo.xml.tmp")   # 依次替换.gz/.br、repo.xml和清单
+
+    未安装brotli时不生成.br，之前构建留下的repo.xml.br在替换前删除。
+
+    所有文件都生成后才开始替换，替换过程只有几次重命名，
+    客户端不会拿到与repo.xml内容不一致的预压缩文件或清单。
+    """
+
+    def __init__(self, xml_file: str):
+        self.xml_file = xml_file
+        # (临时文件, 正式文件)，清单在最后
+        self._pending: List[Tuple[str, str]] = []
+        # 本次不再生成、需要在替换时删除的旧预压缩文件
+        self._stale: List[str] = []
+
+    def prepare(
+        self, source_file: str, cachechk: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        生成预压缩文件和清单的临时文件
+
+        Args:
+            source_file: 仓库XML的内容所在的文件（通常为尚未替换的临时文件）
+            cachechk: 本次构建的<cachechk>值，写入清单供参考
+
+        Returns:
+            清单内容
+        """
+        self.discard()
+        info = _file_info(source_file)
+        manifest: Dict[str, Any] = {
+            "file": os.path.basename(self.xml_file),
+            "size": info["size"],
+            "sha256": info["sha256"],
+            # 强ETag，内容不变则ETag不变
+            "etag": f'"{info["sha256"]}"',
+            "cachechk": cachechk,
+            "encodings": {},
+        }
+
+        encoders = {"gzip": (".gz", _gzip_to)}
+        if brotli is not None:
+            encoders["br"] = (".br", _brotli_to)
+        else:
+            print("未安装brotli，跳过生成.br文件")
+            # 之前构建留下的.br与新的repo.xml不一致，替换时删除
+            self._stale.append(self.xml_file + ".br")
+
+        try:
+            for encoding, (suffix, encoder) in encoders.items():
+                path = self.xml_file + suffix
+                temp_file = self._write_temp(path, encoder(source_file))
+                manifest["encodings"][encoding] = dict(
+                    _file_info(temp_file), file=os.path.basename(path)
+                )
+
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+            self._write_temp(manifest_path(self.xml_file), lambda f: f.write(data))
+        except BaseException:
+            self.discard()
+            raise
+        return manifest
+
+    def commit(self, source_file: Optional[str] = None) -> None:
+        """
+        替换预压缩文件、仓库XML文件和清单
+
+        Args:
+            source_file: 仓库XML的临时文件，在预压缩文件之后、清单之前替换为正式文件；
+                为None时仓库XML文件已经就位
+        """
+        pending, self._pending = self._pending, []
+        stale, self._stale = self._stale, []
+        *encoded, manifest = pending
+        # 先删除不再生成的预压缩文件，不会有旧内容与新的repo.xml同时提供
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        for temp_file, path in encoded:
+            os.replace(temp_file, path)
+        if source_file is not None:
+            os.replace(source_file, self.xml_file)
+        os.replace(*manifest)
+
+    def discard(self) -> None:
+        """删除尚未替换的临时文件"""
+        for temp_file, _ in self._pending:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        self._pending = []
+        self._stale = []
+
+    def _write_temp(self, path: str, write: Callable[[Any], None]) -> str:
+        temp_file = f"{path}.tmp"
+        self._pending.append((temp_file, path))
+        with open(temp_file, "wb") as f:
+            write(f)
+        return temp_file
+
+
+def write_artifacts(xml_file: str, cachechk: Optional[str] = None) -> Dict[str, Any]:
+    """
+    为已经就位的仓库XML文件生成预压缩文件和清单文件
+
+    Args:
+        xml_file: 已生成的仓库XML文件路径
+        cachechk: 本次构建的<cachechk>值，写入清单供参考
+
+    Returns:
+        清单内容
+    """
+    artifacts = ArtifactWriter(xml_file)
+    manifest = artifacts.prepare(xml_file, cachechk)
+    artifacts.commit()
+    return manifest
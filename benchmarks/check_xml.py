@@ -0,0 +1,187 @@
+"""XML写入器差异检查
+
+用合成目录（见synthetic.py）及一组边界情况（需要转义的字符、None、缺少的字段、
+单个平台字典、非字符串的publishedDate等）分别用lxml写入器和快速写入器生成仓库XML，
+比较输出是否逐字节一致：
+
+- RepoXmlWriter 与 FastRepoXmlWriter 的流式输出
+- update_repo() 一次性构建XML树的输出与 xml_writer="fast" 的输出
+- 按platformID拆分的平台文件
+- 两者对不合法文本（控制字符、非字符串）抛出相同类型的异常
+
+用法：
+    python benchmarks/check_xml.py [--apps 2000] [--platforms 3]
+
+存在差异时输出第一个不同的位置并以非0状态退出。边界情况的逐字节比较已由
+tests/test_xml_writers.py 在pytest中覆盖，此脚本用于大量合成数据的比较。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_sources import SQLiteDataSource  # noqa: E402
+from data_sources.base import FIELD_ORDER, DataSource  # noqa: E402
+from data_sources.records import to_plain  # noqa: E402
+from update_repo import FastRepoXmlWriter, RepoXmlWriter, update_repo  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import CatalogSpec, generate_sql_rows  # noqa: E402
+
+CACHECHK = "202401010000"
+
+
+def edge_cases() -> List[Dict[str, Any]]:
+    """需要特殊处理的应用数据"""
+    return [
+        {
+            "name": "A & B <beta> \"quoted\" 'single' ]]>",
+            "changeLog": "line1\nline2\r\nline3\ttab",
+            "description": "中文描述 \U0001F600 \u2028 \x7f\x85",
+            "version": "",
+            "platform": [
+                {"platformID": "TS-NASX86", "location": "http://x/?a=1&b=2"},
+                {"platformID": "TS-X41", "location": None, "signature": "abc"},
+            ],
+            "internalName": "edge1",
+            "publishedDate": 20240101,
+            "language": None,
+        },
+        {
+            "internalName": "edge2",
+            "platform": {"platformID": "TS-X19", "location": "<single>"},
+            "publishedDate": None,
+        },
+        {"internalName": "edge3", "platform": [], "icon80": None, "snapshot": " "},
+        {},
+    ]
+
+
+def synthetic_apps(spec: CatalogSpec) -> list:
+    """合成目录经SQLite数据源规范化后的记录"""
+    # 不建立连接，只使用规范化
+    source = SQLiteDataSource.__new__(SQLiteDataSource)
+    DataSource.__init__(source)
+    normalize = source._compile_row_normalizer(FIELD_ORDER)
+    return [
+        normalize(tuple(row[name] for name in FIELD_ORDER))
+        for row in generate_sql_rows(spec)
+    ]
+
+
+def write(writer_class: type, apps: list, path: str) -> bytes:
+    with writer_class(path, CACHECHK) as writer:
+        for app in apps:
+            writer.write(app)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def compare(label: str, expected: bytes, actual: bytes) -> bool:
+    if expected == actual:
+        print(f"  {label}: 一致（{len(expected)}字节）")
+        return True
+    offset = next(
+        (i for i, (a, b) in enumerate(zip(expected, actual)) if a != b),
+        min(len(expected), len(actual)),
+    )
+    print(f"  {label}: 不一致，第一个差异位于第{offset}字节")
+    print(f"    lxml: {expected[max(offset - 40, 0):offset + 40]!r}")
+    print(f"    fast: {actual[max(offset - 40, 0):offset + 40]!r}")
+    return False
+
+
+def check_streams(apps: list, workdir: str) -> bool:
+    expected = write(RepoXmlWriter, apps, os.path.join(workdir, "lxml.xml"))
+    actual = write(FastRepoXmlWriter, apps, os.path.join(workdir, "fast.xml"))
+    return compare(f"流式写入（{len(apps)}个应用）", expected, actual)
+
+
+def check_update_repo(apps: list, workdir: str) -> bool:
+    """一次性构建XML树与快速写入器，同时比较拆分的平台文件"""
+    input_file = os.path.join(workdir, "apps.json")
+    with open(input_file, "w", encoding="utf-8") as f:
+        json.dump(list(map(to_plain, apps)), f, ensure_ascii=False, indent=2)
+
+    outputs = {}
+    for name in ("lxml", "fast"):
+        platform_dir = os.path.join(workdir, f"platforms_{name}")
+        output_file = os.path.join(workdir, f"repo_{name}.xml")
+        with contextlib.redirect_stdout(io.StringIO()):
+            update_repo(
+                input_file,
+                output_file,
+                cachechk=CACHECHK,
+                platform_dir=platform_dir,
+                xml_writer=name,
+            )
+        files = {output_file: "repo.xml"}
+        for file_name in sorted(os.listdir(platform_dir)):
+            files[os.path.join(platform_dir, file_name)] = file_name
+        outputs[name] = {}
+        for path, label in files.items():
+            with open(path, "rb") as f:
+                outputs[name][label] = f.read()
+
+    ok = sorted(outputs["lxml"]) == sorted(outputs["fast"])
+    if not ok:
+        print(f"  平台文件不一致: {sorted(outputs['lxml'])} / {sorted(outputs['fast'])}")
+    for label, expected in outputs["lxml"].items():
+        actual = outputs["fast"].get(label, b"")
+        ok = compare(f"update_repo {label}", expected, actual) and ok
+    return ok
+
+
+def check_errors(workdir: str) -> bool:
+    """不合法的文本在两种写入器中抛出相同类型的异常"""
+    ok = True
+    for value in ("bad\x01char", "nul\x00", "\ufffe", 123, ["list"]):
+        app = {"internalName": "invalid", "description": value}
+        raised = []
+        for writer_class in (RepoXmlWriter, FastRepoXmlWriter):
+            path = os.path.join(workdir, f"error_{writer_class.__name__}.xml")
+            try:
+                write(writer_class, [app], path)
+                raised.append(None)
+            except Exception as e:
+                raised.append(type(e))
+        same = raised[0] is raised[1] and raised[0] is not None
+        print(f"  异常 {value!r}: lxml={raised[0]}, fast={raised[1]}")
+        ok = ok and same
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="比较lxml写入器与快速写入器的输出")
+    parser.add_argument("--apps", type=int, default=2000, help="合成应用数量")
+    parser.add_argument("--platforms", type=int, default=3, help="每个应用的平台数量")
+    args = parser.parse_args()
+
+    apps = edge_cases() + synthetic_apps(
+        CatalogSpec(apps=args.apps, platforms=args.platforms)
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        print("比较lxml与快速写入器的输出:")
+        results = [
+            check_streams(apps, workdir),
+            check_streams([], workdir),
+            check_update_repo(apps, workdir),
+            check_errors(workdir),
+        ]
+    if all(results):
+        print("全部一致")
+        return 0
+    print("存在差异")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""导入耗时基准
+
+在临时目录中准备只使用SQLite的配置，用 python -X importtime 执行一次程序启动
+（导入main、读取配置、创建并关闭数据源），统计各顶层模块的累计导入耗时，
+并检查未选择的数据源依赖（lark_oapi、pymysql）没有被导入。
+
+用法：
+    python benchmarks/import_time.py [--runs 5] [--budget-ms 0] [--json 结果文件]
+
+导入了不应导入的模块，或启动耗时中位数超过--budget-ms时以非0状态退出。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只使用SQLite时不应导入的模块
+FORBIDDEN_MODULES = ("lark_oapi", "pymysql")
+
+CONFIG_YAML = """\
+data_source: "sqlite"
+feishu: {}
+sqlite:
+  db_path: "database.db"
+mysql: {}
+"""
+
+STARTUP_CODE = """\
+import main
+from config import get_config
+config = get_config()
+main.close_sources(main.open_sources(config))
+"""
+
+
+def _run(code: str, cwd: str, importtime: bool = False) -> Tuple[float, str]:
+    """在子进程中执行代码，返回(耗时毫秒, stderr)"""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", code]
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    result = subprocess.run(
+        command, cwd=cwd, env=env, capture_output=True, text=True
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"子进程执行失败:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """解析 -X importtime 的输出，返回 {模块名: (自身耗时us, 累计耗时us)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def top_level_modules(stderr: str) -> List[Tuple[str, int]]:
+    """顶层导入（未缩进的行）的累计耗时，按耗时降序排列"""
+    result = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        if not name.startswith("  "):
+            result.append((name.strip(), int(cumulative_us)))
+    return sorted(result, key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="程序启动的导入耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数，默认5")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=0,
+        help="扣除解释器启动后的耗时中位数上限（毫秒），0表示不检查",
+    )
+    parser.add_argument("--json", default="", help="结果输出的JSON文件路径")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "config.yaml"), "w", encoding="utf-8") as f:
+            f.write(CONFIG_YAML)
+
+        # 解释器本身的启动耗时，用于扣除
+        baseline = statistics.median(
+            _run("pass", workdir)[0] for _ in range(args.runs)
+        )
+        startup = statistics.median(
+            _run(STARTUP_CODE, workdir)[0] for _ in range(args.runs)
+        )
+        _, stderr = _run(STARTUP_CODE, workdir, importtime=True)
+
+    modules = parse_importtime(stderr)
+    forbidden = sorted(
+        name for name in modules if name.split(".")[0] in FORBIDDEN_MODULES
+    )
+    top = top_level_modules(stderr)[:10]
+
+    print(f"解释器启动: {baseline:.1f}ms")
+    print(f"程序启动: {startup:.1f}ms（扣除解释器后{startup - baseline:.1f}ms）")
+    print("累计导入耗时最多的顶层模块:")
+    for name, cumulative_us in top:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "benchmark": "import_time",
+                    "runs": args.runs,
+                    "interpreter_ms": round(baseline, 2),
+                    "startup_ms": round(startup, 2),
+                    "top_level_modules_ms": {
+                        name: round(cumulative_us / 1000, 2)
+                        for name, cumulative_us in top
+                    },
+                    "forbidden_imports": forbidden,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+    failed = False
+    if forbidden:
+        print(f"只使用SQLite时导入了不应导入的模块: {', '.join(forbidden)}")
+        failed = True
+    if args.budget_ms and startup - baseline > args.budget_ms:
+        print(f"启动耗时超过预算{args.budget_ms}ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
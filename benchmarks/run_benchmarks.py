@@ -0,0 +1,447 @@
+"""构建流程基准
+
+用合成目录（见synthetic.py）分别测量各阶段的耗时，并测量端到端的构建：
+
+- normalize.*：各数据源的行规范化（不含查询），及在进程池中并行的SQLite行规范化
+- fetch.*：临时SQLite数据库的查询+规范化，及使用模拟客户端的飞书分页获取
+- json.*：apps.json的写入
+- xml.*：构建XML树、序列化、流式写入及快速写入器（xml_writer="fast"）
+- end_to_end.*：从SQLite数据库到repo.xml/apps.json的完整构建
+
+用法：
+    python benchmarks/run_benchmarks.py --apps 5000 --platforms 3 --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+
+结果为JSON，--compare可与之前的结果逐阶段比较。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lxml import etree  # noqa: E402
+
+from config import Config  # noqa: E402
+from data_sources import DataSource, SQLiteDataSource  # noqa: E402
+from data_sources.base import FIELD_ORDER  # noqa: E402
+from data_sources.parallel import ParallelNormalizer  # noqa: E402
+from data_sources.records import to_plain  # noqa: E402
+from pipeline import AppsJsonWriter, run_pipeline  # noqa: E402
+from update_repo import _build_item, update_repo, write_repo_xml  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import (  # noqa: E402
+    CatalogSpec,
+    generate_feishu_fields,
+    generate_sql_rows,
+)
+
+CONFIG_YAML = """\
+data_source: "sqlite"
+feishu:
+  app_token: "bench"
+  table_id: "bench"
+  view_id: "bench"
+  app_id: "bench"
+  app_secret: "bench"
+  page_size: {page_size}
+  prefetch: 2
+  reverse: true
+sqlite:
+  db_path: "{db_path}"
+mysql: {{}}
+"""
+
+
+class Stage:
+    """一个基准阶段：setup()返回被计时的无参函数，items为每次处理的记录数"""
+
+    def __init__(
+        self, name: str, setup: Callable[[], Callable[[], Any]], items: int
+    ):
+        self.name = name
+        self.setup = setup
+        self.items = items
+
+
+class _StubResponse:
+    def __init__(self, items: list, has_more: bool, page_token: Optional[str]):
+        self.data = types.SimpleNamespace(
+            items=items, has_more=has_more, page_token=page_token
+        )
+
+    def success(self) -> bool:
+        return True
+
+
+class StubBitableClient:
+    """模拟 client.bitable.v1.app_table_record.search，按调用顺序返回分页
+
+    请求对象仍由lark_oapi构造，只替换网络请求；latency模拟每个分页的网络耗时。
+    """
+
+    def __init__(
+        self, records: List[Dict[str, Any]], page_size: int, latency: float
+    ):
+        items = [
+            types.SimpleNamespace(record_id=f"rec{i}", fields=fields)
+            for i, fields in enumerate(records)
+        ]
+        self.pages = [
+            items[start : start + page_size]
+            for start in range(0, len(items), page_size)
+        ] or [[]]
+        self.latency = latency
+        self.calls = 0
+        self.bitable = types.SimpleNamespace(
+            v1=types.SimpleNamespace(app_table_record=self)
+        )
+
+    def search(self, request, option=None) -> _StubResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        index = self.calls
+        self.calls += 1
+        has_more = index + 1 < len(self.pages)
+        return _StubResponse(
+            self.pages[index], has_more, str(index + 1) if has_more else None
+        )
+
+
+def _quiet(func: Callable[[], Any]) -> Callable[[], Any]:
+    """屏蔽被测函数的print输出"""
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+
+    return run
+
+
+def _bare_source(cls) -> DataSource:
+    """不建立连接的数据源实例，只用于测量规范化"""
+    data_source = cls.__new__(cls)
+    DataSource.__init__(data_source)
+    return data_source
+
+
+def create_database(path: str, rows: List[Dict[str, Any]]) -> None:
+    """创建与生产环境结构相同的data表并写入合成数据"""
+    columns = ", ".join(f'"{name}" TEXT' for name in FIELD_ORDER)
+    placeholders = ", ".join("?" for _ in FIELD_ORDER)
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute(f"CREATE TABLE data ({columns})")
+        conn.executemany(
+            f"INSERT INTO data VALUES ({placeholders})",
+            [tuple(row[name] for name in FIELD_ORDER) for row in rows],
+        )
+        conn.commit()
+
+
+def build_stages(
+    workdir: str, spec: CatalogSpec, page_size: int, latency: float
+) -> List[Stage]:
+    sql_rows = generate_sql_rows(spec)
+    feishu_records = generate_feishu_fields(spec)
+    tuples = [tuple(row[name] for name in FIELD_ORDER) for row in sql_rows]
+    count = spec.apps
+
+    db_path = os.path.join(workdir, "bench.db")
+    create_database(db_path, sql_rows)
+    config_file = os.path.join(workdir, "config.yaml")
+    with open(config_file, "w", encoding="utf-8") as f:
+        f.write(CONFIG_YAML.format(page_size=page_size, db_path=db_path))
+    config = Config(config_file)
+    stream_config = Config(config_file)
+    stream_config.sqlite_stream = True
+
+    apps = [
+        _bare_source(SQLiteDataSource)._compile_row_normalizer(FIELD_ORDER)(row)
+        for row in tuples
+    ]
+    out = lambda name: os.path.join(workdir, name)  # noqa: E731
+
+    def normalize_sql(cls):
+        def setup():
+            normalize = _bare_source(cls)._compile_row_normalizer(FIELD_ORDER)
+            return lambda: [normalize(row) for row in tuples]
+
+        return setup
+
+    def fetch_sqlite(cfg):
+        def setup():
+            def run():
+                data_source = SQLiteDataSource(cfg)
+                try:
+                    return list(data_source.fetch_data())
+                finally:
+                    data_source.close()
+
+            return run
+
+        return setup
+
+    def xml_tree():
+        root = etree.Element("plugins")
+        etree.SubElement(root, "cachechk").text = "202401010000"
+        for app in apps:
+            root.append(_build_item(app))
+        etree.indent(root, space="  ")
+        return root
+
+    def xml_serialize():
+        root = xml_tree()
+        return lambda: etree.tostring(
+            root, encoding="utf-8", xml_declaration=True, pretty_print=True
+        )
+
+    def xml_stream():
+        write_repo_xml(apps, out("stream_repo.xml"))
+
+    def xml_fast():
+        write_repo_xml(apps, out("fast_repo.xml"), xml_writer="fast")
+
+    def json_dump():
+        with open(out("apps.json"), "w", encoding="utf-8") as f:
+            json.dump(list(map(to_plain, apps)), f, ensure_ascii=False, indent=2)
+
+    def json_stream():
+        with AppsJsonWriter(out("apps.stream.json")) as writer:
+            for app in apps:
+                writer.write(app)
+
+    def end_to_end_classic():
+        data_source = SQLiteDataSource(config)
+        try:
+            apps_list = list(data_source.fetch_data())
+        finally:
+            data_source.close()
+        with open(out("e2e_apps.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                list(map(to_plain, apps_list)), f, ensure_ascii=False, indent=2
+            )
+        update_repo(out("e2e_apps.json"), out("e2e_repo.xml"))
+
+    def end_to_end_pipeline(xml_writer="lxml"):
+        data_source = SQLiteDataSource(config)
+        try:
+            run_pipeline(
+                data_source.fetch_data(),
+                xml_file=out("pipe_repo.xml"),
+                json_file=out("pipe_apps.json"),
+                xml_writer=xml_writer,
+            )
+        finally:
+            data_source.close()
+
+    def normalize_parallel():
+        # 进程池在预热时启动，测量的是复用进程池时的耗时（与守护模式相同）
+        data_source = _bare_source(SQLiteDataSource)
+        parallel = ParallelNormalizer(threshold=0)
+        return lambda: list(parallel.normalize(data_source, FIELD_ORDER, tuples))
+
+    stages = [
+        Stage("normalize.sqlite", normalize_sql(SQLiteDataSource), count),
+        Stage("normalize.sqlite_parallel", normalize_parallel, count),
+    ]
+    mysql_cls = _optional_class("MySQLDataSource")
+    if mysql_cls:
+        stages.append(Stage("normalize.mysql", normalize_sql(mysql_cls), count))
+
+    feishu_cls = _optional_class("FeishuDataSource")
+    if feishu_cls:
+
+        def normalize_feishu():
+            data_source = _bare_source(feishu_cls)
+            normalize = data_source._normalize_fields
+            return lambda: [normalize(fields) for fields in feishu_records]
+
+        def fetch_feishu():
+            data_source = feishu_cls(config)
+            data_source._get_tenant_access_token = lambda: "bench-token"
+
+            def run():
+                data_source.client = StubBitableClient(
+                    feishu_records, page_size, latency
+                )
+                return list(data_source.fetch_data())
+
+            return run
+
+        stages.append(Stage("normalize.feishu", normalize_feishu, count))
+        stages.append(Stage("fetch.feishu_stub", fetch_feishu, count))
+
+    stages += [
+        Stage("fetch.sqlite", fetch_sqlite(config), count),
+        Stage("fetch.sqlite_stream", fetch_sqlite(stream_config), count),
+        Stage("json.dump", lambda: json_dump, count),
+        Stage("json.stream", lambda: json_stream, count),
+        Stage("xml.build", lambda: xml_tree, count),
+        Stage("xml.serialize", xml_serialize, count),
+        Stage("xml.stream", lambda: xml_stream, count),
+        Stage("xml.fast", lambda: xml_fast, count),
+        Stage("end_to_end.classic", lambda: _quiet(end_to_end_classic), count),
+        Stage("end_to_end.pipeline", lambda: _quiet(end_to_end_pipeline), count),
+        Stage(
+            "end_to_end.pipeline_fast",
+            lambda: _quiet(lambda: end_to_end_pipeline("fast")),
+            count,
+        ),
+    ]
+    return stages
+
+
+def _optional_class(name: str):
+    """导入可选依赖的数据源类，依赖未安装时返回None并跳过相关阶段"""
+    try:
+        import data_sources
+
+        return getattr(data_sources, name)
+    except ImportError as e:
+        print(f"跳过{name}相关阶段: {e}")
+        return None
+
+
+def time_stage(stage: Stage, repeat: int) -> Dict[str, Any]:
+    func = stage.setup()
+    # 预热一次，排除首次导入和缓存的影响
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    return {
+        "stage": stage.name,
+        "items": stage.items,
+        "repeat": repeat,
+        "min_s": round(min(timings), 6),
+        "median_s": round(median, 6),
+        "mean_s": round(statistics.mean(timings), 6),
+        "per_item_us": round(median / stage.items * 1e6, 3) if stage.items else None,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_file: str) -> None:
+    """与之前的结果逐阶段比较中位数耗时"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {r["stage"]: r for r in json.load(f)["results"]}
+    print(f"\n与{baseline_file}比较（中位数，<1表示更快）:")
+    for result in results:
+        old = baseline.get(result["stage"])
+        if not old or not old["median_s"]:
+            print(f"  {result['stage']:<24} 无基线")
+            continue
+        ratio = result["median_s"] / old["median_s"]
+        print(
+            f"  {result['stage']:<24} {old['median_s'] * 1000:10.2f}ms -> "
+            f"{result['median_s'] * 1000:10.2f}ms  x{ratio:.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建流程各阶段的基准")
+    parser.add_argument("--apps", type=int, default=2000, help="应用数量，默认2000")
+    parser.add_argument(
+        "--platforms", type=int, default=3, help="每个应用的平台数，默认3"
+    )
+    parser.add_argument(
+        "--malformed-ratio", type=float, default=0.1, help="location格式错误的比例"
+    )
+    parser.add_argument(
+        "--rich-text-ratio",
+        type=float,
+        default=0.3,
+        help="飞书location为多段富文本的比例",
+    )
+    parser.add_argument("--seed", type=int, default=20240101, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=5, help="每个阶段的重复次数")
+    parser.add_argument("--page-size", type=int, default=500, help="飞书分页大小")
+    parser.add_argument(
+        "--feishu-latency-ms",
+        type=float,
+        default=0,
+        help="模拟的飞书分页网络耗时（毫秒）",
+    )
+    parser.add_argument(
+        "--stages", default="", help="只运行名称以这些前缀开头的阶段，逗号分隔"
+    )
+    parser.add_argument("--output", default="", help="结果输出的JSON文件路径")
+    parser.add_argument("--compare", default="", help="用于比较的基线结果文件")
+    args = parser.parse_args()
+
+    spec = CatalogSpec(
+        apps=args.apps,
+        platforms=args.platforms,
+        malformed_ratio=args.malformed_ratio,
+        rich_text_ratio=args.rich_text_ratio,
+        seed=args.seed,
+    )
+    prefixes = tuple(p.strip() for p in args.stages.split(",") if p.strip())
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        stages = build_stages(
+            workdir, spec, args.page_size, args.feishu_latency_ms / 1000
+        )
+        for stage in stages:
+            if prefixes and not stage.name.startswith(prefixes):
+                continue
+            result = time_stage(stage, args.repeat)
+            results.append(result)
+            print(
+                f"{result['stage']:<24} 中位数 {result['median_s'] * 1000:10.2f}ms"
+                f"  每条 {result['per_item_us']:8.2f}us"
+            )
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "lxml": ".".join(map(str, etree.LXML_VERSION)),
+            "spec": spec.as_dict(),
+            "page_size": args.page_size,
+            "feishu_latency_ms": args.feishu_latency_ms,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入{args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""合成应用目录
+
+按给定规模生成各数据源格式的原始数据，覆盖规范化时的各条处理路径：
+
+- location为以平台ID为键的JSON（多平台）
+- location为飞书富文本片段（text与link交替）
+- location含换行、反引号包裹的URL
+- location为格式错误的JSON，需要走正则提取URL的备用路径
+- platform为逗号分隔字符串、JSON数组、单个平台
+"""
+
+import datetime
+import json
+import random
+from typing import Any, Dict, List
+
+from data_sources.base import FIELD_ORDER
+
+PLATFORM_IDS = (
+    "TS-NASX86",
+    "TS-X86_64",
+    "TS-NASARM_64",
+    "TS-NASARM",
+    "TS-X28A",
+    "TS-X41",
+    "TS-X31X",
+    "TS-X19",
+)
+
+CATEGORIES = ("网络", "多媒体", "备份", "开发工具", "下载", "实用工具")
+TYPES = ("QPKG", "Container", "Tools")
+
+
+class CatalogSpec:
+    """合成目录的参数"""
+
+    def __init__(
+        self,
+        apps: int = 1000,
+        platforms: int = 3,
+        malformed_ratio: float = 0.1,
+        rich_text_ratio: float = 0.3,
+        seed: int = 20240101,
+    ):
+        # 应用数量
+        self.apps = apps
+        # 每个应用的平台数量，最多len(PLATFORM_IDS)
+        self.platforms = min(platforms, len(PLATFORM_IDS))
+        # location为格式错误JSON的比例
+        self.malformed_ratio = malformed_ratio
+        # 飞书数据中location为多段富文本（而非单段）的比例
+        self.rich_text_ratio = rich_text_ratio
+        self.seed = seed
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def _location_mapping(internal_name: str, platforms: List[str]) -> Dict[str, str]:
+    return {
+        pid: f"https://dl.example.com/{internal_name}/{internal_name}_{pid}.qpkg"
+        for pid in platforms
+    }
+
+
+def _location_text(
+    rng: random.Random, mapping: Dict[str, str], malformed: bool
+) -> str:
+    """location的文本形式：正常JSON、带换行和反引号的JSON或格式错误的JSON"""
+    if malformed:
+        # 缺少引号和逗号，json.loads失败，只能用正则提取第一个URL
+        pairs = " ".join(f"{pid}: {url}" for pid, url in mapping.items())
+        return "{" + pairs + "}"
+    if rng.random() < 0.3:
+        pairs = ",\n".join(f'  "{pid}": "`{url}` "' for pid, url in mapping.items())
+        return "{\n" + pairs + "\n}"
+    return json.dumps(mapping)
+
+
+def _base_fields(rng: random.Random, index: int) -> Dict[str, Any]:
+    name = f"app{index:06d}"
+    return {
+        "name": f"应用 {name}",
+        "changeLog": f"版本 {index % 10}.{index % 7} 修复了若干问题\n提升了性能",
+        "category": rng.choice(CATEGORIES),
+        "type": rng.choice(TYPES),
+        "icon80": f"https://img.example.com/{name}_80.png",
+        "icon100": f"https://img.example.com/{name}_100.png",
+        "description": f"{name} 是一个用于演示的 QNAP 应用，支持多个平台。" * 3,
+        "fwVersion": "4.3.0",
+        "version": f"{index % 5}.{index % 11}.{index % 13}",
+        "internalName": name,
+        "maintainer": "QnapclubCN",
+        "developer": f"developer{index % 50}",
+        "forumLink": f"https://forum.example.com/t/{index}",
+        "language": "zh-CN,en-US",
+        "snapshot": f"https://img.example.com/{name}_snapshot.png",
+        "bannerImg": "",
+        "tutorialLink": "",
+    }
+
+
+def _pick_platforms(rng: random.Random, spec: CatalogSpec) -> List[str]:
+    return rng.sample(PLATFORM_IDS, spec.platforms)
+
+
+def generate_sql_rows(spec: CatalogSpec) -> List[Dict[str, Any]]:
+    """SQLite/MySQL格式的行：所有字段均为文本，platform为字符串"""
+    rng = random.Random(spec.seed)
+    rows = []
+    for index in range(spec.apps):
+        fields = _base_fields(rng, index)
+        platforms = _pick_platforms(rng, spec)
+        mapping = _location_mapping(fields["internalName"], platforms)
+        malformed = rng.random() < spec.malformed_ratio
+        fields["location"] = _location_text(rng, mapping, malformed)
+        if len(platforms) > 1 and index % 2:
+            fields["platform"] = ", ".join(platforms)
+        else:
+            fields["platform"] = json.dumps(platforms)
+        fields["publishedDate"] = (
+            datetime.date(2024, 1, 1) + datetime.timedelta(days=index % 365)
+        ).isoformat()
+        rows.append({name: fields.get(name) for name in FIELD_ORDER})
+    return rows
+
+
+def _rich_text(text: str) -> List[Dict[str, Any]]:
+    return [{"text": text, "type": "text"}]
+
+
+def generate_feishu_fields(spec: CatalogSpec) -> List[Dict[str, Any]]:
+    """飞书记录的fields：文本为富文本片段，platform为多选，publishedDate为毫秒时间戳"""
+    rng = random.Random(spec.seed)
+    records = []
+    base_ms = int(datetime.datetime(2024, 1, 1).timestamp() * 1000)
+    for index in range(spec.apps):
+        fields: Dict[str, Any] = {}
+        for name, value in _base_fields(rng, index).items():
+            # 飞书中空字段不会出现在fields中
+            if value:
+                fields[name] = _rich_text(value)
+        platforms = _pick_platforms(rng, spec)
+        mapping = _location_mapping(fields["internalName"][0]["text"], platforms)
+        malformed = rng.random() < spec.malformed_ratio
+        text = _location_text(rng, mapping, malformed)
+        if rng.random() < spec.rich_text_ratio:
+            # 富文本中的URL被识别为链接，拆分为text与link交替的片段
+            segments = []
+            for part in text.split('"'):
+                if part.startswith("https://"):
+                    segments.append({"link": part, "text": part, "type": "url"})
+                else:
+                    segments.append({"text": part, "type": "text"})
+                segments.append({"text": '"', "type": "text"})
+            fields["location"] = segments[:-1]
+        else:
+            fields["location"] = _rich_text(text)
+        fields["platform"] = platforms
+        fields["publishedDate"] = base_ms + index * 3600 * 1000
+        records.append(fields)
+    return records
@@ -0,0 +1,197 @@
+"""Web查看器目录索引模块
+
+将应用数据拆分为固定数量应用的分片JSON，并预先构建对名称、描述、开发者、分类、
+类型的规范化倒排索引。查看器只需下载 index.json 和当前页所在的分片，
+不必下载并解析完整的 repo.xml。
+
+index.json 格式：
+    {
+        "version": 1,
+        "cachechk": "...",
+        "count": 应用总数,
+        "shardSize": 每个分片的应用数量,
+        "shards": ["shard-<构建号>-0000.json", ...],
+        "categories": ["分类", ...],
+        "tokens": ["按字典序排列的词项", ...],
+        "postings": [[应用序号, ...], ...]   # 与tokens一一对应
+    }
+
+词项规则（web/script.js 中的 tokenize 与此保持一致）：文本先做 NFKC 规范化并转小写，
+连续的字母数字作为一个词，中日韩文字取单字和相邻两字。查询时每个词项按前缀匹配，
+多个词项取交集。
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+import unicodedata
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+# 参与搜索的字段
+SEARCH_FIELDS = ("name", "description", "developer", "category", "type")
+
+# 查看器展示应用卡片所需的字段
+CARD_FIELDS = (
+    "name",
+    "version",
+    "description",
+    "category",
+    "type",
+    "maintainer",
+    "developer",
+    "publishedDate",
+    "fwVersion",
+    "icon80",
+    "icon100",
+)
+
+INDEX_FILE = "index.json"
+
+CJK_RANGES = "぀-ヿ㐀-䶿一-鿿가-힯"
+WORD_PATTERN = re.compile(rf"[0-9a-zÀ-ɏ]+|[{CJK_RANGES}]+")
+CJK_PATTERN = re.compile(rf"[{CJK_RANGES}]")
+
+
+def tokenize(text: Any) -> Set[str]:
+    """将文本切分为规范化的词项"""
+    if not text:
+        return set()
+    normalized = unicodedata.normalize("NFKC", str(text)).lower()
+    tokens = set()
+    for word in WORD_PATTERN.findall(normalized):
+        if CJK_PATTERN.match(word):
+            tokens.update(word)
+            tokens.update(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.add(word)
+    return tokens
+
+
+def _card(app: Dict[str, Any]) -> Dict[str, Any]:
+    """查看器所需的精简应用数据"""
+    card = {field: app.get(field, "") for field in CARD_FIELDS}
+    platforms = app.get("platform", [])
+    if isinstance(platforms, dict):
+        platforms = [platforms]
+    card["platform"] = [
+        {"platformID": p.get("platformID", ""), "location": p.get("location", "")}
+        for p in platforms
+        if p.get("platformID") and p.get("location")
+    ]
+    return card
+
+
+def _dump(path: str, data: Any) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def _load_shards(index_path: str) -> Set[str]:
+    """index.json引用的分片文件名，文件不存在或格式错误时返回空集合"""
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            shards = json.load(f).get("shards", [])
+    except (OSError, ValueError, AttributeError):
+        return set()
+    return {name for name in shards if isinstance(name, str)}
+
+
+class CatalogIndexWriter:
+    """流式写入分片目录和倒排索引
+
+    分片写入临时目录，调用commit后才移动到输出目录并原子替换index.json；
+    上一版index.json引用的分片再保留一次构建，仍在使用旧索引的查看器可以继续加载分页，
+    更早的分片随后删除。调用discard则丢弃本次写入的内容。
+
+    使用方法：
+        with CatalogIndexWriter("web/catalog") as writer:
+            for app in apps:
+                writer.write(app)
+        writer.commit(cachechk)
+    """
+
+    def __init__(self, output_dir: str, shard_size: int = 100):
+        self.output_dir = output_dir
+        self.shard_size = max(int(shard_size), 1)
+        self.count = 0
+        # 每次构建的分片使用不同的文件名，旧索引引用的分片在新索引发布前保持不变
+        self.build_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self._temp_dir = os.path.join(output_dir, f".tmp-{self.build_id}")
+        self._shards: List[str] = []
+        self._buffer: List[Dict[str, Any]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._categories: Dict[str, None] = {}
+
+    def __enter__(self) -> "CatalogIndexWriter":
+        os.makedirs(self._temp_dir, exist_ok=True)
+        return self
+
+    def write(self, app: Dict[str, Any]) -> None:
+        """写入单个应用"""
+        app_id = self.count
+        tokens = set()
+        for field in SEARCH_FIELDS:
+            tokens |= tokenize(app.get(field, ""))
+        for token in tokens:
+            self._postings[token].append(app_id)
+
+        category = app.get("category")
+        if category:
+            self._categories[category] = None
+
+        self._buffer.append(_card(app))
+        self.count += 1
+        if len(self._buffer) >= self.shard_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        name = f"shard-{self.build_id}-{len(self._shards):04d}.json"
+        _dump(os.path.join(self._temp_dir, name), self._buffer)
+        self._shards.append(name)
+        self._buffer = []
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self._flush()
+        else:
+            self.discard()
+
+    def commit(self, cachechk: Optional[str] = None) -> None:
+        """发布本次写入的分片和索引"""
+        tokens = sorted(self._postings)
+        index = {
+            "version": 1,
+            "cachechk": cachechk,
+            "count": self.count,
+            "shardSize": self.shard_size,
+            "shards": self._shards,
+            "categories": list(self._categories),
+            "tokens": tokens,
+            "postings": [self._postings[token] for token in tokens],
+        }
+
+        for name in self._shards:
+            os.replace(
+                os.path.join(self._temp_dir, name), os.path.join(self.output_dir, name)
+            )
+        index_path = os.path.join(self.output_dir, INDEX_FILE)
+        previous = _load_shards(index_path)
+        _dump(f"{index_path}.tmp", index)
+        os.replace(f"{index_path}.tmp", index_path)
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+        # 删除上一版及本次索引都不再引用的旧分片
+        current = set(self._shards) | previous
+        for name in os.listdir(self.output_dir):
+            if name.startswith("shard-") and name not in current:
+                os.remove(os.path.join(self.output_dir, name))
+
+    def discard(self) -> None:
+        """丢弃本次写入的内容，保留原有的目录索引"""
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
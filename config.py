@@ -1,6 +1,9 @@
-"""配置模块"""
+"""配置模块
 
-import yaml
+导入本模块没有副作用：配置只在调用get_config()时读取，之后复用同一个实例。
+"""
+
+import functools
 import os
 import sys
 
@@ -11,18 +14,24 @@ class Config:
     """配置类，用于管理应用配置
 
     使用方法：
-    1. 在其他文件中导入：from config import config_instance
-    2. 访问配置项：config_instance.app_token, config_instance.app_secret等
+    1. 在程序入口读取配置：config = get_config()
+    2. 访问配置项：config.app_token, config.app_secret等
     """
 
-    def __init__(self):
-        config = load_config()
-        self.data_source: str = config.get("data_source", "")
-        if not self.data_source:
+    def __init__(self, config_file: str = CONFIG_FILE):
+        config = load_config(config_file)
+        data_source = config.get("data_source", "")
+        # data_source可以是单个数据源，也可以是数据源列表（并发获取后合并）
+        self.data_sources: list = (
+            list(data_source) if isinstance(data_source, list) else [data_source]
+        )
+        self.data_sources = [name for name in self.data_sources if name]
+        if not self.data_sources:
             print(
                 "未指定数据来源, 请在config.yaml中配置'data_source'.", file=sys.stderr
             )
             sys.exit(1)
+        self.data_source: str = self.data_sources[0]
         datasource = ["feishu", "sqlite", "mysql"]
         # feishu
         self.app_token: str = config["feishu"].get("app_token", "")
@@ -30,9 +39,27 @@ class Config:
         self.view_id: str = config["feishu"].get("view_id", "")
         self.app_id: str = config["feishu"].get("app_id", "")
         self.app_secret: str = config["feishu"].get("app_secret", "")
+        self.page_size: int = config["feishu"].get("page_size", 500)
+        self.prefetch: int = config["feishu"].get("prefetch", 2)
+        self.reverse: bool = config["feishu"].get("reverse", True)
+        self.token_cache_file: str = config["feishu"].get("token_cache_file", "")
+        self.modified_field: str = config["feishu"].get("modified_field", "")
+        self.max_retries: int = config["feishu"].get("max_retries", 5)
+        self.retry_base_delay: float = config["feishu"].get("retry_base_delay", 1.0)
+        self.retry_max_delay: float = config["feishu"].get("retry_max_delay", 30.0)
+        self.retry_budget: float = config["feishu"].get("retry_budget", 300.0)
+        self.max_concurrent_requests: int = config["feishu"].get(
+            "max_concurrent_requests", 2
+        )
 
         # sqlite
         self.db_path: str = config["sqlite"].get("db_path", "")
+        self.sqlite_watermark_column: str = config["sqlite"].get(
+            "watermark_column", "publishedDate"
+        )
+        self.sqlite_stream: bool = config["sqlite"].get("stream", False)
+        self.sqlite_batch_size: int = config["sqlite"].get("batch_size", 1000)
+        self.sqlite_create_index: bool = config["sqlite"].get("create_index", False)
         
         # mysql
         self.mysql_host: str = config["mysql"].get("host", "localhost")
@@ -41,24 +68,90 @@ class Config:
         self.mysql_password: str = config["mysql"].get("password", "")
         self.mysql_database: str = config["mysql"].get("database", "")
         self.mysql_charset: str = config["mysql"].get("charset", "utf8mb4")
+        self.mysql_watermark_column: str = config["mysql"].get(
+            "watermark_column", "publishedDate"
+        )
+        self.mysql_stream: bool = config["mysql"].get("stream", False)
+        self.mysql_batch_size: int = config["mysql"].get("batch_size", 1000)
+        self.mysql_change_query: str = config["mysql"].get("change_query", "")
 
-        if self.data_source not in datasource:
-            print(
-                f"不支持的数据来源: {self.data_source} ,目前仅支持{datasource}.",
-                file=sys.stderr,
-            )
+        # build
+        build = config.get("build") or {}
+        self.xml_stream: bool = build.get("xml_stream", False)
+        # XML写入方式："lxml"逐个构建元素，"fast"按固定结构直接写出字节（输出相同）
+        self.xml_writer: str = build.get("xml_writer", "lxml")
+        self.pipeline: bool = build.get("pipeline", False)
+        self.apps_json: str = build.get("apps_json", "apps.json")
+        self.incremental: bool = build.get("incremental", False)
+        self.snapshot_file: str = build.get("snapshot_file", "snapshot.json")
+        self.full_sync_hours: float = build.get("full_sync_hours", 24)
+        self.skip_unchanged: bool = build.get("skip_unchanged", False)
+        self.state_file: str = build.get("state_file", "build_state.json")
+        self.precompress: bool = build.get("precompress", False)
+        self.catalog_dir: str = build.get("catalog_dir", "")
+        self.shard_size: int = build.get("shard_size", 100)
+        self.platform_dir: str = build.get("platform_dir", "")
+        self.merge_precedence: str = build.get("merge_precedence", "order")
+        # 软件包校验：按location的文件名在package_dir中查找qpkg并计算sha256
+        self.package_dir: str = build.get("package_dir", "")
+        self.package_cache: str = build.get("package_cache", "package_cache.json")
+        self.package_workers: int = build.get("package_workers", 0)
+        self.package_extra_fields: bool = build.get("package_extra_fields", False)
+        # 增量更新：与上次构建比较生成增量文件，并保留最近delta_history次的历史
+        self.delta_dir: str = build.get("delta_dir", "")
+        self.delta_history: int = build.get("delta_history", 20)
+        # 并行规范化：SQLite/MySQL查询结果不少于normalize_threshold行时分块在进程池中规范化
+        self.parallel_normalize: bool = build.get("parallel_normalize", False)
+        self.normalize_workers: int = build.get("normalize_workers", 0)
+        self.normalize_threshold: int = build.get("normalize_threshold", 20000)
+        self.normalize_chunk_size: int = build.get("normalize_chunk_size", 2000)
+        # 构建指标：Prometheus textfile collector文件和JSON运行报告，留空不写出
+        self.metrics_file: str = build.get("metrics_file", "")
+        self.report_file: str = build.get("report_file", "")
+
+        # link_check
+        link_check = config.get("link_check") or {}
+        self.link_check: bool = link_check.get("enabled", False)
+        self.link_check_per_host: int = link_check.get("per_host", 4)
+        self.link_check_timeout: float = link_check.get("timeout", 10)
+        self.link_check_ttl: float = link_check.get("ttl", 86400)
+        self.link_check_cache: str = link_check.get("cache_file", "link_cache.json")
+        self.link_check_report: str = link_check.get("report_file", "link_report.json")
+
+        # daemon
+        daemon = config.get("daemon") or {}
+        self.daemon: bool = daemon.get("enabled", False)
+        self.daemon_interval: float = daemon.get("interval", 600)
+        self.daemon_poll_interval: float = daemon.get("poll_interval", 5)
+        self.daemon_debounce: float = daemon.get("debounce", 2)
+        self.webhook_host: str = daemon.get("webhook_host", "127.0.0.1")
+        self.webhook_port: int = daemon.get("webhook_port", 0)
+        self.webhook_token: str = daemon.get("webhook_token", "")
+
+        for name in self.data_sources:
+            if name not in datasource:
+                print(
+                    f"不支持的数据来源: {name} ,目前仅支持{datasource}.",
+                    file=sys.stderr,
+                )
+                sys.exit(1)
+        if len(set(self.data_sources)) != len(self.data_sources):
+            print(f"数据来源重复: {self.data_sources}", file=sys.stderr)
             sys.exit(1)
 
 
-def load_config():
+def load_config(config_file: str = CONFIG_FILE):
     """读取 config.yaml, 不存在则报错退出"""
+    # 只在真正读取配置时导入yaml
+    import yaml
+
     try:
-        if not os.path.exists(CONFIG_FILE):
+        if not os.path.exists(config_file):
             print("配置文件不存在, 请修改config.yaml后重试.", file=sys.stderr)
             sys.exit(1)
         else:
             # 文件存在，读取配置
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            with open(config_file, "r", encoding="utf-8") as f:
                 config = yaml.safe_load(f)
             return config
     except yaml.YAMLError as e:
@@ -69,20 +162,23 @@ def load_config():
         sys.exit(1)
 
 
-# 创建默认配置实例供导入使用
-# 这样在其他文件中可以直接导入这个实例，避免重复创建
-config_instance = Config()
+@functools.lru_cache(maxsize=None)
+def get_config(config_file: str = CONFIG_FILE) -> Config:
+    """读取配置文件，同一路径只读取一次，之后返回同一个实例"""
+    return Config(config_file)
+
 
 """
 使用示例：
 
 # 在其他Python文件中使用配置
-# 方法1：导入配置实例（推荐）
-# from config import config_instance
-# token = config_instance.app_token
-# secret = config_instance.app_secret
+# 方法1：获取共享的配置实例（推荐）
+# from config import get_config
+# config = get_config()
+# token = config.app_token
+# secret = config.app_secret
 
-# 方法2：创建新的配置实例
+# 方法2：创建新的配置实例（重新读取配置文件）
 # from config import Config
 # custom_config = Config()
 # token = custom_config.app_token
@@ -0,0 +1,233 @@
+"""守护模式模块
+
+常驻运行，在多次构建之间复用数据源及其连接、飞书token缓存和已导入的模块。
+以下情况触发重新构建，构建期间到来的多次触发合并为一次构建：
+
+- 定时：每隔interval秒
+- 数据源变化：轮询DataSource.change_token()（SQLite文件修改时间、MySQL change_query）
+- webhook：向本机监听的端口发送 POST /rebuild（如飞书多维表格自动化）
+"""
+
+import hmac
+import signal
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from config import Config
+from sources import SourceWorker
+
+
+class BuildTrigger:
+    """构建请求队列
+
+    只记录是否有待处理的请求及其原因，不记录次数：
+    构建期间到来的任意多次请求，构建结束后只引起一次构建。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._reasons: List[str] = []
+        self.stopped = False
+
+    def request(self, reason: str) -> None:
+        """请求一次构建"""
+        with self._cond:
+            if reason not in self._reasons:
+                self._reasons.append(reason)
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        """请求退出守护进程"""
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """等待构建请求，返回并清空累积的请求原因；超时或退出时返回空列表"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._reasons or self.stopped, timeout)
+            reasons, self._reasons = self._reasons, []
+            return reasons
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """处理 POST /rebuild 请求"""
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        # 读完请求体，避免客户端在发送时被重置连接
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        if url.path != "/rebuild":
+            self._reply(404, "not found")
+            return
+        token = self.server.webhook_token
+        if token:
+            supplied = self.headers.get("X-Webhook-Token") or parse_qs(
+                url.query
+            ).get("token", [""])[0]
+            if not hmac.compare_digest(supplied.encode(), token.encode()):
+                self._reply(403, "forbidden")
+                return
+
+        self.server.trigger.request("webhook")
+        self._reply(202, "accepted")
+
+    def _reply(self, status: int, text: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不输出每个请求的访问日志
+        pass
+
+
+def start_webhook(
+    host: str, port: int, trigger: BuildTrigger, token: str = ""
+) -> ThreadingHTTPServer:
+    """在后台线程中启动webhook服务"""
+    server = ThreadingHTTPServer((host, port), _WebhookHandler)
+    server.daemon_threads = True
+    server.trigger = trigger
+    server.webhook_token = token
+    threading.Thread(
+        target=server.serve_forever, name="webhook", daemon=True
+    ).start()
+    print(f"webhook已启动: http://{host}:{server.server_address[1]}/rebuild")
+    return server
+
+
+class Daemon:
+    """守护进程
+
+    构建始终在调用run()的线程中串行执行；轮询和webhook在后台线程中运行，
+    只向BuildTrigger提交请求。
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        open_sources: Callable[[], list],
+        build: Callable[[list], None],
+        close_sources: Callable[[list], None],
+    ):
+        self.config = config
+        self.open_sources = open_sources
+        self.build = build
+        self.close_sources = close_sources
+        self.trigger = BuildTrigger()
+        # 当前的数据源，为None时在下次构建前创建
+        self.sources: Optional[list] = None
+        # 每次重新创建数据源时递增，轮询线程据此重置记录的标记
+        self._generation = 0
+
+    def _poll(self, source: Any) -> Any:
+        try:
+            if isinstance(source, SourceWorker):
+                source = source.data_source
+            return source.change_token()
+        except Exception as e:
+            print(f"轮询数据源变化失败: {e}")
+            return None
+
+    def _watch_changes(self) -> None:
+        """轮询各数据源的change_token()，发生变化时请求构建"""
+        names = self.config.data_sources
+        generation = None
+        tokens: list = []
+        while not self.trigger.stopped:
+            sources = self.sources
+            if sources is None:
+                # 数据源尚未创建或构建失败后已丢弃
+                pass
+            elif generation != self._generation:
+                generation = self._generation
+                tokens = [self._poll(source) for source in sources]
+            else:
+                for i, source in enumerate(sources):
+                    token = self._poll(source)
+                    if token is None:
+                        continue
+                    if tokens[i] is not None and token != tokens[i]:
+                        self.trigger.request(f"数据源{names[i]}发生变化")
+                    tokens[i] = token
+            time.sleep(self.config.daemon_poll_interval)
+
+    def _open_sources(self) -> list:
+        if self.sources is None:
+            self.sources = self.open_sources()
+            self._generation += 1
+        return self.sources
+
+    def _discard_sources(self) -> None:
+        """构建失败后丢弃数据源，下次构建前重新创建，避免复用已损坏的连接"""
+        sources, self.sources = self.sources, None
+        if sources is None:
+            return
+        try:
+            self.close_sources(sources)
+        except Exception as e:
+            print(f"关闭数据源失败: {e}")
+
+    def run(self) -> None:
+        config = self.config
+        server = None
+        previous_handler = signal.signal(
+            signal.SIGTERM, lambda signum, frame: self.trigger.stop()
+        )
+        try:
+            if config.webhook_port:
+                server = start_webhook(
+                    config.webhook_host,
+                    config.webhook_port,
+                    self.trigger,
+                    config.webhook_token,
+                )
+            if config.daemon_poll_interval > 0:
+                threading.Thread(
+                    target=self._watch_changes, name="watch", daemon=True
+                ).start()
+
+            reasons = ["启动"]
+            while not self.trigger.stopped:
+                if config.daemon_debounce > 0:
+                    # 等待变化平息，期间的触发并入本次构建
+                    time.sleep(config.daemon_debounce)
+                    for reason in self.trigger.wait(0):
+                        if reason not in reasons:
+                            reasons.append(reason)
+
+                print(f"\n开始构建（{'、'.join(reasons)}）...")
+                started = time.monotonic()
+                try:
+                    self.build(self._open_sources())
+                    print(f"构建完成，耗时{time.monotonic() - started:.2f}秒")
+                except Exception:
+                    traceback.print_exc()
+                    print("构建失败，下次构建前将重新创建数据源")
+                    self._discard_sources()
+
+                timeout = config.daemon_interval or None
+                reasons = self.trigger.wait(timeout)
+                if not reasons and not self.trigger.stopped:
+                    reasons = ["定时"]
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.trigger.stop()
+            signal.signal(signal.SIGTERM, previous_handler)
+            if server:
+                server.shutdown()
+                server.server_close()
+            self._discard_sources()
+            print("守护进程已退出")
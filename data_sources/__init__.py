@@ -1,13 +1,39 @@
-"""数据源模块"""
+"""数据源模块
+
+各数据源在首次访问时才导入，只使用SQLite时不会导入lark_oapi或pymysql。
+"""
+
+import importlib
 
 from .base import DataSource
-from .feishu import FeishuDataSource
-from .sqlite import SQLiteDataSource
-from .mysql import MySQLDataSource
+from .records import AppRecord, PlatformEntry
+
+# 数据源类名 -> 所在的子模块
+_LAZY_CLASSES = {
+    "FeishuDataSource": ".feishu",
+    "SQLiteDataSource": ".sqlite",
+    "MySQLDataSource": ".mysql",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_CLASSES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # 缓存到模块属性，之后的访问不再经过__getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_CLASSES))
 
 
 __all__ = [
+    "AppRecord",
     "DataSource",
+    "PlatformEntry",
     "FeishuDataSource",
     "SQLiteDataSource",
     "MySQLDataSource",
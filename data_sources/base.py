@@ -1,14 +1,441 @@
+import itertools
+import json
+import re
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Iterator
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from metrics import metrics
+from .records import FIELD_ORDER, AppRecord, PlatformEntry
+
+if TYPE_CHECKING:
+    from .parallel import ParallelNormalizer
+
+
+URL_PATTERN = re.compile(
+    r"https?://[\w\.-]+[\w\-\._~:/?#[\]@!\$&'\(\)\*\+,;=.]+"
+)
+
+# 字段转换函数：conv(字段值, 同一行解析后的location) -> 输出值
+FieldConverter = Callable[[Any, "ParsedLocation"], Any]
+
+# 解析失败的标记
+_FAILED = object()
+
+# 记录规范化指标的批大小：每批计时一次
+NORMALIZE_BATCH_SIZE = 500
+
+# location无法按JSON解析、改用正则提取URL的次数
+_LOCATION_FALLBACK = metrics.counter("qnap_repo_location_fallback_total")
+
+
+class ParsedLocation:
+    """单行location字段的解析结果
+
+    location通常是以平台ID为键的JSON（飞书中为富文本片段），一个应用有多个平台时，
+    拼接、去换行和JSON解析只在首次查询时执行一次，之后各平台直接查表。
+    """
+
+    __slots__ = ("raw", "url_fallback", "_mapping", "_value", "_url", "_text")
+
+    def __init__(self, raw: Any, url_fallback: bool = True):
+        self.raw = raw
+        # 字符串不是JSON时是否直接使用其中的第一个URL
+        self.url_fallback = url_fallback
+        self._mapping: Any = None
+
+    def _parse(self) -> None:
+        raw = self.raw
+        self._mapping = _FAILED
+        self._value = raw
+        self._url = ""
+        self._text = ""
+
+        if not raw:
+            return
+
+        # 处理列表类型的location字段（飞书富文本格式）
+        if isinstance(raw, list):
+            # 重建JSON字符串，处理text和link类型
+            parts = []
+            for item in raw:
+                if isinstance(item, dict):
+                    if "text" in item:
+                        parts.append(item["text"])
+                    elif "link" in item:
+                        parts.append(item["link"])
+            text = "".join(parts)
+            try:
+                self._mapping = json.loads(text.replace("\n", ""))
+            except json.JSONDecodeError:
+                # 备用方法：直接查找URL模式
+                _LOCATION_FALLBACK.inc()
+                match = URL_PATTERN.search(text)
+                self._url = match.group(0) if match else ""
+                self._text = text.lower()
+        # 处理字符串类型
+        elif isinstance(raw, str):
+            # 原样解析成功时，换行只出现在JSON的词法单元之间，去掉换行后解析结果相同
+            try:
+                self._value = self._mapping = json.loads(raw)
+            except json.JSONDecodeError:
+                if "\n" in raw:
+                    try:
+                        self._mapping = json.loads(raw.replace("\n", ""))
+                    except json.JSONDecodeError:
+                        pass
+            if self._mapping is _FAILED and self.url_fallback:
+                # 如果不是JSON字符串，尝试直接提取URL
+                _LOCATION_FALLBACK.inc()
+                match = URL_PATTERN.search(raw)
+                self._url = match.group(0) if match else ""
+        # 处理字典类型
+        elif isinstance(raw, dict):
+            self._mapping = raw
+
+    def url(self, platform_id: str) -> str:
+        """提取特定平台的URL"""
+        if self._mapping is None:
+            self._parse()
+
+        mapping = self._mapping
+        if mapping is not _FAILED:
+            if platform_id in mapping:
+                return mapping[platform_id].strip("` ")
+            return ""
+        # 富文本备用匹配时，平台ID需出现在文本中
+        if self._url and self._text and platform_id.lower() not in self._text:
+            return ""
+        return self._url
+
+    def field_value(self) -> Any:
+        """location字段本身的输出值：字符串尝试按JSON解析，失败时原样返回"""
+        if self._mapping is None:
+            self._parse()
+        return self._value
+
+
+def rich_text(value: Any) -> Any:
+    """富文本字段取第一段文本，其他值原样返回"""
+    if (
+        isinstance(value, list)
+        and len(value) > 0
+        and isinstance(value[0], dict)
+        and "text" in value[0]
+    ):
+        return value[0]["text"]
+    return value
+
+
+def internal_name(value: Any) -> str:
+    """确保internalName为字符串类型"""
+    if isinstance(value, dict):
+        return value.get("text", str(value))
+    elif isinstance(value, list):
+        if value and isinstance(value[0], dict):
+            return value[0].get("text", "")
+        else:
+            return str(value)
+    else:
+        return str(value) if value is not None else ""
 
 
 class DataSource(ABC):
-    """数据源基类"""
+    """数据源基类
+
+    提供各数据源共用的字段规范化引擎：字段顺序和每个字段的转换函数只编译一次，
+    之后每行数据一次遍历直接生成输出记录。
+    """
+
+    # 数据源名称，用作指标的source标签
+    source_name: str = ""
+
+    # 是否支持增量同步（实现了fetch_changes）
+    supports_incremental: bool = False
+
+    # 记录的source_id是否与数据源的输出顺序一致（如按rowid排序的SQLite），
+    # 为True时增量同步的新记录按source_id插入快照中的原有位置，否则追加到末尾
+    source_ids_ordered: bool = False
+
+    # 字段顺序
+    field_order: Sequence[str] = FIELD_ORDER
+
+    # 字符串类型的platform是否按JSON或逗号分隔解析
+    parse_platform_string: bool = True
+    # 字符串类型的location不是JSON时，是否直接提取其中的第一个URL
+    location_url_fallback: bool = True
+
+    # 并行规范化（见parallel.py），由支持的数据源按配置创建
+    parallel_normalizer: Optional["ParallelNormalizer"] = None
 
     def __init__(self):
-        pass
+        self._mapping_normalizer: Optional[Callable[[Mapping], AppRecord]] = None
 
     @abstractmethod
     def fetch_data(self) -> Iterator[Dict[str, Any]]:
         """获取数据的生成器方法"""
         pass
+
+    def fetch_changes(
+        self, watermark: Optional[str]
+    ) -> Tuple[Optional[str], Iterator[Dict[str, Any]]]:
+        """获取自watermark以来发生变化的数据
+
+        Args:
+            watermark: 上次同步得到的水位，为None时获取全部数据
+
+        Returns:
+            (新的水位, 变化数据的生成器)，获取失败时生成器抛出异常而不是返回空数据，
+            调用方不会保存新的水位
+        """
+        raise NotImplementedError(f"{type(self).__name__}不支持增量同步")
+
+    def change_token(self) -> Any:
+        """返回代表数据源当前内容的标记，供守护模式轮询
+
+        两次返回值不同即认为数据可能发生了变化；返回None表示无法检测，
+        只能由定时或webhook触发重新构建。可能在轮询线程中调用。
+        """
+        return None
+
+    def _get_field_order(self) -> List[str]:
+        """获取字段顺序"""
+        return list(self.field_order)
+
+    def _parse_location(self, location_field: Any) -> "ParsedLocation":
+        """包装一行的location字段，首次查询时解析，之后各平台复用解析结果"""
+        return ParsedLocation(location_field, self.location_url_fallback)
+
+    def _extract_location_url(self, platform_id: str, location_field: Any) -> str:
+        """从location字段中提取特定平台的URL"""
+        return self._parse_location(location_field).url(platform_id)
+
+    def _process_platform_field(
+        self, field_value: Any, location: "ParsedLocation"
+    ) -> List[Dict[str, str]]:
+        """处理platform字段，location为同一行解析后的location"""
+        # 尝试解析JSON字符串
+        if self.parse_platform_string and isinstance(field_value, str):
+            try:
+                field_value = json.loads(field_value)
+            except (json.JSONDecodeError, TypeError):
+                # 如果解析失败，尝试按逗号分割
+                if "," in field_value:
+                    field_value = [p.strip() for p in field_value.split(",")]
+                else:
+                    field_value = [field_value]
+
+        # 处理单选情况
+        if not isinstance(field_value, list):
+            field_value = [field_value]
+
+        # 处理多选情况
+        return [_platform_entry(pid, location.url(pid)) for pid in field_value]
+
+    def _field_converter(self, field_name: str) -> FieldConverter:
+        """返回字段的转换函数，子类可覆盖以调整个别字段的处理方式
+
+        默认实现对应数据库类数据源：None转换为空字符串，platform解析为平台列表，
+        internalName和publishedDate转换为字符串，location尝试解析JSON，富文本取第一段文本。
+        """
+        if field_name == "platform":
+            convert = self._process_platform_field
+        elif field_name == "internalName":
+            convert = lambda value, location: internal_name(value)
+        elif field_name == "publishedDate":
+            # 日期全是TEXT类型，直接返回字符串值，不需要时间戳转换
+            convert = lambda value, location: str(value)
+        elif field_name == "location":
+            convert = _convert_location
+        else:
+            convert = lambda value, location: rich_text(value)
+
+        def convert_or_empty(value: Any, location: Any) -> Any:
+            return "" if value is None else convert(value, location)
+
+        return convert_or_empty
+
+    def _compile_row_normalizer(
+        self, columns: Sequence[str]
+    ) -> Callable[[Sequence[Any]], AppRecord]:
+        """
+        为固定列顺序的行数据编译规范化函数
+
+        按field_order排列输出字段，field_order之外的列追加在后面。
+
+        Args:
+            columns: 行数据中各列的名称
+
+        Returns:
+            normalize(row)，将一行元组直接转换为输出记录（AppRecord）；
+            不记录指标，指标由_normalize_timed()按批记录
+        """
+        index = {name: i for i, name in enumerate(columns)}
+        names = [name for name in self.field_order if name in index]
+        names += [name for name in columns if name not in self.field_order]
+        # 固定字段直接设置属性，其余列保存为额外字段
+        plan = [
+            (name, index[name], self._field_converter(name))
+            for name in names
+            if name in AppRecord._field_set
+        ]
+        extra_plan = [
+            (name, index[name], self._field_converter(name))
+            for name in names
+            if name not in AppRecord._field_set
+        ]
+        location_index = index.get("location")
+
+        url_fallback = self.location_url_fallback
+
+        def normalize(row: Sequence[Any]) -> AppRecord:
+            location = ParsedLocation(
+                row[location_index] if location_index is not None else None,
+                url_fallback,
+            )
+            record = AppRecord()
+            for name, i, convert in plan:
+                setattr(record, name, convert(row[i], location))
+            for name, i, convert in extra_plan:
+                record[name] = convert(row[i], location)
+            return record
+
+        return normalize
+
+    def _normalize_rows(
+        self, columns: Sequence[str], rows: Iterable[Sequence[Any]]
+    ) -> Iterator[AppRecord]:
+        """
+        规范化查询结果的各行
+
+        配置了并行规范化（parallel_normalizer）时，行数较多的查询结果分块在进程池中处理，
+        输出顺序不变。
+
+        Args:
+            columns: 行数据中各列的名称
+            rows: 行数据（列表或逐行读取的迭代器）
+        """
+        if self.parallel_normalizer is not None:
+            return self.parallel_normalizer.normalize(self, columns, rows)
+        return self._normalize_timed(self._compile_row_normalizer(columns), rows)
+
+    def _normalize_identified_rows(
+        self, columns: Sequence[str], rows: Iterable[Sequence[Any]]
+    ) -> Iterator[AppRecord]:
+        """
+        规范化第一列为行标识（如rowid）的查询结果，行标识保存为记录的source_id
+
+        Args:
+            columns: 除行标识外各列的名称
+            rows: 行数据，第一列为行标识
+        """
+        # 规范化（包括并行规范化）按原来的顺序返回，行标识按同样的顺序取出
+        ids: Deque[Any] = deque()
+
+        def data_rows() -> Iterator[Sequence[Any]]:
+            for row in rows:
+                ids.append(row[0])
+                yield row[1:]
+
+        for record in self._normalize_rows(columns, data_rows()):
+            record.source_id = ids.popleft()
+            yield record
+
+    def _normalize_timed(
+        self, normalize: Callable[[Any], AppRecord], items: Iterable[Any]
+    ) -> Iterator[AppRecord]:
+        """
+        逐批规范化并记录处理的记录数和累计耗时
+
+        每批只计时一次、累加一次计数器，不为每行调用perf_counter和加锁；
+        从items读取（如fetchmany）的耗时不计入规范化耗时。
+
+        Args:
+            normalize: 单条记录的规范化函数
+            items: 行数据或字段映射（列表、分页或逐行读取的迭代器）
+        """
+        rows = metrics.counter("qnap_repo_rows_normalized_total", source=self.source_name)
+        seconds = metrics.counter(
+            "qnap_repo_normalize_seconds_total", source=self.source_name
+        )
+        items = iter(items)
+        while True:
+            batch = list(itertools.islice(items, NORMALIZE_BATCH_SIZE))
+            if not batch:
+                return
+            started = time.perf_counter()
+            records = [normalize(item) for item in batch]
+            seconds.inc(time.perf_counter() - started)
+            rows.inc(len(records))
+            yield from records
+
+    def _normalize_fields(self, fields: Mapping[str, Any]) -> AppRecord:
+        """将字段名到字段值的映射（如飞书记录）规范化，只保留field_order中存在的字段
+
+        不记录指标，调用方按分页用_normalize_timed()记录。
+        """
+        if self._mapping_normalizer is None:
+            plan = [
+                (name, self._field_converter(name))
+                for name in self.field_order
+                if name in AppRecord._field_set
+            ]
+            extra_plan = [
+                (name, self._field_converter(name))
+                for name in self.field_order
+                if name not in AppRecord._field_set
+            ]
+            url_fallback = self.location_url_fallback
+
+            def normalize(fields: Mapping[str, Any]) -> AppRecord:
+                location = ParsedLocation(fields.get("location"), url_fallback)
+                record = AppRecord()
+                for name, convert in plan:
+                    if name in fields:
+                        setattr(record, name, convert(fields[name], location))
+                for name, convert in extra_plan:
+                    if name in fields:
+                        record[name] = convert(fields[name], location)
+                return record
+
+            self._mapping_normalizer = normalize
+        return self._mapping_normalizer(fields)
+
+
+def fetch_batches(fetch: Callable[[], Sequence[Any]]) -> Iterator[Any]:
+    """逐行返回fetch()分批读取的结果，直到读到空的批次"""
+    while True:
+        rows = fetch()
+        if not rows:
+            return
+        yield from rows
+
+
+def _platform_entry(platform_id: Any, url: str) -> PlatformEntry:
+    """单个平台的下载信息"""
+    entry = PlatformEntry()
+    entry.platformID = platform_id
+    entry.location = url
+    entry.signature = ""  # 需要根据实际情况填充（见packages.py）
+    return entry
+
+
+def _convert_location(value: Any, location: ParsedLocation) -> Any:
+    """location字段尝试解析JSON，复用同一行的解析结果"""
+    if isinstance(value, str):
+        return location.field_value()
+    return rich_text(value)
@@ -1,19 +1,36 @@
 import json
 import datetime
-from collections import OrderedDict
-from typing import Dict, Any, Iterator, List
+import queue
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 import lark_oapi as lark
 from lark_oapi.api.bitable.v1 import *
 from lark_oapi.api.auth.v3 import *
 
-from .base import DataSource
+from .base import DataSource, FieldConverter, internal_name
+from .records import AppRecord
+from .retry import RequestExecutor
+from .token_cache import tenant_token_cache
 from config import Config
+from metrics import metrics
+
+# 响应中缺少expire时使用的默认有效期（秒），飞书tenant_access_token有效期为2小时
+TOKEN_DEFAULT_EXPIRE = 7200
+# 停止迭代后等待预取线程结束的最长秒数，超时后由守护线程在请求结束时自行退出
+PREFETCH_JOIN_TIMEOUT = 5.0
 
 
 class FeishuDataSource(DataSource):
     """飞书数据源"""
-    
+
+    source_name = "feishu"
+
+    # 飞书的platform为多选/单选字段，location中的字符串只按JSON解析
+    parse_platform_string = False
+    location_url_fallback = False
+
     def __init__(self, config: Config):
         super().__init__()
         self.app_token = config.app_token
@@ -21,15 +38,26 @@ class FeishuDataSource(DataSource):
         self.view_id = config.view_id
         self.app_id = config.app_id
         self.app_secret = config.app_secret
+        self.page_size = config.page_size
+        self.prefetch = config.prefetch
+        self.reverse = config.reverse
+        self.token_cache_file = config.token_cache_file
+        self.modified_field = config.modified_field
+        # 重试、退避及并发限制，同一数据源的分页请求和token请求共用
+        self.executor = RequestExecutor(
+            max_retries=config.max_retries,
+            base_delay=config.retry_base_delay,
+            max_delay=config.retry_max_delay,
+            budget=config.retry_budget,
+            max_concurrency=config.max_concurrent_requests,
+        )
         self.client = None
+        self._auth_client = None
         self._init_client()
 
     def _init_client(self):
         """初始化Lark客户端"""
-        # 获取tenant_access_token
-        token = self._get_tenant_access_token()
-
-        # 创建client
+        # 创建client，token在请求时从缓存中获取
         self.client = (
             lark.Client.builder()
             .enable_set_token(True)
@@ -37,18 +65,30 @@ class FeishuDataSource(DataSource):
             .build()
         )
 
-        return token
+    def _get_tenant_access_token(self) -> Optional[str]:
+        """获取企业自建应用的tenant_access_token（优先使用缓存）"""
+        return tenant_token_cache.get(
+            self.app_id, self._request_tenant_access_token, self.token_cache_file
+        )
 
-    def _get_tenant_access_token(self):
-        """获取企业自建应用的tenant_access_token"""
-        # 创建client
-        auth_client = (
-            lark.Client.builder()
-            .app_id(self.app_id)
-            .app_secret(self.app_secret)
-            .log_level(lark.LogLevel.DEBUG)
-            .build()
+    def _refresh_tenant_access_token(self, invalid_token: str) -> Optional[str]:
+        """丢弃被服务端判定无效的token并获取新token，失败时返回None"""
+        tenant_token_cache.invalidate(
+            self.app_id, invalid_token, self.token_cache_file
         )
+        return self._get_tenant_access_token()
+
+    def _request_tenant_access_token(self) -> Optional[Tuple[str, int]]:
+        """请求新的tenant_access_token，返回(token, expire秒数)"""
+        # 创建client，仅在需要刷新token时创建一次
+        if self._auth_client is None:
+            self._auth_client = (
+                lark.Client.builder()
+                .app_id(self.app_id)
+                .app_secret(self.app_secret)
+                .log_level(lark.LogLevel.DEBUG)
+                .build()
+            )
 
         # 构造请求对象
         request: InternalTenantAccessTokenRequest = (
@@ -62,9 +102,13 @@ class FeishuDataSource(DataSource):
             .build()
         )
 
-        # 发起请求
-        response: InternalTenantAccessTokenResponse = (
-            auth_client.auth.v3.tenant_access_token.internal(request)
+        # 发起请求，临时性失败时重试
+        def send() -> InternalTenantAccessTokenResponse:
+            metrics.counter("qnap_repo_feishu_token_requests_total").inc()
+            return self._auth_client.auth.v3.tenant_access_token.internal(request)
+
+        response: InternalTenantAccessTokenResponse = self.executor.call(
+            send, "获取tenant_access_token"
         )
 
         # 处理失败返回
@@ -76,203 +120,193 @@ class FeishuDataSource(DataSource):
 
         # 处理业务结果
         try:
-            # 尝试不同的响应结构获取token
+            # 优先从原始响应中读取token和expire
+            if hasattr(response, "raw") and hasattr(response.raw, "content"):
+                response_content = json.loads(response.raw.content)
+                if "data" in response_content and isinstance(
+                    response_content["data"], dict
+                ):
+                    response_content = response_content["data"]
+                if "tenant_access_token" in response_content:
+                    return (
+                        response_content["tenant_access_token"],
+                        int(response_content.get("expire", TOKEN_DEFAULT_EXPIRE)),
+                    )
             if hasattr(response, "data") and hasattr(
                 response.data, "tenant_access_token"
             ):
-                return response.data.tenant_access_token
-            elif hasattr(response, "raw") and hasattr(response.raw, "content"):
-                response_content = json.loads(response.raw.content)
-                if "tenant_access_token" in response_content:
-                    return response_content["tenant_access_token"]
-                elif (
-                    "data" in response_content
-                    and "tenant_access_token" in response_content["data"]
-                ):
-                    return response_content["data"]["tenant_access_token"]
+                expire = getattr(response.data, "expire", None) or TOKEN_DEFAULT_EXPIRE
+                return response.data.tenant_access_token, int(expire)
         except Exception:
             pass
         return None
 
-    def _get_field_order(self) -> List[str]:
-        """获取字段顺序"""
-        return [
-            "name",
-            "changeLog",
-            "category",
-            "type",
-            "icon80",
-            "icon100",
-            "description",
-            "fwVersion",
-            "version",
-            "platform",
-            "location",
-            "internalName",
-            "publishedDate",
-            "maintainer",
-            "developer",
-            "forumLink",
-            "language",
-            "snapshot",
-            "bannerImg",
-            "tutorialLink",
-        ]
-
-    def _process_platform_field(
-        self, field_value: Any, fields: Dict[str, Any]
-    ) -> List[Dict[str, str]]:
-        """处理platform字段"""
-        platform_info_list = []
-
-        if isinstance(field_value, list):
-            # 处理多选情况
-            for pid in field_value:
-                location_url = self._extract_location_url(pid, fields.get("location"))
-                platform_info = {
-                    "platformID": pid,
-                    "location": location_url,
-                    "signature": "",  # 需要根据实际情况填充
-                }
-                platform_info_list.append(platform_info)
-        else:
-            # 处理单选情况
-            location_url = self._extract_location_url(
-                field_value, fields.get("location")
-            )
-            platform_info = {
-                "platformID": field_value,
-                "location": location_url,
-                "signature": "",
-            }
-            platform_info_list = [platform_info]
-
-        return platform_info_list
-
-    def _extract_location_url(self, platform_id: str, location_field: Any) -> str:
-        """从location字段中提取特定平台的URL"""
-        if not location_field:
-            return ""
-
-        location_url = ""
-
-        # 处理列表类型的location字段（飞书富文本格式）
-        if isinstance(location_field, list):
-            # 重建JSON字符串，处理text和link类型
-            json_str = ""
-            for item in location_field:
-                if isinstance(item, dict):
-                    if "text" in item:
-                        json_str += item["text"]
-                    elif "link" in item:
-                        json_str += item["link"]
-
-            try:
-                # 解析JSON字符串
-                location_dict = json.loads(json_str.replace("\n", ""))
-                if platform_id in location_dict:
-                    location_url = location_dict[platform_id].strip("` ")
-            except json.JSONDecodeError:
-                # 备用方法：直接查找URL模式
-                import re
-
-                urls = re.findall(
-                    r"https?://[\w\.-]+[\w\-\._~:/?#[\]@!\$&'\(\)\*\+,;=.]+", json_str
-                )
-                if urls and self._platform_id_match(platform_id, json_str):
-                    location_url = urls[0]
-        # 处理字符串类型
-        elif isinstance(location_field, str):
-            try:
-                location_dict = json.loads(location_field.replace("\n", ""))
-                if platform_id in location_dict:
-                    location_url = location_dict[platform_id].strip("` ")
-            except json.JSONDecodeError:
-                pass
-        # 处理字典类型
-        elif isinstance(location_field, dict) and platform_id in location_field:
-            location_url = location_field[platform_id].strip("` ")
-
-        return location_url
-
-    def _platform_id_match(self, platform_id: str, text: str) -> bool:
-        """检查平台ID是否在文本中出现，用于备用URL匹配"""
-        return platform_id.lower() in text.lower()
-
-    def _process_field(
-        self, field_name: str, field_value: Any, fields: Dict[str, Any]
-    ) -> Any:
-        """处理单个字段的值"""
-        if (
-            isinstance(field_value, list)
-            and len(field_value) > 0
-            and "text" in field_value[0]
-        ):
-            return field_value[0]["text"]
-        elif field_name == "platform":
-            return self._process_platform_field(field_value, fields)
+    def _field_converter(self, field_name: str) -> FieldConverter:
+        """飞书字段的转换函数：富文本优先取第一段文本，publishedDate为毫秒级时间戳"""
+        if field_name == "platform":
+            convert = self._process_platform_field
         elif field_name == "internalName":
-            # 确保internalName为字符串类型
-            if isinstance(field_value, dict):
-                return field_value.get("text", str(field_value))
-            elif isinstance(field_value, list):
-                if field_value and isinstance(field_value[0], dict):
-                    return field_value[0].get("text", "")
-                else:
-                    return str(field_value)
-            else:
-                return str(field_value) if field_value is not None else ""
+            convert = lambda value, location: internal_name(value)
         elif field_name == "publishedDate":
-            # 将毫秒级时间戳转换为指定格式的日期时间字符串
-            try:
-                timestamp = int(field_value) / 1000
-                dt = datetime.datetime.fromtimestamp(timestamp)
-                return dt.strftime("%Y-%m-%d %H:%M")
-            except (TypeError, ValueError):
-                return field_value
+            convert = lambda value, location: _format_timestamp(value)
         else:
-            return field_value
+            convert = lambda value, location: value
+
+        def convert_rich_text_first(value: Any, location: Any) -> Any:
+            if isinstance(value, list) and len(value) > 0 and "text" in value[0]:
+                return value[0]["text"]
+            return convert(value, location)
+
+        return convert_rich_text_first
+
+    @property
+    def supports_incremental(self) -> bool:
+        """配置了修改时间字段时支持增量同步"""
+        return bool(self.modified_field)
 
     def fetch_data(self) -> Iterator[Dict[str, Any]]:
-        """获取数据的生成器方法（实现抽象方法）"""
-        # 获取所有应用数据
-        apps_list = self.fetch_and_convert_data()
+        """获取数据的生成器方法（实现抽象方法）
+
+        在转换当前分页的同时，后台线程已在预取后续分页。
+        reverse为True时按视图倒序返回（与历史行为一致），需要等全部分页转换完成；
+        为False时每个分页到达后立即逐条返回。
+        """
+        yield from self._fetch_records()
+
+    def fetch_changes(
+        self, watermark: Optional[str]
+    ) -> Tuple[Optional[str], Iterator[Dict[str, Any]]]:
+        """获取修改时间不早于watermark（毫秒时间戳）的记录（实现增量同步）"""
+        # 以本次请求开始的时间作为新水位；获取失败时抛出异常，调用方不会保存新水位
+        new_watermark = str(int(time.time() * 1000))
+        if watermark is None:
+            return new_watermark, self._fetch_records(strict=True)
+
+        filter_info = (
+            FilterInfo.builder()
+            .conjunction("and")
+            .conditions(
+                [
+                    Condition.builder()
+                    .field_name(self.modified_field)
+                    .operator("isGreaterEqual")
+                    .value(["ExactDate", watermark])
+                    .build()
+                ]
+            )
+            .build()
+        )
+        return new_watermark, self._fetch_records(filter_info, strict=True)
 
-        # 逐个返回应用信息
-        for app_info in apps_list:
-            yield app_info
+    def _fetch_records(
+        self, filter_info=None, strict: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """获取并转换记录
+
+        Args:
+            filter_info: 筛选条件，为None时获取视图中的全部记录
+            strict: 获取token或第一页失败时抛出异常（增量同步使用），
+                为False时不返回任何数据
+        """
+        # 每次获取使用新的重试预算
+        self.executor.start_run()
 
-    def fetch_and_convert_data(self) -> List[Dict[str, Any]]:
-        """从飞书获取数据并转换为apps.json格式"""
         # 获取token
         token = self._get_tenant_access_token()
         if not token:
+            if strict:
+                raise RuntimeError("获取tenant_access_token失败")
             print("获取tenant_access_token失败")
-            return []
+            return
 
         # 获取字段顺序
         field_order = self._get_field_order()
 
+        # 每个分页计时一次，记录规范化指标
+        if not self.reverse:
+            for items in self._iter_pages(field_order, filter_info, strict):
+                yield from self._normalize_timed(self._convert_item, items)
+            return
+
+        apps_list: List[Dict[str, Any]] = []
+        for items in self._iter_pages(field_order, filter_info, strict):
+            apps_list.extend(self._normalize_timed(self._convert_item, items))
+
+        yield from reversed(apps_list)
+
+    def _convert_item(self, item) -> AppRecord:
+        """转换单条飞书记录，record_id保存为记录的source_id"""
+        record = self._normalize_fields(item.fields)
+        record.source_id = item.record_id
+        return record
+
+    def fetch_and_convert_data(self) -> List[Dict[str, Any]]:
+        """从飞书获取数据并转换为apps.json格式"""
+        return list(self.fetch_data())
+
+    def _search_page(
+        self,
+        field_order: List[str],
+        page_token: Optional[str],
+        filter_info=None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[SearchAppTableRecordResponse]:
+        """请求单个分页，失败时返回None
+
+        每次请求从缓存中获取token，token被判定无效时刷新后重试；
+        cancel被设置后不再重试。
+        """
         # 构造请求对象
-        request: SearchAppTableRecordRequest = (
+        builder = (
             SearchAppTableRecordRequest.builder()
             .app_token(self.app_token)
             .table_id(self.table_id)
             .user_id_type("open_id")
-            .page_size(500)  # 单页最大500条记录
-            .request_body(
-                SearchAppTableRecordRequestBody.builder()
-                .view_id(self.view_id)
-                .field_names(field_order)  # 使用定义的字段顺序
-                .build()
-            )
-            .build()
+            .page_size(self.page_size)  # 单页最大500条记录
+        )
+        if page_token:
+            builder = builder.page_token(page_token)
+        body_builder = (
+            SearchAppTableRecordRequestBody.builder()
+            .view_id(self.view_id)
+            .field_names(field_order)  # 使用定义的字段顺序
         )
+        if filter_info is not None:
+            body_builder = body_builder.filter(filter_info)
+        request: SearchAppTableRecordRequest = builder.request_body(
+            body_builder.build()
+        ).build()
 
         # 发起请求
-        option = lark.RequestOption.builder().user_access_token(token).build()
-        response: SearchAppTableRecordResponse = (
-            self.client.bitable.v1.app_table_record.search(request, option)
+        token = self._get_tenant_access_token()
+        if not token:
+            raise RuntimeError("获取tenant_access_token失败")
+
+        def refresh_token() -> bool:
+            nonlocal token
+            token = self._refresh_tenant_access_token(token)
+            return bool(token)
+
+        def send() -> SearchAppTableRecordResponse:
+            option = lark.RequestOption.builder().user_access_token(token).build()
+            started = time.perf_counter()
+            try:
+                response = self.client.bitable.v1.app_table_record.search(
+                    request, option
+                )
+            except Exception:
+                metrics.counter("qnap_repo_feishu_pages_total", result="failure").inc()
+                raise
+            metrics.histogram("qnap_repo_feishu_page_duration_seconds").observe(
+                time.perf_counter() - started
+            )
+            result = "success" if response.success() else "failure"
+            metrics.counter("qnap_repo_feishu_pages_total", result=result).inc()
+            return response
+
+        # 失败时只重试当前分页（page_token不变），已获取的分页不会重新请求
+        response: SearchAppTableRecordResponse = self.executor.call(
+            send, "获取飞书分页数据", refresh_token=refresh_token, cancel=cancel
         )
 
         # 处理失败返回
@@ -280,29 +314,83 @@ class FeishuDataSource(DataSource):
             lark.logger.error(
                 f"client.bitable.v1.app_table_record.search failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}"
             )
-            return []
-
-        # 处理业务结果
-        items = response.data.items
-        apps_list: list[dict] = []
-
-        for item in items:
-            # 使用OrderedDict来保持字段顺序
-            app_info = OrderedDict()
-            fields = item.fields
-
-            # 处理所有字段
-            processed_fields = {}
-            for field_name, field_value in fields.items():
-                processed_fields[field_name] = self._process_field(
-                    field_name, field_value, fields
-                )
-
-            # 按照定义的顺序添加字段
-            for field_name in field_order:
-                if field_name in processed_fields:
-                    app_info[field_name] = processed_fields[field_name]
-
-            apps_list.insert(0, app_info)
+            return None
 
-        return apps_list
+        return response
+
+    def _iter_pages(
+        self,
+        field_order: List[str],
+        filter_info=None,
+        strict: bool = False,
+    ) -> Iterator[list]:
+        """按page_token依次获取所有分页
+
+        后台线程负责请求，最多预取prefetch个分页，调用方转换当前分页时下一页已在请求中。
+        第一页请求失败时不返回任何数据（strict为True时抛出异常）；
+        后续分页失败时抛出异常，避免发布不完整的数据。
+        """
+        pages: queue.Queue = queue.Queue(maxsize=max(self.prefetch, 1))
+        stop = threading.Event()
+
+        def put(entry) -> bool:
+            # 调用方提前停止迭代时及时退出，不在满队列上永久阻塞
+            while not stop.is_set():
+                try:
+                    pages.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            page_token = None
+            page_index = 0
+            try:
+                while not stop.is_set():
+                    response = self._search_page(
+                        field_order, page_token, filter_info, stop
+                    )
+                    if response is None:
+                        put(("error", page_index))
+                        return
+                    data = response.data
+                    if not put(("page", data.items or [])):
+                        return
+                    page_index += 1
+                    if not data.has_more or not data.page_token:
+                        break
+                    page_token = data.page_token
+                put(("done", None))
+            except BaseException as e:
+                put(("exception", e))
+
+        worker = threading.Thread(target=produce, name="feishu-prefetch", daemon=True)
+        worker.start()
+        try:
+            while True:
+                kind, payload = pages.get()
+                if kind == "page":
+                    yield payload
+                elif kind == "done":
+                    return
+                elif kind == "error":
+                    if payload == 0 and not strict:
+                        return
+                    raise RuntimeError(f"获取飞书第{payload + 1}页数据失败")
+                else:
+                    raise payload
+        finally:
+            # 通知预取线程停止（分页之间及重试等待时检查），不等待正在进行的请求太久
+            stop.set()
+            worker.join(PREFETCH_JOIN_TIMEOUT)
+
+
+def _format_timestamp(value: Any) -> Any:
+    """将毫秒级时间戳转换为指定格式的日期时间字符串"""
+    try:
+        timestamp = int(value) / 1000
+        dt = datetime.datetime.fromtimestamp(timestamp)
+        return dt.strftime("%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return value
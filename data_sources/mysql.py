@@ -1,16 +1,19 @@
-import json
 import re
-from collections import OrderedDict
-from typing import Dict, Any, Iterator, List
+from typing import Dict, Any, Iterator, Optional, Tuple
 import pymysql
 
-from .base import DataSource
+from .base import DataSource, fetch_batches
+from .parallel import create_parallel_normalizer
 from config import Config
 
 
 class MySQLDataSource(DataSource):
     """MySQL数据源"""
 
+    source_name = "mysql"
+
+    supports_incremental = True
+
     def __init__(self, config: Config):
         super().__init__()
         # 从配置中获取MySQL连接信息
@@ -20,255 +23,139 @@ class MySQLDataSource(DataSource):
         self.password = config.mysql_password
         self.database = config.mysql_database
         self.charset = config.mysql_charset
-        
+        self.watermark_column = config.mysql_watermark_column
+        self.stream = config.mysql_stream
+        self.batch_size = config.mysql_batch_size
+        self.change_query = config.mysql_change_query
+        # 启用并行规范化时，行数较多的查询结果在进程池中规范化
+        self.parallel_normalizer = create_parallel_normalizer(config)
+        # 守护模式轮询使用的独立连接，只在轮询线程中使用
+        self._poll_conn = None
+
         # 建立数据库连接
-        self.conn = pymysql.connect(
+        self.conn = self._connect()
+        self.cursor = self.conn.cursor()
+
+    def _connect(self) -> pymysql.connections.Connection:
+        """建立数据库连接"""
+        return pymysql.connect(
             host=self.host,
             port=self.port,
             user=self.user,
             password=self.password,
             database=self.database,
-            charset=self.charset
+            charset=self.charset,
         )
-        self.cursor = self.conn.cursor(pymysql.cursors.DictCursor)
 
     def close(self):
         """关闭数据库连接"""
         if self.cursor:
             self.cursor.close()
-        if self.conn:
+        if self.conn and self.conn.open:
             self.conn.close()
-
-    def _get_field_order(self) -> List[str]:
-        """获取字段顺序"""
-        return [
-            "name",
-            "changeLog",
-            "category",
-            "type",
-            "icon80",
-            "icon100",
-            "description",
-            "fwVersion",
-            "version",
-            "platform",
-            "location",
-            "internalName",
-            "publishedDate",
-            "maintainer",
-            "developer",
-            "forumLink",
-            "language",
-            "snapshot",
-            "bannerImg",
-            "tutorialLink",
-        ]
-
-    def _extract_location_url(self, platform_id: str, location_field: Any) -> str:
-        """从location字段中提取特定平台的URL"""
-        if not location_field:
-            return ""
-
-        location_url = ""
-
-        # 处理列表类型的location字段
-        if isinstance(location_field, list):
-            # 重建JSON字符串，处理text和link类型
-            json_str = ""
-            for item in location_field:
-                if isinstance(item, dict):
-                    if "text" in item:
-                        json_str += item["text"]
-                    elif "link" in item:
-                        json_str += item["link"]
-
-            try:
-                # 解析JSON字符串
-                location_dict = json.loads(json_str.replace("\n", ""))
-                if platform_id in location_dict:
-                    location_url = location_dict[platform_id].strip("` ")
-            except json.JSONDecodeError:
-                # 备用方法：直接查找URL模式
-                urls = re.findall(
-                    r"https?://[\w\.-]+[\w\-\._~:/?#[\]@!\$&'\(\)\*\+,;=.]+", json_str
-                )
-                if urls and self._platform_id_match(platform_id, json_str):
-                    location_url = urls[0]
-        # 处理字符串类型
-        elif isinstance(location_field, str):
-            try:
-                location_dict = json.loads(location_field.replace("\n", ""))
-                if platform_id in location_dict:
-                    location_url = location_dict[platform_id].strip("` ")
-            except json.JSONDecodeError:
-                # 如果不是JSON字符串，尝试直接提取URL
-                urls = re.findall(
-                    r"https?://[\w\.-]+[\w\-\._~:/?#[\]@!\$&'\(\)\*\+,;=.]+",
-                    location_field,
-                )
-                if urls:
-                    location_url = urls[0]
-        # 处理字典类型
-        elif isinstance(location_field, dict) and platform_id in location_field:
-            location_url = location_field[platform_id].strip("` ")
-
-        return location_url
-
-    def _platform_id_match(self, platform_id: str, text: str) -> bool:
-        """检查平台ID是否在文本中出现，用于备用URL匹配"""
-        return platform_id.lower() in text.lower()
-
-    def _process_platform_field(
-        self, field_value: Any, fields: Dict[str, Any]
-    ) -> List[Dict[str, str]]:
-        """处理platform字段"""
-        platform_info_list = []
-
-        # 尝试解析JSON字符串
-        if isinstance(field_value, str):
-            try:
-                field_value = json.loads(field_value)
-            except (json.JSONDecodeError, TypeError):
-                # 如果解析失败，尝试按逗号分割
-                if "," in field_value:
-                    field_value = [p.strip() for p in field_value.split(",")]
-                else:
-                    field_value = [field_value]
-
-        if isinstance(field_value, list):
-            # 处理多选情况
-            for pid in field_value:
-                location_url = self._extract_location_url(pid, fields.get("location"))
-                platform_info = {
-                    "platformID": pid,
-                    "location": location_url,
-                    "signature": "",  # 需要根据实际情况填充
-                }
-                platform_info_list.append(platform_info)
-        else:
-            # 处理单选情况
-            location_url = self._extract_location_url(
-                field_value, fields.get("location")
-            )
-            platform_info = {
-                "platformID": field_value,
-                "location": location_url,
-                "signature": "",
-            }
-            platform_info_list = [platform_info]
-
-        return platform_info_list
-
-    def _process_field(
-        self, field_name: str, field_value: Any, fields: Dict[str, Any]
-    ) -> Any:
-        """处理单个字段的值"""
-        if field_value is None:
-            return ""
-
-        if field_name == "platform":
-            return self._process_platform_field(field_value, fields)
-        elif field_name == "internalName":
-            # 确保internalName为字符串类型
-            if isinstance(field_value, dict):
-                return field_value.get("text", str(field_value))
-            elif isinstance(field_value, list):
-                if field_value and isinstance(field_value[0], dict):
-                    return field_value[0].get("text", "")
-                else:
-                    return str(field_value)
-            else:
-                return str(field_value)
-        elif field_name == "publishedDate":
-            # 日期全是TEXT类型，直接返回字符串值，不需要时间戳转换
-            if field_value is None:
-                return ""
-            else:
-                return str(field_value)
-        # 处理location字段，尝试解析JSON
-        elif field_name == "location" and isinstance(field_value, str):
-            try:
-                return json.loads(field_value)
-            except json.JSONDecodeError:
-                return field_value
-        # 处理富文本字段
-        elif (
-            isinstance(field_value, list)
-            and len(field_value) > 0
-            and isinstance(field_value[0], dict)
-            and "text" in field_value[0]
-        ):
-            return field_value[0]["text"]
-        else:
-            return field_value
+        if self._poll_conn and self._poll_conn.open:
+            self._poll_conn.close()
+        if self.parallel_normalizer:
+            self.parallel_normalizer.close()
+
+    def _ensure_connection(self) -> None:
+        """长期运行时连接可能已被服务端断开或因查询出错被关闭，必要时重新连接"""
+        self.conn.ping(reconnect=True)
+        # 结束上一次查询隐式开启的事务，REPEATABLE READ下才能读到之后提交的数据
+        self.conn.commit()
+        if self.cursor.connection is None:
+            self.cursor = self.conn.cursor()
+
+    def change_token(self) -> Any:
+        """执行change_query（默认为行数和水位列最大值），结果变化即认为数据有变化"""
+        query = self.change_query
+        if not query:
+            column = self.watermark_column
+            if not re.fullmatch(r"\w+", column):
+                raise ValueError(f"无效的水位列名: {column}")
+            query = f"SELECT COUNT(*), MAX(`{column}`) FROM data"
+
+        if self._poll_conn is None:
+            self._poll_conn = self._connect()
+        self._poll_conn.ping(reconnect=True)
+        with self._poll_conn.cursor() as cursor:
+            cursor.execute(query)
+            token = cursor.fetchall()
+        self._poll_conn.commit()
+        return token
 
     def fetch_data(self) -> Iterator[Dict[str, Any]]:
         """获取数据的生成器方法（实现抽象方法）"""
-        # 获取字段顺序
-        field_order = self._get_field_order()
+        yield from self._fetch_rows()
+
+    def fetch_changes(
+        self, watermark: Optional[str]
+    ) -> Tuple[Optional[str], Iterator[Dict[str, Any]]]:
+        """获取水位列不小于watermark的数据（实现增量同步）"""
+        column = self.watermark_column
+        if not re.fullmatch(r"\w+", column):
+            raise ValueError(f"无效的水位列名: {column}")
+
+        # 先确定本次同步的新水位，再查询变化的数据
+        self._ensure_connection()
+        self.cursor.execute(f"SELECT MAX(`{column}`) AS watermark FROM data")
+        latest = self.cursor.fetchone()[0]
+        new_watermark = str(latest) if latest is not None else watermark
+
+        if watermark is None:
+            return new_watermark, self._fetch_rows()
+        # 使用>=而非>，同一时间写入的行不会被遗漏，重复获取的行在合并时覆盖
+        return new_watermark, self._fetch_rows(
+            f"WHERE `{column}` >= %s", (watermark,)
+        )
 
+    def _fetch_rows(
+        self, where: str = "", params: tuple = ()
+    ) -> Iterator[Dict[str, Any]]:
+        """查询data表并逐行转换"""
         # 查询数据库 - 使用明确的列名替代SELECT *，更严谨且性能更好
-        # 根据_get_field_order方法中定义的字段顺序来指定查询列
-        columns = [
-            "name",
-            "changeLog",
-            "category",
-            "type",
-            "icon80",
-            "icon100",
-            "description",
-            "fwVersion",
-            "version",
-            "platform",
-            "location",
-            "internalName",
-            "publishedDate",
-            "maintainer",
-            "developer",
-            "forumLink",
-            "language",
-            "snapshot",
-            "bannerImg",
-            "tutorialLink",
-        ]
+        # 按照field_order中定义的字段顺序来指定查询列
+        columns_str = ", ".join(self.field_order)
+        query = f"SELECT {columns_str} FROM data {where}".rstrip()
 
-        # 构建查询语句，使用明确的列名列表
-        columns_str = ", ".join(columns)
-        query = f"SELECT {columns_str} FROM data"
+        if self.stream:
+            yield from self._stream_rows(query, params)
+            return
 
         try:
-            self.cursor.execute(query)
-            # 使用DictCursor时，fetchall()直接返回字典列表
+            self._ensure_connection()
+            self.cursor.execute(query, params or None)
             rows = self.cursor.fetchall()
 
-            # 处理每一行数据
-            for row in rows:
-                # 创建原始字段字典
-                raw_fields = row.copy()
+            # 获取列名
+            columns = [column[0] for column in self.cursor.description]
 
-                # 使用OrderedDict来保持字段顺序
-                app_info = OrderedDict()
+            # 处理每一行数据
+            yield from self._normalize_rows(columns, rows)
+        except Exception as e:
+            print(f"MySQL查询出错: {e}")
+            # 确保发生错误时关闭连接
+            self.close()
+            raise
 
-                # 处理所有字段
-                processed_fields = {}
-                for field_name, field_value in raw_fields.items():
-                    processed_fields[field_name] = self._process_field(
-                        field_name, field_value, raw_fields
-                    )
+    def _stream_rows(self, query: str, params: tuple) -> Iterator[Dict[str, Any]]:
+        """使用服务端游标分批读取结果，客户端只保留当前批次的数据
 
-                # 按照定义的顺序添加字段
-                for field_name in field_order:
-                    if field_name in processed_fields:
-                        app_info[field_name] = processed_fields[field_name]
+        使用独立的连接：生成器结束、出错或被提前放弃时立即关闭该连接，
+        不必像关闭SSCursor那样先读完剩余的结果集。
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.cursor(pymysql.cursors.SSCursor)
+            cursor.execute(query, params or None)
 
-                # 添加其他可能存在的字段
-                for field_name, field_value in processed_fields.items():
-                    if field_name not in app_info:
-                        app_info[field_name] = field_value
+            # 获取列名
+            columns = [column[0] for column in cursor.description]
 
-                yield app_info
+            rows = fetch_batches(lambda: cursor.fetchmany(self.batch_size))
+            yield from self._normalize_rows(columns, rows)
         except Exception as e:
             print(f"MySQL查询出错: {e}")
-            # 确保发生错误时关闭连接
-            self.close()
-            raise
\ No newline at end of file
+            raise
+        finally:
+            conn.close()
@@ -0,0 +1,197 @@
+"""并行规范化
+
+查询结果按chunk_size分块提交到进程池，在工作进程中规范化后按原来的顺序返回。
+同时在途的分块数量有上限，读取和规范化的速度不一致时内存占用也不会随数据量增长。
+行数少于threshold时仍在当前进程中逐行规范化，小目录不必启动进程池。
+
+工作进程以数据源类创建不连接数据库的实例并编译规范化函数，因此规范化只能依赖类属性
+（field_order、parse_platform_string、location_url_fallback及_field_converter等），
+现有的数据库类数据源都满足这一点。进程池在数据源关闭前一直保留，守护模式下各次构建复用。
+"""
+
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from config import Config
+from metrics import metrics
+
+from . import base
+from .base import DataSource
+from .records import AppRecord
+
+# 工作进程中已编译的规范化函数：(数据源类, 列名) -> normalize
+_normalizers: Dict[Tuple[type, Tuple[str, ...]], Callable] = {}
+
+
+def _normalize_chunk(
+    source_class: type, columns: Tuple[str, ...], rows: List[Sequence[Any]]
+) -> Tuple[List[AppRecord], float, float]:
+    """规范化一个分块（在工作进程中执行）
+
+    Returns:
+        (记录列表, 耗时秒数, location改用正则提取URL的次数)，
+        工作进程中的指标不会回到主进程，由主进程累加
+    """
+    key = (source_class, columns)
+    normalize = _normalizers.get(key)
+    if normalize is None:
+        # 只初始化基类，不读取配置也不建立连接
+        source = source_class.__new__(source_class)
+        DataSource.__init__(source)
+        normalize = _normalizers[key] = source._compile_row_normalizer(columns)
+    fallback_before = base._LOCATION_FALLBACK.value
+    started = time.perf_counter()
+    records = [normalize(row) for row in rows]
+    elapsed = time.perf_counter() - started
+    return records, elapsed, base._LOCATION_FALLBACK.value - fallback_before
+
+
+def _chunks(
+    rows: Iterator[Sequence[Any]], size: int
+) -> Iterator[List[Sequence[Any]]]:
+    """按size行分块"""
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ParallelNormalizer:
+    """在进程池中规范化大批量的行数据
+
+    使用方法：
+        parallel = ParallelNormalizer(workers=4, chunk_size=2000, threshold=20000)
+        for app in parallel.normalize(data_source, columns, rows):
+            ...
+        parallel.close()
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        chunk_size: int = 2000,
+        threshold: int = 20000,
+        max_in_flight: int = 0,
+    ):
+        # 进程数，0表示使用CPU核心数
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = max(chunk_size, 1)
+        # 行数少于此值时在当前进程中规范化
+        self.threshold = threshold
+        # 同时提交到进程池的分块数量上限，0表示进程数的2倍
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self._pool = None
+        # 已提交但尚未完成的分块，关闭时取消
+        self._futures: Set[Future] = set()
+
+    def normalize(
+        self,
+        data_source: DataSource,
+        columns: Sequence[str],
+        rows: Iterable[Sequence[Any]],
+    ) -> Iterator[AppRecord]:
+        """
+        规范化查询结果的各行，按原来的顺序返回
+
+        Args:
+            data_source: 数据源实例，工作进程使用其类编译规范化函数
+            columns: 行数据中各列的名称
+            rows: 行数据（列表或逐行读取的迭代器）
+        """
+        columns = tuple(columns)
+        rows = iter(rows)
+        # 先读取threshold行，不足时说明目录较小，直接在当前进程中处理
+        head = list(itertools.islice(rows, self.threshold))
+        if len(head) < self.threshold:
+            normalize = data_source._compile_row_normalizer(columns)
+            yield from data_source._normalize_timed(normalize, head)
+            return
+        yield from self._normalize_parallel(
+            data_source, columns, itertools.chain(head, rows)
+        )
+
+    def _normalize_parallel(
+        self,
+        data_source: DataSource,
+        columns: Tuple[str, ...],
+        rows: Iterator[Sequence[Any]],
+    ) -> Iterator[AppRecord]:
+        rows_total = metrics.counter(
+            "qnap_repo_rows_normalized_total", source=data_source.source_name
+        )
+        seconds = metrics.counter(
+            "qnap_repo_normalize_seconds_total", source=data_source.source_name
+        )
+        pool = self._get_pool()
+        source_class = type(data_source)
+        pending: Deque[Future] = deque()
+
+        def collect(future: Future) -> List[AppRecord]:
+            records, elapsed, fallbacks = future.result()
+            rows_total.inc(len(records))
+            seconds.inc(elapsed)
+            if fallbacks:
+                base._LOCATION_FALLBACK.inc(fallbacks)
+            return records
+
+        try:
+            for chunk in _chunks(rows, self.chunk_size):
+                future = pool.submit(_normalize_chunk, source_class, columns, chunk)
+                self._futures.add(future)
+                future.add_done_callback(self._futures.discard)
+                pending.append(future)
+                if len(pending) >= self.max_in_flight:
+                    # 等待最早的分块，保持原来的顺序并限制在途的数据量
+                    yield from collect(pending.popleft())
+            while pending:
+                yield from collect(pending.popleft())
+        finally:
+            # 出错或生成器被提前放弃时取消尚未开始的分块
+            for future in pending:
+                future.cancel()
+
+    def _get_pool(self):
+        if self._pool is None:
+            # 只在实际需要并行时导入并启动进程池
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self) -> None:
+        """取消尚未开始的分块并关闭进程池"""
+        if self._pool is not None:
+            # 不使用shutdown(cancel_futures=True)，该参数需要Python 3.9
+            for future in list(self._futures):
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self._futures.clear()
+
+
+def create_parallel_normalizer(config: Config) -> Optional[ParallelNormalizer]:
+    """按build配置创建并行规范化器，未启用时返回None"""
+    if not config.parallel_normalize:
+        return None
+    return ParallelNormalizer(
+        workers=config.normalize_workers,
+        chunk_size=config.normalize_chunk_size,
+        threshold=config.normalize_threshold,
+    )
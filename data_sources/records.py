@@ -0,0 +1,197 @@
+"""应用记录类型
+
+数据源输出的每条应用记录为AppRecord，其platform为PlatformEntry列表。两者使用__slots__
+保存字段，内存占用只有同样内容的OrderedDict/dict的几分之一，写出XML时按属性读取字段。
+
+两者都实现了MutableMapping（字典视图）：get、[]、in、keys/items、迭代顺序均与原先的
+OrderedDict一致，不存在的字段与字典中不存在的键行为相同，因此原有按字典处理记录的代码
+无需修改。写出JSON前通过to_plain转换为字典，输出内容不变。
+"""
+
+from collections.abc import MutableMapping
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+# 输出字段顺序
+FIELD_ORDER = (
+    "name",
+    "changeLog",
+    "category",
+    "type",
+    "icon80",
+    "icon100",
+    "description",
+    "fwVersion",
+    "version",
+    "platform",
+    "location",
+    "internalName",
+    "publishedDate",
+    "maintainer",
+    "developer",
+    "forumLink",
+    "language",
+    "snapshot",
+    "bannerImg",
+    "tutorialLink",
+)
+
+# 平台信息的字段顺序，size和sha256只在计算了软件包校验值时出现
+PLATFORM_FIELDS = ("platformID", "location", "signature", "size", "sha256")
+
+_MISSING = object()
+
+
+class SlotRecord(MutableMapping):
+    """以__slots__保存固定字段的记录，未设置的字段视为不存在的键
+
+    _fields之外的键保存在_extra字典中，排在固定字段之后。
+    按slot保存的状态可以直接pickle，并行规范化时由工作进程传回。
+    """
+
+    __slots__ = ("_extra",)
+
+    _fields: Tuple[str, ...] = ()
+    _field_set: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls._fields)
+
+    def __init__(self, items: Iterable[Tuple[str, Any]] = (), **fields):
+        self._extra: Optional[Dict[str, Any]] = None
+        if items:
+            for key, value in items:
+                self[key] = value
+        if fields:
+            for key, value in fields.items():
+                self[key] = value
+
+    @classmethod
+    def from_mapping(cls, mapping) -> "SlotRecord":
+        """由字典等映射创建记录（固定字段按_fields排列）"""
+        return cls(mapping.items())
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_set:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._field_set:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self._field_set:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+                return
+            except AttributeError:
+                pass
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+            return
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._field_set:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self._fields:
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        count = sum(1 for name in self._fields if hasattr(self, name))
+        return count + (len(self._extra) if self._extra else 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """字典视图：与原先的OrderedDict键顺序相同"""
+        result = {
+            name: value
+            for name in self._fields
+            if (value := getattr(self, name, _MISSING)) is not _MISSING
+        }
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def copy(self) -> "SlotRecord":
+        record = type(self)()
+        for name in self._fields:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                setattr(record, name, value)
+        if self._extra:
+            record._extra = dict(self._extra)
+        return record
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.to_dict())!r})"
+
+
+class PlatformEntry(SlotRecord):
+    """单个平台的下载信息"""
+
+    _fields = PLATFORM_FIELDS
+    __slots__ = PLATFORM_FIELDS
+
+
+class AppRecord(SlotRecord):
+    """单个应用的规范化记录
+
+    source_id为数据源中的行标识（如SQLite的rowid、飞书的record_id），不属于记录的字段，
+    不写入输出文件，增量同步时用于匹配快照中的记录。
+    """
+
+    _fields = FIELD_ORDER
+    __slots__ = FIELD_ORDER + ("source_id",)
+
+
+def field_getter(record: Any) -> Callable[[str, Any], Any]:
+    """读取固定字段的函数get(name, default)：记录直接读取属性，字典使用dict.get"""
+    if not isinstance(record, dict) and isinstance(record, SlotRecord):
+        return partial(getattr, record)
+    return record.get
+
+
+def to_plain(value: Any) -> Any:
+    """将记录（及其platform中的PlatformEntry）转换为普通字典，其他值原样返回
+
+    写出大量记录时先转换再交给json，比通过default逐个回调快得多。
+    """
+    if not isinstance(value, SlotRecord):
+        return value
+    result = value.to_dict()
+    platforms = result.get("platform")
+    if isinstance(platforms, list):
+        result["platform"] = [
+            p.to_dict() if isinstance(p, SlotRecord) else p for p in platforms
+        ]
+    return result
+
+
+def to_json(value: Any) -> Any:
+    """json.dump的default参数：将记录转换为字典"""
+    if isinstance(value, SlotRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
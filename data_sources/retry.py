@@ -0,0 +1,193 @@
+"""飞书API请求的重试模块"""
+
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+from metrics import metrics
+
+# 需要限速重试的HTTP状态码及可重试的服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 飞书的频率限制错误码：99991400 应用请求频率超限，1254290 多维表格请求过于频繁
+RATE_LIMIT_CODES = {99991400, 1254290}
+
+# 其余可重试的飞书错误码：1254291 写冲突（批量编辑时常见），1254607 数据未就绪，
+# 1255040 请求超时
+RETRYABLE_CODES = RATE_LIMIT_CODES | {1254291, 1254607, 1255040}
+
+# token无效或已过期的飞书错误码，丢弃缓存的token并获取新token后重试一次
+TOKEN_INVALID_CODES = {99991663, 99991664, 99991668, 99991677}
+
+# 可重试的传输层异常（连接失败、超时），除内置的ConnectionError和TimeoutError外，
+# 只在对应模块已被导入时检查，不为此导入requests/httpx
+TRANSPORT_ERRORS = (
+    ("requests.exceptions", "ConnectionError"),
+    ("requests.exceptions", "Timeout"),
+    ("requests.exceptions", "ChunkedEncodingError"),
+    ("httpx", "TransportError"),
+)
+
+
+class RequestExecutor:
+    """带有限重试、指数退避和并发限制的请求执行器
+
+    每次构建调用start_run()开始新的重试预算：同一次构建中所有请求的总耗时（含等待）
+    超过budget秒后不再重试，避免API持续不稳定时任务长时间挂起。
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget: float = 300.0,
+        max_concurrency: int = 2,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_retries = max(max_retries, 0)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._sleep = sleep
+        self._clock = clock
+        self._semaphore = threading.BoundedSemaphore(max(max_concurrency, 1))
+        self._deadline: Optional[float] = None
+
+    def start_run(self) -> None:
+        """开始新一次构建的重试预算"""
+        self._deadline = self._clock() + self.budget if self.budget > 0 else None
+
+    def remaining(self) -> float:
+        """本次构建剩余的重试预算（秒）"""
+        if self._deadline is None:
+            return float("inf")
+        return self._deadline - self._clock()
+
+    def call(
+        self,
+        request: Callable[[], Any],
+        name: str,
+        refresh_token: Optional[Callable[[], bool]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Any:
+        """
+        执行请求，失败且可重试时只重试本次请求
+
+        只重试传输层异常（连接失败、超时）、限流及可重试的错误码；
+        token无效时调用refresh_token丢弃缓存并获取新token，成功则立即重试一次。
+
+        Args:
+            request: 发起请求的函数，返回带success()方法的lark响应
+            name: 请求名称，用于输出信息
+            refresh_token: 刷新token的函数，返回是否获取到新token；为None时token无效不重试
+            cancel: 设置后不再重试，等待退避时也会立即结束
+
+        Returns:
+            最后一次请求的响应；不可重试、重试用尽或被取消时返回失败的响应，
+            请求本身抛出的异常不重试或重试结束时重新抛出
+        """
+        attempt = 0
+        token_refreshed = False
+        while True:
+            attempt += 1
+            response = None
+            error: Optional[Exception] = None
+            with self._semaphore:
+                try:
+                    response = request()
+                except Exception as e:
+                    error = e
+            if error is None and response.success():
+                return response
+
+            reason, wait = _classify(response, error)
+            if reason == "token_invalid":
+                if refresh_token is None or token_refreshed or not refresh_token():
+                    print(f"{name}失败（{reason}），不再重试")
+                    return response
+                token_refreshed = True
+                metrics.counter("qnap_repo_feishu_retries_total", reason=reason).inc()
+                print(f"{name}失败（{reason}），已获取新的token，第{attempt + 1}次尝试")
+                continue
+            if reason is None:
+                if error is not None:
+                    raise error
+                return response
+            delay = max(wait, self._backoff(attempt))
+            if (
+                attempt > self.max_retries
+                or delay > self.remaining()
+                or (cancel is not None and cancel.is_set())
+            ):
+                print(f"{name}失败（{reason}），已尝试{attempt}次，不再重试")
+                if error is not None:
+                    raise error
+                return response
+
+            metrics.counter("qnap_repo_feishu_retries_total", reason=reason).inc()
+            print(f"{name}失败（{reason}），{delay:.1f}秒后第{attempt + 1}次尝试")
+            if cancel is None:
+                self._sleep(delay)
+            elif cancel.wait(delay):
+                print(f"{name}已取消")
+                if error is not None:
+                    raise error
+                return response
+
+    def _backoff(self, attempt: int) -> float:
+        """带随机抖动的指数退避，多个任务同时失败时不会同时重试"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+def _classify(
+    response: Any, error: Optional[Exception]
+) -> Tuple[Optional[str], float]:
+    """判断失败是否可重试，返回(原因, 服务端要求等待的秒数)，不可重试时原因为None
+
+    token无效时原因为"token_invalid"，由调用方刷新token后重试。
+    """
+    if error is not None:
+        if _is_transport_error(error):
+            return type(error).__name__, 0.0
+        return None, 0.0
+
+    raw = getattr(response, "raw", None)
+    status = getattr(raw, "status_code", None)
+    code = getattr(response, "code", None)
+    if code in TOKEN_INVALID_CODES:
+        return "token_invalid", 0.0
+    wait = _rate_limit_wait(getattr(raw, "headers", None) or {})
+    if status == 429 or code in RATE_LIMIT_CODES:
+        return "rate_limited", wait
+    if code in RETRYABLE_CODES:
+        return f"code_{code}", wait
+    if status in RETRYABLE_STATUS:
+        return f"http_{status}", wait
+    return None, 0.0
+
+
+def _is_transport_error(error: Exception) -> bool:
+    """连接失败或超时等传输层异常"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    for module_name, class_name in TRANSPORT_ERRORS:
+        error_class = getattr(sys.modules.get(module_name), class_name, None)
+        if isinstance(error_class, type) and isinstance(error, error_class):
+            return True
+    return False
+
+
+def _rate_limit_wait(headers: Mapping[str, Any]) -> float:
+    """从响应头读取限流重置时间（x-ogw-ratelimit-reset或Retry-After，单位秒）"""
+    lowered = {str(k).lower(): v for k, v in headers.items()}
+    for name in ("x-ogw-ratelimit-reset", "retry-after"):
+        try:
+            return max(float(lowered[name]), 0.0)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 0.0
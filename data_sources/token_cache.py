@@ -0,0 +1,117 @@
+"""tenant_access_token 缓存模块"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class TenantTokenCache:
+    """tenant_access_token缓存
+
+    按app_id缓存token及其过期时间，在过期前refresh_margin秒内自动刷新。
+    同一进程内的所有数据源实例共享同一个缓存；指定cache_file时还会持久化到本地文件，
+    以便间隔很短的定时任务复用仍然有效的token。
+    """
+
+    def __init__(self, refresh_margin: int = 300):
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        app_id: str,
+        fetch: Callable[[], Optional[Tuple[str, int]]],
+        cache_file: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        获取有效的token，必要时调用fetch刷新
+
+        Args:
+            app_id: 飞书应用ID
+            fetch: 请求新token的函数，返回(token, expire秒数)，失败时返回None
+            cache_file: 持久化文件路径，为空时仅在进程内缓存
+
+        Returns:
+            有效的token，刷新失败时返回None
+        """
+        with self._lock:
+            token = self._lookup(app_id)
+            if token is None and cache_file:
+                self._tokens.update(self._load(cache_file))
+                token = self._lookup(app_id)
+            if token is not None:
+                return token
+
+            result = fetch()
+            if not result:
+                return None
+            token, expire = result
+            self._tokens[app_id] = (token, time.time() + expire)
+            if cache_file:
+                self._save(cache_file)
+            return token
+
+    def invalidate(
+        self,
+        app_id: str,
+        token: Optional[str] = None,
+        cache_file: Optional[str] = None,
+    ) -> None:
+        """
+        丢弃缓存的token（例如token被服务端判定无效时）
+
+        Args:
+            app_id: 飞书应用ID
+            token: 被判定无效的token，缓存中已是其他token（已被刷新）时不丢弃
+            cache_file: 持久化文件路径，指定时同时从文件中删除，避免重新读取到无效的token
+        """
+        with self._lock:
+            if cache_file:
+                self._tokens = {**self._load(cache_file), **self._tokens}
+            entry = self._tokens.get(app_id)
+            if entry is None or (token is not None and entry[0] != token):
+                return
+            del self._tokens[app_id]
+            if cache_file:
+                self._save(cache_file)
+
+    def _lookup(self, app_id: str) -> Optional[str]:
+        entry = self._tokens.get(app_id)
+        if entry and entry[1] - self.refresh_margin > time.time():
+            return entry[0]
+        return None
+
+    def _load(self, cache_file: str) -> Dict[str, Tuple[str, float]]:
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {
+                app_id: (entry["token"], float(entry["expire_at"]))
+                for app_id, entry in data.items()
+            }
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
+
+    def _save(self, cache_file: str) -> None:
+        now = time.time()
+        data = {
+            app_id: {"token": token, "expire_at": expire_at}
+            for app_id, (token, expire_at) in self._tokens.items()
+            if expire_at > now
+        }
+        temp_file = f"{cache_file}.tmp"
+        try:
+            # token属于敏感信息，仅允许当前用户读写
+            fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            print(f"写入token缓存文件失败: {e}")
+
+
+# 进程内共享的缓存实例
+tenant_token_cache = TenantTokenCache()
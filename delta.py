@@ -0,0 +1,272 @@
+"""增量更新模块
+
+保存上次构建的规范化记录，每次仓库文件更新时与本次构建比较，生成新增、删除和修改的
+应用及字段级差异。版本以记录内容的摘要标识（16位十六进制），同一分钟内的多次构建
+也不会混淆；内容没有变化时不生成增量。镜像和Web查看器只需下载从自己的版本到最新版本
+之间的增量文件，不必重新下载完整的repo.xml和apps.json。
+
+输出目录结构：
+    delta/
+        history.json          # 最近N次增量的索引
+        <from>-<to>.json      # 从上一版本到该版本的增量
+        state.json            # 上次构建的版本和记录（内部使用）
+
+增量文件格式：
+    {
+        "version": 1,
+        "from": "上一版本",
+        "to": "本版本",
+        "cachechk": "本次构建的cachechk",
+        "added": [完整的应用数据, ...],
+        "removed": ["internalName", ...],
+        "changed": [
+            {
+                "internalName": "...",
+                "fields": {"version": {"old": "1.0", "new": "1.1"}, ...},
+                "platforms": {
+                    "TS-NASX86": {"old": {...} | null, "new": {...} | null}, ...
+                }
+            }, ...
+        ]
+    }
+
+history.json 格式：
+    {
+        "version": 1,
+        "latest": "最新版本",
+        "deltas": [
+            {"from": "...", "to": "...", "cachechk": "...", "file": "<from>-<to>.json",
+             "added": 数量, "removed": 数量, "changed": 数量, "createdAt": "..."},
+            ...   # 按时间先后排列
+        ]
+    }
+
+客户端保存所应用增量的to作为自己的版本，从history.json中找到from等于自己版本的条目，
+依次应用之后的增量即可追上最新版本；自己的版本已不在历史中时重新下载完整数据，
+并以history.json的latest作为自己的版本。
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from data_sources.records import to_json, to_plain
+from snapshot import record_key
+
+STATE_FILE = "state.json"
+HISTORY_FILE = "history.json"
+
+
+def catalog_version(records: Dict[str, Dict[str, Any]]) -> str:
+    """按internalName排序后对记录内容计算sha256，取前16位作为版本"""
+    digest = hashlib.sha256()
+    for key in sorted(records):
+        text = json.dumps(
+            to_plain(records[key]),
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+def _platform_map(app: Dict[str, Any]) -> Dict[str, Any]:
+    """按platformID索引的平台信息"""
+    platforms = app.get("platform", [])
+    if isinstance(platforms, Mapping):
+        platforms = [platforms]
+    result = {}
+    for platform in platforms:
+        if isinstance(platform, Mapping):
+            result[str(platform.get("platformID", ""))] = platform
+    return result
+
+
+def diff_app(old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """比较同一应用的两个版本，没有差异时返回None"""
+    fields = OrderedDict()
+    for name in list(old) + [name for name in new if name not in old]:
+        if name == "platform":
+            continue
+        if old.get(name) != new.get(name):
+            fields[name] = {"old": old.get(name), "new": new.get(name)}
+
+    platforms = OrderedDict()
+    old_platforms = _platform_map(old)
+    new_platforms = _platform_map(new)
+    pids = list(old_platforms) + [p for p in new_platforms if p not in old_platforms]
+    for pid in pids:
+        before, after = old_platforms.get(pid), new_platforms.get(pid)
+        if before != after:
+            platforms[pid] = {"old": before, "new": after}
+
+    if not fields and not platforms:
+        return None
+    change: Dict[str, Any] = {"internalName": record_key(new)}
+    if fields:
+        change["fields"] = fields
+    if platforms:
+        change["platforms"] = platforms
+    return change
+
+
+def diff_catalogs(
+    old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]
+) -> Dict[str, List[Any]]:
+    """比较两次构建的记录（internalName -> 应用），返回新增、删除和修改的应用"""
+    changed = []
+    for key, app in new.items():
+        if key in old:
+            change = diff_app(old[key], app)
+            if change is not None:
+                changed.append(change)
+    return {
+        "added": [app for key, app in new.items() if key not in old],
+        "removed": [key for key in old if key not in new],
+        "changed": changed,
+    }
+
+
+class DeltaWriter:
+    """记录本次构建的应用并生成与上次构建之间的增量
+
+    使用方法：
+        delta = DeltaWriter("delta", history=20)
+        for app in delta.collect(apps):
+            ...
+        delta.commit(cachechk)   # 仓库文件更新后调用
+    """
+
+    def __init__(self, output_dir: str, history: int = 20):
+        self.output_dir = output_dir
+        # history.json中保留的增量数量
+        self.history = max(history, 1)
+        self.records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def collect(self, apps: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """逐个记录应用并原样返回"""
+        for app in apps:
+            # 同一internalName出现多次时以最后一次为准，与覆盖写入的结果一致
+            self.records[record_key(app)] = app
+            yield app
+
+    def has_state(self) -> bool:
+        """是否已记录过构建（state.json存在）"""
+        return os.path.exists(os.path.join(self.output_dir, STATE_FILE))
+
+    def commit(self, cachechk: str) -> Optional[Dict[str, Any]]:
+        """
+        生成增量文件并更新历史索引和记录
+
+        Args:
+            cachechk: 本次构建的cachechk，记录在增量和历史索引中
+
+        Returns:
+            增量内容；首次构建或内容没有变化时返回None
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        state = self._load_json(STATE_FILE) or {}
+        # 旧版本的记录以cachechk标识版本
+        previous = state.get("id") or state.get("cachechk")
+        version = catalog_version(self.records)
+        delta = None
+        if previous:
+            if previous == version:
+                return None
+            changes = diff_catalogs(state.get("records") or {}, self.records)
+            if not any(changes.values()):
+                # 只有顺序变化，保留上次的版本和记录，客户端不需要更新
+                return None
+            delta = OrderedDict(version=1)
+            delta["from"] = previous
+            delta["to"] = version
+            delta["cachechk"] = cachechk
+            delta.update(changes)
+            self._write_json(self._delta_file(previous, version), delta)
+            self._update_history(delta)
+            print(
+                f"已生成增量 {previous} -> {version}：新增{len(delta['added'])}个，"
+                f"删除{len(delta['removed'])}个，修改{len(delta['changed'])}个应用"
+            )
+        else:
+            # 首次构建只记录最新版本，下载完整数据的客户端以此作为自己的版本
+            self._write_json(
+                HISTORY_FILE, {"version": 1, "latest": version, "deltas": []}
+            )
+        # 增量和历史索引写入后才更新记录，中途失败时下次构建仍与上次成功记录的版本比较
+        self._write_json(
+            STATE_FILE, {"id": version, "cachechk": cachechk, "records": self.records}
+        )
+        return delta
+
+    def _update_history(self, delta: Dict[str, Any]) -> None:
+        history = self._load_json(HISTORY_FILE) or {}
+        previous_entries = [
+            e for e in history.get("deltas", []) if isinstance(e, Mapping)
+        ]
+        entries = previous_entries + [
+            {
+                "from": delta["from"],
+                "to": delta["to"],
+                "cachechk": delta["cachechk"],
+                "file": self._delta_file(delta["from"], delta["to"]),
+                "added": len(delta["added"]),
+                "removed": len(delta["removed"]),
+                "changed": len(delta["changed"]),
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            }
+        ]
+        entries = entries[-self.history :]
+        self._write_json(
+            HISTORY_FILE, {"version": 1, "latest": delta["to"], "deltas": entries}
+        )
+
+        # 只删除移出历史的条目所记录的增量文件，目录中的其他文件不受影响
+        current = {entry["file"] for entry in entries}
+        for entry in previous_entries:
+            name = entry.get("file")
+            if (
+                not isinstance(name, str)
+                or name in current
+                or name in (STATE_FILE, HISTORY_FILE)
+                or name != os.path.basename(name)
+                or not name.endswith(".json")
+            ):
+                continue
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _delta_file(previous: str, version: str) -> str:
+        return f"{previous}-{version}.json"
+
+    def _load_json(self, name: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.output_dir, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else None
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"读取{path}失败: {e}")
+            return None
+
+    def _write_json(self, name: str, data: Any) -> None:
+        """原子写入JSON文件"""
+        path = os.path.join(self.output_dir, name)
+        temp_file = f"{path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(
+                data, f, ensure_ascii=False, separators=(",", ":"), default=to_json
+            )
+        os.replace(temp_file, path)
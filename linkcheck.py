@@ -0,0 +1,404 @@
+"""链接检查模块
+
+检查应用的下载地址（各平台的location）和图片地址（icon80、icon100、snapshot、bannerImg）
+是否可以访问：
+
+- 基于asyncio，对每个不重复的URL发送HEAD请求（服务器不支持HEAD时改用只取第一个字节的GET）
+- 按主机限制并发数，同一主机的请求复用keep-alive连接
+- 结果按TTL缓存到本地文件，未过期的URL不重复检查；过期后携带ETag/Last-Modified发送条件请求
+- 检查结束后写出JSON报告，列出失效的链接及引用它们的应用
+
+也可以单独检查已生成的apps.json：
+    python linkcheck.py apps.json [--report link_report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import SplitResult, quote, urljoin, urlsplit
+
+# 需要检查的应用图片字段
+IMAGE_FIELDS = ("icon80", "icon100", "snapshot", "bannerImg")
+
+REDIRECT_STATUS = {301, 302, 303, 307, 308}
+# 服务器不支持HEAD时返回的状态码
+HEAD_UNSUPPORTED = {405, 501}
+USER_AGENT = "QnapclubCN-repo-linkcheck/1.0"
+# 请求行中保持原样的字符（RFC 3986的保留字符及已有的百分号编码）
+PATH_SAFE = "/%:@!$&'()*+,;="
+QUERY_SAFE = PATH_SAFE + "?"
+
+
+class LinkCollector:
+    """收集应用中需要检查的URL，记录每个URL被哪些应用的哪个字段引用
+
+    使用方法：
+        collector = LinkCollector()
+        for app in collector.collect(apps):
+            ...
+        collector.urls  # {url: [(internalName, 字段), ...]}
+    """
+
+    def __init__(self):
+        self.urls: "OrderedDict[str, List[Tuple[str, str]]]" = OrderedDict()
+
+    def collect(self, apps: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """逐个记录应用中的URL并原样返回应用"""
+        for app in apps:
+            self.add(app)
+            yield app
+
+    def add(self, app: Dict[str, Any]) -> None:
+        name = str(app.get("internalName") or app.get("name", ""))
+        platforms = app.get("platform", [])
+        if isinstance(platforms, Mapping):
+            platforms = [platforms]
+        for platform in platforms:
+            if isinstance(platform, Mapping):
+                field = f"location[{platform.get('platformID', '')}]"
+                self._add(platform.get("location"), name, field)
+        for field in IMAGE_FIELDS:
+            self._add(app.get(field), name, field)
+
+    def _add(self, url: Any, name: str, field: str) -> None:
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            return
+        self.urls.setdefault(url, []).append((name, field))
+
+
+class LinkCache:
+    """链接检查结果缓存，按URL保存状态码、检查时间及ETag/Last-Modified"""
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> "LinkCache":
+        if not self.path:
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            if isinstance(entries, dict):
+                self.entries = entries
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"读取链接检查缓存失败，将重新检查: {e}")
+        return self
+
+    def fresh(self, url: str, now: float) -> Optional[Dict[str, Any]]:
+        """未过期的结果；失效的链接不缓存，每次都重新检查"""
+        entry = self.entries.get(url)
+        if entry and entry.get("ok") and now - entry.get("checked_at", 0) < self.ttl:
+            return entry
+        return None
+
+    def save(self, urls: Iterable[str]) -> None:
+        """原子写入缓存，只保留本次出现的URL"""
+        if not self.path:
+            return
+        entries = {url: self.entries[url] for url in urls if url in self.entries}
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, sort_keys=True)
+        os.replace(temp_file, self.path)
+
+
+class _HostPool:
+    """单个主机的连接池，限制并发请求数并复用空闲的keep-alive连接"""
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    def close(self) -> None:
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class LinkChecker:
+    """并发检查URL是否可以访问"""
+
+    def __init__(
+        self,
+        per_host: int = 4,
+        timeout: float = 10,
+        max_redirects: int = 5,
+        ttl: float = 86400,
+        cache_file: str = "",
+    ):
+        # 每个主机同时进行的请求数
+        self.per_host = max(per_host, 1)
+        # 单个请求（连接、发送及读取响应头）的超时秒数
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.cache = LinkCache(cache_file, ttl)
+        self._pools: Dict[Tuple[str, str, int], _HostPool] = {}
+        self._ssl: Optional[ssl.SSLContext] = None
+
+    def check(self, urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """检查所有URL，返回 {url: 结果}，结果包含ok、status、error及是否来自缓存"""
+        return asyncio.run(self.check_all(list(urls)))
+
+    async def check_all(self, urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        self.cache.load()
+        now = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = []
+        for url in urls:
+            entry = self.cache.fresh(url, now)
+            if entry is not None:
+                results[url] = dict(entry, cached=True)
+            else:
+                pending.append(url)
+        try:
+            checked = await asyncio.gather(*(self._check_url(url) for url in pending))
+        finally:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+        for url, result in zip(pending, checked):
+            self.cache.entries[url] = result
+            results[url] = dict(result, cached=False)
+        self.cache.save(urls)
+        return results
+
+    async def _check_url(self, url: str) -> Dict[str, Any]:
+        """检查单个URL，跟随重定向"""
+        previous = self.cache.entries.get(url) or {}
+        headers = {}
+        if previous.get("ok"):
+            # 上次可以访问时发送条件请求，未变化的资源只返回304
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+
+        result: Dict[str, Any] = {"checked_at": time.time()}
+        target = url
+        try:
+            for _ in range(self.max_redirects + 1):
+                status, response_headers = await self._request(target, "HEAD", headers)
+                if status in HEAD_UNSUPPORTED:
+                    status, response_headers = await self._request(
+                        target, "GET", dict(headers, Range="bytes=0-0")
+                    )
+                location = response_headers.get("location")
+                if status in REDIRECT_STATUS and location:
+                    target = urljoin(target, location)
+                    continue
+                break
+        except (
+            OSError,
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            ValueError,
+        ) as e:
+            result.update(ok=False, status=None, error=f"{type(e).__name__}: {e}")
+            return result
+
+        result.update(ok=200 <= status < 400 and status not in REDIRECT_STATUS)
+        result["status"] = status
+        if target != url:
+            result["final_url"] = target
+        if status == 304:
+            # 未变化，沿用上次的校验信息
+            for key in ("etag", "last_modified"):
+                if previous.get(key):
+                    result[key] = previous[key]
+        else:
+            if response_headers.get("etag"):
+                result["etag"] = response_headers["etag"]
+            if response_headers.get("last-modified"):
+                result["last_modified"] = response_headers["last-modified"]
+        if not result["ok"]:
+            result["error"] = f"HTTP {status}"
+        return result
+
+    async def _request(
+        self, url: str, method: str, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str]]:
+        """发送请求并读取响应头，返回(状态码, 小写键名的响应头)"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"不支持的URL: {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        hostname, path = _request_target(parts)
+        key = (parts.scheme, hostname, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _HostPool(self.per_host)
+
+        host = f"[{hostname}]" if ":" in hostname else hostname
+        if parts.port is not None:
+            host = f"{host}:{port}"
+        # HEAD没有响应体，连接可以复用；GET只取响应头，之后关闭连接
+        keep_alive = method == "HEAD"
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {host}",
+            f"User-Agent: {USER_AGENT}",
+            "Accept: */*",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        async with pool.semaphore:
+            # 复用的空闲连接可能已被服务器关闭，此时换用新连接重试一次
+            while True:
+                reused = bool(pool.idle)
+                if reused:
+                    reader, writer = pool.idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        self._open(parts.scheme, hostname, port), self.timeout
+                    )
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), self.timeout
+                    )
+                    break
+                except (OSError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if not reused:
+                        raise
+                except BaseException:
+                    writer.close()
+                    raise
+
+            status, response_headers = _parse_head(head)
+            closing = response_headers.get("connection", "").lower() == "close"
+            if keep_alive and not closing:
+                pool.idle.append((reader, writer))
+            else:
+                writer.close()
+        return status, response_headers
+
+    async def _open(self, scheme: str, hostname: str, port: int):
+        if scheme == "https":
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context()
+            return await asyncio.open_connection(hostname, port, ssl=self._ssl)
+        return await asyncio.open_connection(hostname, port)
+
+
+def _request_target(parts: SplitResult) -> Tuple[str, str]:
+    """请求使用的主机名和路径
+
+    主机名按IDNA编码，路径和查询字符串中的非ASCII字符及空格按UTF-8百分号编码，
+    已经编码的部分保持不变。主机名不合法时抛出UnicodeError（ValueError的子类）。
+    """
+    hostname = parts.hostname or ""
+    if not hostname.isascii():
+        hostname = hostname.encode("idna").decode("ascii")
+    path = quote(parts.path or "/", safe=PATH_SAFE)
+    if parts.query:
+        path += "?" + quote(parts.query, safe=QUERY_SAFE)
+    return hostname, path
+
+
+def _parse_head(head: bytes) -> Tuple[int, Dict[str, str]]:
+    """解析状态行和响应头"""
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ValueError(f"无效的响应: {lines[0]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return int(parts[1]), headers
+
+
+def build_report(
+    urls: Dict[str, List[Tuple[str, str]]], results: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """链接检查报告：统计数据及失效链接的详情"""
+    broken = []
+    for url, refs in urls.items():
+        result = results.get(url, {})
+        if result.get("ok"):
+            continue
+        broken.append(
+            {
+                "url": url,
+                "status": result.get("status"),
+                "error": result.get("error"),
+                "apps": [{"internalName": name, "field": field} for name, field in refs],
+            }
+        )
+    return {
+        "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "total": len(urls),
+        "cached": sum(1 for r in results.values() if r.get("cached")),
+        "broken_count": len(broken),
+        "broken": broken,
+    }
+
+
+def write_report(path: str, report: Dict[str, Any]) -> None:
+    """原子写入链接检查报告"""
+    temp_file = f"{path}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, path)
+
+
+def check_links(
+    collector: LinkCollector, checker: LinkChecker, report_file: str = ""
+) -> Dict[str, Any]:
+    """检查收集到的所有URL，输出统计信息并写出报告"""
+    results = checker.check(collector.urls)
+    report = build_report(collector.urls, results)
+    print(
+        f"检查了{report['total']}个链接（{report['cached']}个来自缓存），"
+        f"{report['broken_count']}个无法访问"
+    )
+    for entry in report["broken"][:10]:
+        print(f"  {entry['url']}: {entry['error']}")
+    if report_file:
+        write_report(report_file, report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查apps.json中的下载地址和图片地址")
+    parser.add_argument("apps_json", nargs="?", default="apps.json")
+    parser.add_argument("--report", default="link_report.json", help="报告输出路径")
+    parser.add_argument("--cache", default="", help="结果缓存文件，留空不缓存")
+    parser.add_argument("--ttl", type=float, default=86400, help="缓存有效期（秒）")
+    parser.add_argument("--per-host", type=int, default=4, help="每个主机的并发数")
+    parser.add_argument("--timeout", type=float, default=10, help="请求超时（秒）")
+    args = parser.parse_args()
+
+    with open(args.apps_json, "r", encoding="utf-8") as f:
+        apps = json.load(f)
+    collector = LinkCollector()
+    for app in apps:
+        collector.add(app)
+    checker = LinkChecker(
+        per_host=args.per_host,
+        timeout=args.timeout,
+        ttl=args.ttl,
+        cache_file=args.cache,
+    )
+    report = check_links(collector, checker, args.report)
+    raise SystemExit(1 if report["broken_count"] else 0)
+
+
+if __name__ == "__main__":
+    main()
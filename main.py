@@ -1,37 +1,303 @@
+import functools
 import json
+import os
+from contextlib import ExitStack
 
-from config import config_instance
-from data_sources import FeishuDataSource, SQLiteDataSource, MySQLDataSource
-from update_repo import update_repo
+from catalog_index import CatalogIndexWriter
+from config import Config, get_config
+from data_sources.records import to_plain
+from metrics import metrics
+from pipeline import (
+    CatalogDigest,
+    build_outputs,
+    cachechk_from_digest,
+    is_unchanged,
+    load_build_state,
+    run_pipeline,
+    save_build_state,
+)
+from snapshot import sync_snapshot
+from sources import (
+    SourceWorker,
+    close_data_source,
+    create_data_source,
+    fetch_sources,
+    merge_apps,
+)
+from update_repo import read_cachechk, update_repo
 
 
-def main():
-    # 从飞书获取数据并转换
-    if config_instance.data_source == "feishu":
-        feishu_ds = FeishuDataSource(config_instance)
-        apps_list: list[dict] = list(feishu_ds.fetch_data())
-    # 从SQLite数据库获取数据并转换
-    elif config_instance.data_source == "sqlite":
-        sqlite_ds = SQLiteDataSource(config_instance)
-        apps_list: list[dict] = list(sqlite_ds.fetch_data())
-    # 从MySQL数据库获取数据并转换
-    elif config_instance.data_source == "mysql":
-        mysql_ds = MySQLDataSource(config_instance)
-        apps_list: list[dict] = list(mysql_ds.fetch_data())
+def publish(config: Config, changed: bool, cachechk=None):
+    """静态发布产物（预压缩文件和清单）
+
+    仓库文件更新时产物已由临时文件生成并与repo.xml一起替换；
+    未变化时只在产物缺失（如新启用precompress）时为现有的repo.xml生成。
+    """
+    if not config.precompress:
+        return
+    if changed:
+        print("已生成repo.xml的预压缩文件和清单")
+        return
+    # 只在启用预压缩时导入（可能导入brotli）
+    from artifacts import manifest_path, write_artifacts
+
+    if not os.path.exists(manifest_path("repo.xml")):
+        write_artifacts("repo.xml", cachechk)
+        print("已生成repo.xml的预压缩文件和清单")
+
+
+def open_sources(config: Config) -> list:
+    """创建数据源：单个数据源在当前线程中创建，多个数据源各自在工作线程中创建"""
+    if len(config.data_sources) > 1:
+        return [SourceWorker(name, config) for name in config.data_sources]
+    # 从飞书、SQLite或MySQL获取数据并转换
+    return [create_data_source(config.data_source, config)]
+
+
+def close_sources(sources: list) -> None:
+    """关闭open_sources()创建的数据源"""
+    for source in sources:
+        if isinstance(source, SourceWorker):
+            source.close()
+        else:
+            close_data_source(source)
+
+
+def fetch_apps(config: Config, sources: list):
+    """从数据源获取应用数据，单个数据源时返回生成器"""
+    if len(sources) > 1:
+        # 多数据源：并发获取，按internalName去重合并
+        apps = merge_apps(fetch_sources(sources), config.merge_precedence)
+        print(f"合并后共{len(apps)}个应用")
+        return apps
+    if config.incremental:
+        # 增量模式：只获取变化的记录，合并到本地快照后输出完整数据
+        return sync_snapshot(
+            sources[0],
+            config.snapshot_file,
+            config.full_sync_hours,
+        )
+    return sources[0].fetch_data()
+
+
+def build(config: Config, sources: list):
+    """获取数据并生成仓库文件，记录本次构建的指标"""
+    metrics.begin_build()
+    try:
+        count, changed, cachechk = generate(config, sources)
+    except BaseException as e:
+        metrics.end_build(False, error=e)
+        write_metrics(config)
+        raise
+    metrics.end_build(True, count, changed, cachechk or "")
+    write_metrics(config)
+
+
+def write_metrics(config: Config) -> None:
+    """写出Prometheus textfile和JSON运行报告（已配置时）"""
+    if config.metrics_file:
+        metrics.write_textfile(config.metrics_file)
+    if config.report_file:
+        metrics.write_report(config.report_file)
+
+
+def generate(config: Config, sources: list):
+    """获取数据并生成仓库文件
+
+    Returns:
+        (应用数量, 仓库文件是否更新, cachechk)
+    """
+    with ExitStack() as stack:
+        signer = None
+        if config.package_dir:
+            # 只在配置了软件包目录时导入（进程池）
+            from packages import PackageSigner
+
+            # 先扫描软件包目录并提交需要计算的文件，与数据源获取同时进行
+            signer = stack.enter_context(
+                PackageSigner(
+                    config.package_dir,
+                    config.package_cache,
+                    config.package_workers,
+                    config.package_extra_fields,
+                )
+            )
+        apps = fetch(config, sources)
+        if signer is not None:
+            apps = metrics.timed_iter(signer.sign_all(apps), "sign")
+        links = None
+        if config.link_check:
+            # 只在启用链接检查时导入（asyncio、ssl）
+            from linkcheck import LinkCollector
+
+            links = LinkCollector()
+            apps = links.collect(apps)
+        delta = None
+        if config.delta_dir:
+            from delta import DeltaWriter
+
+            delta = DeltaWriter(config.delta_dir, config.delta_history)
+            apps = delta.collect(apps)
+        result = write_outputs(config, apps)
+
+    count, changed, cachechk = result
+    if delta is not None and cachechk and (changed or not delta.has_state()):
+        # 仓库文件更新后生成与上次构建之间的增量；新启用时即使未变化也记录当前版本
+        with metrics.stage("delta"):
+            delta.commit(cachechk)
+    if links is not None and count:
+        run_link_check(config, links)
+    return result
+
+
+def run_link_check(config: Config, links) -> None:
+    """检查收集到的下载地址和图片地址，失效的链接只输出报告，不影响构建结果"""
+    from linkcheck import LinkChecker, check_links
+
+    checker = LinkChecker(
+        per_host=config.link_check_per_host,
+        timeout=config.link_check_timeout,
+        ttl=config.link_check_ttl,
+        cache_file=config.link_check_cache,
+    )
+    with metrics.stage("linkcheck"):
+        report = check_links(links, checker, config.link_check_report)
+    metrics.gauge("qnap_repo_links").set(report["total"])
+    metrics.gauge("qnap_repo_broken_links").set(report["broken_count"])
+
+
+def fetch(config: Config, sources: list):
+    """获取应用数据，获取耗时计入fetch阶段"""
+    with metrics.stage("fetch"):
+        apps = fetch_apps(config, sources)
+    # 单个数据源时为生成器，逐条获取的耗时同样计入fetch阶段
+    return metrics.timed_iter(apps, "fetch")
+
+
+def write_outputs(config: Config, apps):
+    """将应用数据写出为仓库文件
+
+    Returns:
+        (应用数量, 仓库文件是否更新, cachechk)
+    """
+    state_file = config.state_file if config.skip_unchanged else None
+
+    if config.pipeline:
+        # 流水线模式：一次遍历同时写出repo.xml和apps.json
+        print("开始更新仓库XML文件...")
+        with metrics.stage("write"):
+            result = run_pipeline(
+                apps,
+                xml_file="repo.xml",
+                json_file=config.apps_json,
+                state_file=state_file,
+                catalog_dir=config.catalog_dir,
+                shard_size=config.shard_size,
+                platform_dir=config.platform_dir,
+                xml_writer=config.xml_writer,
+                precompress=config.precompress,
+            )
+        if not result.count:
+            print("未获取到有效应用数据，仓库XML文件未更新")
+            return 0, False, None
+        if not result.changed:
+            print(f"{result.count}个应用信息均未变化，仓库文件保持不变")
+        else:
+            print(f"成功转换{result.count}个应用信息")
+            print("仓库XML文件更新完成")
+        with metrics.stage("publish"):
+            publish(config, result.changed, result.cachechk)
+        return result.count, result.changed, result.cachechk
+
+    apps_list: list[dict] = list(apps)
 
     if apps_list:
+        cachechk = None
+        if state_file:
+            # 内容摘要与上次构建一致时直接退出，保留原有文件和cachechk
+            digest = CatalogDigest()
+            for app in apps_list:
+                digest.update(app)
+            state = load_build_state(state_file)
+            outputs = build_outputs(
+                "repo.xml", "apps.json", config.catalog_dir, config.platform_dir
+            )
+            if is_unchanged(digest.hexdigest(), state, outputs):
+                print(f"{len(apps_list)}个应用信息均未变化，仓库文件保持不变")
+                with metrics.stage("publish"):
+                    publish(config, False, state.get("cachechk"))
+                return len(apps_list), False, state.get("cachechk")
+            cachechk = cachechk_from_digest(digest.hexdigest())
+
         # 保存转换后的数据到JSON文件
-        with open("apps.json", "w", encoding="utf-8") as f:
-            json.dump(apps_list, f, ensure_ascii=False, indent=2)
+        with metrics.stage("write_json"):
+            with open("apps.json", "w", encoding="utf-8") as f:
+                json.dump(
+                    list(map(to_plain, apps_list)), f, ensure_ascii=False, indent=2
+                )
 
         print(f"成功转换{len(apps_list)}个应用信息到apps.json")
 
         # 使用转换后的数据更新仓库XML
         print("\n开始更新仓库XML文件...")
-        update_repo(input_file="apps.json", output_file="repo.xml")
+        with metrics.stage("write_xml"):
+            update_repo(
+                input_file="apps.json",
+                output_file="repo.xml",
+                stream=config.xml_stream,
+                cachechk=cachechk,
+                platform_dir=config.platform_dir,
+                xml_writer=config.xml_writer,
+                precompress=config.precompress,
+            )
         print("仓库XML文件更新完成")
-    else:
-        print("未获取到有效应用数据，仓库XML文件未更新")
+
+        if config.catalog_dir:
+            # 生成Web查看器使用的分片目录和搜索索引
+            with metrics.stage("catalog"):
+                with CatalogIndexWriter(
+                    config.catalog_dir, config.shard_size
+                ) as catalog_writer:
+                    for app in apps_list:
+                        catalog_writer.write(app)
+                catalog_writer.commit(cachechk or read_cachechk("repo.xml"))
+        if state_file:
+            # 所有输出都生成后才保存状态
+            save_build_state(
+                state_file,
+                {
+                    "digest": digest.hexdigest(),
+                    "cachechk": cachechk,
+                    "outputs": outputs,
+                },
+            )
+        with metrics.stage("publish"):
+            publish(config, True, cachechk)
+        return len(apps_list), True, cachechk or read_cachechk("repo.xml")
+
+    print("未获取到有效应用数据，仓库XML文件未更新")
+    return 0, False, None
+
+
+def main():
+    config = get_config()
+    if config.daemon:
+        # 守护模式：常驻运行，按定时、数据源变化或webhook触发重新构建
+        from daemon import Daemon
+
+        Daemon(
+            config,
+            functools.partial(open_sources, config),
+            functools.partial(build, config),
+            close_sources,
+        ).run()
+        return
+
+    sources = open_sources(config)
+    try:
+        build(config, sources)
+    finally:
+        close_sources(sources)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+"""构建指标模块
+
+记录各阶段耗时、行数、location备用解析次数、飞书分页请求等指标，
+构建结束后写入 Prometheus textfile collector 文件和/或 JSON 运行报告。
+
+指标保存在进程内：单次运行时即为本次构建的数据，守护模式下计数器和直方图
+跨构建累积，阶段耗时等“上次构建”类指标在每次构建开始时重置。
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300
+)
+
+# 指标名 -> (类型, 说明)
+DEFINITIONS = {
+    "qnap_repo_builds_total": ("counter", "构建次数，result为success或failure"),
+    "qnap_repo_build_duration_seconds": ("histogram", "构建耗时"),
+    "qnap_repo_last_build_timestamp_seconds": ("gauge", "上次构建结束的时间"),
+    "qnap_repo_last_success_timestamp_seconds": (
+        "gauge",
+        "上次成功构建结束的时间",
+    ),
+    "qnap_repo_last_build_success": ("gauge", "上次构建是否成功"),
+    "qnap_repo_last_build_changed": ("gauge", "上次构建是否更新了仓库文件"),
+    "qnap_repo_apps": ("gauge", "上次构建的应用数量"),
+    "qnap_repo_stage_duration_seconds": (
+        "gauge",
+        "上次构建各阶段的耗时（不含嵌套在其中的其他阶段）",
+    ),
+    "qnap_repo_rows_normalized_total": ("counter", "规范化的记录数"),
+    "qnap_repo_normalize_seconds_total": ("counter", "规范化记录的累计耗时"),
+    "qnap_repo_location_fallback_total": (
+        "counter",
+        "location无法按JSON解析、改用正则提取URL的记录数",
+    ),
+    "qnap_repo_feishu_pages_total": (
+        "counter",
+        "飞书分页请求数，result为success或failure",
+    ),
+    "qnap_repo_feishu_page_duration_seconds": ("histogram", "飞书分页请求耗时"),
+    "qnap_repo_feishu_token_requests_total": (
+        "counter",
+        "请求tenant_access_token的次数",
+    ),
+    "qnap_repo_links": ("gauge", "上次链接检查的URL数量"),
+    "qnap_repo_broken_links": ("gauge", "上次链接检查中无法访问的URL数量"),
+    "qnap_repo_feishu_retries_total": (
+        "counter",
+        "飞书请求失败后的重试次数，reason为失败原因",
+    ),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, value: float = 1) -> None:
+        with self._lock:
+            self.value += value
+
+
+class _Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            self.sum += value
+            self.count += 1
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + text + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """进程内的指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[LabelKey, Any]] = {}
+        # 本次构建的各阶段耗时及阶段嵌套栈，只在构建线程中使用
+        self.stages: Dict[str, float] = {}
+        self._stack: List[List[Any]] = []
+        self.build_started: Optional[float] = None
+        self._build_perf = 0.0
+        self.last_report: Dict[str, Any] = {}
+
+    def _child(self, name: str, factory, labels: Dict[str, Any]):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            child = series.get(key)
+            if child is None:
+                child = series[key] = factory()
+            return child
+
+    def counter(self, name: str, **labels) -> _Counter:
+        return self._child(name, _Counter, labels)
+
+    def gauge(self, name: str, **labels) -> _Gauge:
+        return self._child(name, _Gauge, labels)
+
+    def histogram(self, name: str, **labels) -> _Histogram:
+        return self._child(name, _Histogram, labels)
+
+    # ---- 阶段耗时 ----
+
+    def _enter_stage(self) -> List[float]:
+        frame = [0.0]
+        self._stack.append(frame)
+        return frame
+
+    def _exit_stage(self, name: str, frame: List[float], elapsed: float) -> None:
+        """记录阶段耗时，扣除嵌套阶段的耗时，并计入外层阶段的嵌套耗时"""
+        self._stack.pop()
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[0]
+        if self._stack:
+            self._stack[-1][0] += elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        """计量一个阶段，嵌套在其中的阶段耗时不计入本阶段"""
+        frame = self._enter_stage()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._exit_stage(name, frame, time.perf_counter() - started)
+
+    def timed_iter(self, iterable: Iterable, name: str) -> Iterator:
+        """将迭代（如数据源生成器的next()）的耗时计入name阶段
+
+        可以嵌套：外层迭代器的耗时不包含其从内层迭代器取数据的耗时。
+        """
+        with self.stage(name):
+            iterator = iter(iterable)
+        while True:
+            frame = self._enter_stage()
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit_stage(name, frame, time.perf_counter() - started)
+            yield item
+
+    # ---- 构建 ----
+
+    def begin_build(self) -> None:
+        """开始一次构建，重置上次构建的阶段耗时"""
+        self.stages = {}
+        self._stack = []
+        self.build_started = time.time()
+        self._build_perf = time.perf_counter()
+
+    def end_build(
+        self,
+        success: bool,
+        apps: int = 0,
+        changed: bool = False,
+        cachechk: str = "",
+        error: Optional[BaseException] = None,
+    ) -> Dict[str, Any]:
+        """结束一次构建，更新构建级指标并返回运行报告"""
+        duration = time.perf_counter() - self._build_perf
+        finished = time.time()
+        result = "success" if success else "failure"
+        self.counter("qnap_repo_builds_total", result=result).inc()
+        self.histogram("qnap_repo_build_duration_seconds").observe(duration)
+        self.gauge("qnap_repo_last_build_timestamp_seconds").set(finished)
+        self.gauge("qnap_repo_last_build_success").set(1 if success else 0)
+        if success:
+            self.gauge("qnap_repo_last_success_timestamp_seconds").set(finished)
+            self.gauge("qnap_repo_apps").set(apps)
+            self.gauge("qnap_repo_last_build_changed").set(1 if changed else 0)
+
+        # 阶段耗时只保留本次构建出现的阶段
+        with self._lock:
+            self._series["qnap_repo_stage_duration_seconds"] = {}
+        for name, seconds in self.stages.items():
+            self.gauge("qnap_repo_stage_duration_seconds", stage=name).set(seconds)
+
+        self.last_report = {
+            "started_at": _isoformat(self.build_started),
+            "finished_at": _isoformat(finished),
+            "duration_seconds": round(duration, 6),
+            "success": success,
+            "error": f"{type(error).__name__}: {error}" if error else None,
+            "apps": apps,
+            "changed": changed,
+            "cachechk": cachechk,
+            "stages_seconds": {k: round(v, 6) for k, v in self.stages.items()},
+            "metrics": self.snapshot(),
+        }
+        return self.last_report
+
+    # ---- 导出 ----
+
+    def snapshot(self) -> Dict[str, Any]:
+        """所有计数器和仪表的当前值，直方图只给出count和sum"""
+        result: Dict[str, Any] = {}
+        with self._lock:
+            items = [(name, dict(series)) for name, series in self._series.items()]
+        for name, series in sorted(items):
+            for key, child in sorted(series.items()):
+                label = ",".join(f"{k}={v}" for k, v in key)
+                series_name = f"{name}{{{label}}}" if label else name
+                if isinstance(child, _Histogram):
+                    result[series_name] = {"count": child.count, "sum": child.sum}
+                else:
+                    result[series_name] = child.value
+        return result
+
+    def prometheus_text(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+        with self._lock:
+            items = [(name, dict(series)) for name, series in self._series.items()]
+        for name, series in sorted(items):
+            if not series:
+                continue
+            kind, help_text = DEFINITIONS.get(name, ("untyped", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, child in sorted(series.items()):
+                if isinstance(child, _Histogram):
+                    cumulative = 0
+                    for bound, count in zip(child.buckets, child.counts):
+                        cumulative += count
+                        labels = _format_labels(key, ("le", _format_value(bound)))
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key, ("le", "+Inf"))
+                    lines.append(f"{name}_bucket{labels} {child.count}")
+                    labels = _format_labels(key)
+                    lines.append(f"{name}_sum{labels} {_format_value(child.sum)}")
+                    lines.append(f"{name}_count{labels} {child.count}")
+                else:
+                    labels = _format_labels(key)
+                    lines.append(f"{name}{labels} {_format_value(child.value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """原子写入textfile collector文件，node_exporter不会读到写了一半的文件"""
+        _write_atomic(path, self.prometheus_text())
+
+    def write_report(self, path: str) -> None:
+        """原子写入上次构建的JSON运行报告"""
+        _write_atomic(
+            path, json.dumps(self.last_report, ensure_ascii=False, indent=2) + "\n"
+        )
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(timestamp))
+
+
+def _write_atomic(path: str, text: str) -> None:
+    temp_file = f"{path}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_file, path)
+
+
+# 进程内共享的指标注册表
+metrics = Metrics()
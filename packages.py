@@ -0,0 +1,194 @@
+"""qpkg校验模块
+
+按location的文件名在本地软件包目录中找到对应的.qpkg文件，在进程池中计算sha256，
+填入每个<platform>的signature（可选同时写入size和sha256字段）。
+
+计算结果按(路径, 大小, 修改时间)缓存到本地文件，只有新增或变化的软件包才会重新计算。
+构建开始时即提交目录中所有需要计算的文件，与数据源获取同时进行。
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Optional
+from urllib.parse import unquote, urlparse
+
+CHUNK_SIZE = 1024 * 1024
+PACKAGE_SUFFIX = ".qpkg"
+
+
+def hash_package(path: str) -> Dict[str, Any]:
+    """计算软件包的大小、修改时间和sha256（在工作进程中执行）"""
+    stat = os.stat(path)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256.hexdigest(),
+    }
+
+
+def package_name(location: str) -> str:
+    """location对应的软件包文件名（URL路径的最后一段）"""
+    return os.path.basename(unquote(urlparse(location or "").path))
+
+
+class PackageSigner:
+    """为应用的各平台填充软件包校验信息
+
+    使用方法：
+        with PackageSigner("packages") as signer:
+            for app in signer.sign_all(apps):
+                ...
+    """
+
+    def __init__(
+        self,
+        package_dir: str,
+        cache_file: str = "package_cache.json",
+        workers: int = 0,
+        extra_fields: bool = False,
+    ):
+        self.package_dir = package_dir
+        self.cache_file = cache_file
+        # 进程数，0表示使用CPU核心数
+        self.workers = workers
+        # 是否同时写入size和sha256字段（只出现在apps.json中，repo.xml只使用signature）
+        self.extra_fields = extra_fields
+        # 文件名 -> 路径
+        self._paths: Dict[str, str] = {}
+        # 路径 -> {"size", "mtime_ns", "sha256"}
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.hashed = 0
+        self.missing = 0
+
+    def __enter__(self) -> "PackageSigner":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.finish(save=exc_type is None)
+
+    def start(self) -> None:
+        """扫描软件包目录，提交缓存中不存在或已变化的文件"""
+        self._cache = self._load_cache()
+        stale = []
+        for root, dirs, files in os.walk(self.package_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.endswith(PACKAGE_SUFFIX) or name in self._paths:
+                    continue
+                path = os.path.join(root, name)
+                self._paths[name] = path
+                if not self._is_cached(path):
+                    stale.append(path)
+        if stale:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers or None)
+            for path in stale:
+                self._pending[path] = self._pool.submit(hash_package, path)
+
+    def finish(self, save: bool = True) -> None:
+        """等待计算结束并保存缓存，只保留目录中仍存在的文件"""
+        try:
+            if save:
+                for path in list(self._pending):
+                    self._resolve(path)
+                paths = set(self._paths.values())
+                self._cache = {p: v for p, v in self._cache.items() if p in paths}
+                self._save_cache()
+        finally:
+            if self._pool is not None:
+                # 不使用shutdown(cancel_futures=True)，该参数需要Python 3.9
+                for future in self._pending.values():
+                    future.cancel()
+                self._pool.shutdown(wait=True)
+                self._pool = None
+            self._pending.clear()
+        if self.hashed:
+            print(f"已计算{self.hashed}个软件包的校验值")
+        if self.missing:
+            print(f"{self.missing}个平台未在{self.package_dir}中找到对应的qpkg文件")
+
+    def lookup(self, location: str) -> Optional[Dict[str, Any]]:
+        """location对应软件包的校验信息，未找到时返回None"""
+        path = self._paths.get(package_name(location))
+        if path is None:
+            return None
+        return self._resolve(path)
+
+    def sign(self, app: Dict[str, Any]) -> Dict[str, Any]:
+        """填充应用各平台的signature，不修改原有的平台字典"""
+        platforms = app.get("platform")
+        if not isinstance(platforms, list):
+            return app
+        signed = []
+        for platform in platforms:
+            info = self.lookup(platform.get("location", ""))
+            if info is None:
+                self.missing += 1
+                signed.append(platform)
+                continue
+            platform = platform.copy()
+            platform["signature"] = info["sha256"]
+            if self.extra_fields:
+                platform["size"] = info["size"]
+                platform["sha256"] = info["sha256"]
+            signed.append(platform)
+        app["platform"] = signed
+        return app
+
+    def sign_all(self, apps: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """逐个填充应用的校验信息"""
+        for app in apps:
+            yield self.sign(app)
+
+    def _is_cached(self, path: str) -> bool:
+        entry = self._cache.get(path)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return entry.get("size") == stat.st_size and entry.get(
+            "mtime_ns"
+        ) == stat.st_mtime_ns
+
+    def _resolve(self, path: str) -> Optional[Dict[str, Any]]:
+        future = self._pending.pop(path, None)
+        if future is not None:
+            try:
+                self._cache[path] = future.result()
+                self.hashed += 1
+            except OSError as e:
+                print(f"计算软件包校验值失败: {path}: {e}")
+                self._cache.pop(path, None)
+        return self._cache.get(path)
+
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"读取软件包缓存失败，将重新计算: {e}")
+            return {}
+
+    def _save_cache(self) -> None:
+        """原子写入缓存文件"""
+        if not self.cache_file:
+            return
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(temp_file, self.cache_file)
@@ -0,0 +1,272 @@
+"""数据处理流水线模块
+
+一次遍历 DataSource.fetch_data() 的结果，同时写出 repo.xml 和 apps.json，
+每条记录只处理一次，不再经过 apps.json 的序列化和反序列化。
+"""
+
+import hashlib
+import json
+import os
+from contextlib import ExitStack
+from typing import Any, Dict, Iterable, List, Optional
+
+from catalog_index import INDEX_FILE, CatalogIndexWriter
+from data_sources.records import to_plain
+from update_repo import (
+    PLATFORM_MANIFEST,
+    PlatformRepoWriter,
+    patch_cachechk,
+    xml_writer_class,
+)
+
+
+class CatalogDigest:
+    """应用数据的内容摘要
+
+    按输出顺序对每条记录的规范化JSON（键排序、紧凑格式）计算sha256，
+    数据内容与顺序都不变时摘要不变。
+    """
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, app: Dict[str, Any]) -> None:
+        """加入单个应用"""
+        text = json.dumps(
+            to_plain(app),
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        self._hash.update(text.encode("utf-8"))
+        self._hash.update(b"\n")
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def cachechk_from_digest(digest: str) -> str:
+    """由内容摘要得到<cachechk>，保持原有的12位数字格式"""
+    return str(int(digest[:16], 16) % 10**12).zfill(12)
+
+
+def load_build_state(state_file: str) -> Dict[str, Any]:
+    """读取上次构建的状态，不存在或格式错误时返回空字典"""
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_build_state(state_file: str, state: Dict[str, Any]) -> None:
+    """原子写入构建状态"""
+    temp_file = f"{state_file}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, state_file)
+
+
+def build_outputs(
+    xml_file: str,
+    json_file: Optional[str] = None,
+    catalog_dir: Optional[str] = None,
+    platform_dir: Optional[str] = None,
+) -> List[str]:
+    """本次构建启用的输出，目录类输出以其索引文件代表"""
+    outputs = [xml_file]
+    if json_file:
+        outputs.append(json_file)
+    if catalog_dir:
+        outputs.append(os.path.join(catalog_dir, INDEX_FILE))
+    if platform_dir:
+        outputs.append(os.path.join(platform_dir, PLATFORM_MANIFEST))
+    return outputs
+
+
+def is_unchanged(digest: str, state: Dict[str, Any], outputs: List[str]) -> bool:
+    """摘要与上次构建一致、启用的输出与上次相同且都还在时，视为没有变化
+
+    新启用的输出（如catalog_dir、platform_dir）或被删除的输出文件会使本次构建
+    重新生成全部文件。
+    """
+    return (
+        state.get("digest") == digest
+        and state.get("outputs") == outputs
+        and all(map(os.path.exists, outputs))
+    )
+
+
+class AppsJsonWriter:
+    """流式写入apps.json
+
+    输出内容与 json.dump(apps, f, ensure_ascii=False, indent=2) 完全一致。
+    """
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.count = 0
+        self._file = None
+
+    def __enter__(self) -> "AppsJsonWriter":
+        self._file = open(self.output_file, "w", encoding="utf-8")
+        self._file.write("[")
+        return self
+
+    def write(self, app: Dict[str, Any]) -> None:
+        """写入单个应用"""
+        text = json.dumps(to_plain(app), ensure_ascii=False, indent=2)
+        # JSON字符串中的换行已被转义，因此可以直接按行缩进
+        self._file.write("\n  " if self.count == 0 else ",\n  ")
+        self._file.write(text.replace("\n", "\n  "))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self._file.write("\n]" if self.count else "]")
+        finally:
+            self._file.close()
+
+
+class PipelineResult:
+    """流水线运行结果"""
+
+    def __init__(self, count: int = 0, changed: bool = False, cachechk: str = ""):
+        # 写入的应用数量
+        self.count = count
+        # 输出文件是否被更新
+        self.changed = changed
+        self.cachechk = cachechk
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def run_pipeline(
+    apps: Iterable[Dict[str, Any]],
+    xml_file: str = "repo.xml",
+    json_file: Optional[str] = "apps.json",
+    state_file: Optional[str] = None,
+    catalog_dir: Optional[str] = None,
+    shard_size: int = 100,
+    platform_dir: Optional[str] = None,
+    xml_writer: str = "lxml",
+    precompress: bool = False,
+) -> PipelineResult:
+    """
+    一次遍历应用数据，同时生成仓库XML文件和（可选的）apps.json
+
+    先写入临时文件，全部成功且至少有一个应用时才替换正式文件，
+    否则保留原有文件不变。
+
+    Args:
+        apps: 任意可迭代的应用数据，通常为 DataSource.fetch_data() 的返回值
+        xml_file: 输出的XML文件路径
+        json_file: 输出的JSON文件路径，为None或空字符串时不生成
+        state_file: 构建状态文件路径。指定时按内容摘要判断数据是否变化，
+            未变化则保留原有文件（包括<cachechk>），变化时<cachechk>由摘要生成
+        catalog_dir: Web查看器分片目录和索引的输出目录，为None或空字符串时不生成
+        shard_size: 每个分片包含的应用数量
+        platform_dir: 按platformID拆分的XML文件的输出目录，为None或空字符串时不生成
+        xml_writer: XML写入方式，"lxml"或"fast"（见update_repo.FastRepoXmlWriter）
+        precompress: 由XML临时文件生成预压缩文件和清单，与XML文件一起替换
+
+    Returns:
+        PipelineResult
+    """
+    outputs = [xml_file] + ([json_file] if json_file else [])
+    temps = [f"{path}.tmp" for path in outputs]
+    enabled = build_outputs(xml_file, json_file, catalog_dir, platform_dir)
+    digest = CatalogDigest()
+    catalog_writer = None
+    platform_writer = None
+    writer_class = xml_writer_class(xml_writer)
+
+    try:
+        with ExitStack() as stack:
+            repo_writer = stack.enter_context(writer_class(temps[0]))
+            writers = [repo_writer]
+            if json_file:
+                writers.append(stack.enter_context(AppsJsonWriter(temps[1])))
+            if catalog_dir:
+                catalog_writer = CatalogIndexWriter(catalog_dir, shard_size)
+                writers.append(stack.enter_context(catalog_writer))
+            if platform_dir:
+                platform_writer = PlatformRepoWriter(
+                    platform_dir,
+                    repo_writer.cachechk,
+                    writer_class,
+                    main_output=xml_file,
+                )
+                writers.append(stack.enter_context(platform_writer))
+
+            for app in apps:
+                for writer in writers:
+                    writer.write(app)
+                if state_file:
+                    digest.update(app)
+    except BaseException:
+        for temp in temps:
+            _remove_quietly(temp)
+        raise
+
+    def discard():
+        for temp in temps:
+            _remove_quietly(temp)
+        if catalog_writer:
+            catalog_writer.discard()
+        if platform_writer:
+            platform_writer.discard()
+
+    count = repo_writer.count
+    if not count:
+        discard()
+        return PipelineResult()
+
+    cachechk = repo_writer.cachechk
+    if state_file:
+        state = load_build_state(state_file)
+        if is_unchanged(digest.hexdigest(), state, enabled):
+            discard()
+            return PipelineResult(count, False, state.get("cachechk", ""))
+        cachechk = cachechk_from_digest(digest.hexdigest())
+        patch_cachechk(temps[0], cachechk)
+        if platform_writer:
+            platform_writer.patch_cachechk(cachechk)
+
+    artifacts = None
+    if precompress:
+        # 只在启用预压缩时导入（可能导入brotli）
+        from artifacts import ArtifactWriter
+
+        artifacts = ArtifactWriter(xml_file)
+        try:
+            artifacts.prepare(temps[0], cachechk)
+        except BaseException:
+            discard()
+            raise
+
+    for temp, path in zip(temps[1:], outputs[1:]):
+        os.replace(temp, path)
+    if artifacts:
+        artifacts.commit(temps[0])
+    else:
+        os.replace(temps[0], xml_file)
+    if platform_writer:
+        platform_writer.commit()
+    if catalog_writer:
+        catalog_writer.commit(cachechk)
+
+    if state_file:
+        save_build_state(
+            state_file,
+            {"digest": digest.hexdigest(), "cachechk": cachechk, "outputs": enabled},
+        )
+    return PipelineResult(count, True, cachechk)
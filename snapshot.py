@@ -0,0 +1,169 @@
+"""增量同步模块
+
+在本地持久化一份完整的应用数据快照及数据源水位，每次运行只从数据源获取
+自上次水位以来变化的记录，合并进快照后再用于生成 apps.json / repo.xml。
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from data_sources import DataSource
+from data_sources.records import to_json, to_plain
+
+# 快照中记录的标识：("id", 数据源的行标识)、("key", internalName或name)
+# 或("content", 内容摘要)
+SnapshotKey = Tuple[str, Any]
+
+
+def record_key(app: Dict[str, Any]) -> str:
+    """应用的唯一标识，优先使用internalName"""
+    return str(app.get("internalName") or app.get("name", ""))
+
+
+def snapshot_key(app: Dict[str, Any]) -> SnapshotKey:
+    """
+    记录在快照中的标识
+
+    优先使用数据源的行标识（source_id，如SQLite的rowid、飞书的record_id），
+    internalName重复或为空的行各自保留，与直接读取数据源的结果一致；
+    数据源不提供行标识时使用internalName或name，两者都为空时按内容区分，
+    不会把多条没有名称的记录合并为一条。
+    """
+    source_id = getattr(app, "source_id", None)
+    if source_id is not None:
+        return ("id", source_id)
+    key = record_key(app)
+    if key:
+        return ("key", key)
+    text = json.dumps(to_plain(app), ensure_ascii=False, sort_keys=True, default=to_json)
+    return ("content", hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+
+class Snapshot:
+    """本地应用数据快照"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark: Optional[str] = None
+        # 上次全量同步的时间戳（秒）
+        self.full_synced_at: float = 0
+        self.records: "OrderedDict[SnapshotKey, Dict[str, Any]]" = OrderedDict()
+
+    @classmethod
+    def load(cls, path: str) -> "Snapshot":
+        """读取快照文件，不存在或格式错误时返回空快照"""
+        snapshot = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            keys = data.get("keys")
+            records = data.get("records", [])
+            if keys is None or len(keys) != len(records):
+                # 旧格式的快照没有记录标识，无法与数据源的行对应
+                print("快照文件中没有记录标识，将执行全量同步")
+                return cls(path)
+            snapshot.watermark = data.get("watermark")
+            snapshot.full_synced_at = data.get("full_synced_at", 0)
+            for (kind, value), app in zip(keys, records):
+                snapshot.records[(kind, value)] = app
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"读取快照文件失败，将执行全量同步: {e}")
+            return cls(path)
+        return snapshot
+
+    def replace(self, apps: Iterable[Dict[str, Any]]) -> int:
+        """用全量数据替换快照内容，返回记录数量"""
+        self.records = OrderedDict((snapshot_key(app), app) for app in apps)
+        self.full_synced_at = time.time()
+        return len(self.records)
+
+    def merge(self, apps: Iterable[Dict[str, Any]], ordered: bool = False) -> int:
+        """
+        合并变化的记录，已有记录原位替换，返回合并数量
+
+        Args:
+            apps: 变化的记录
+            ordered: 行标识是否与数据源的输出顺序一致（见DataSource.source_ids_ordered），
+                为True时新记录按行标识插入原有位置，快照与全量同步的顺序相同；
+                否则新记录追加到末尾
+        """
+        count = 0
+        added = False
+        for app in apps:
+            key = snapshot_key(app)
+            if key not in self.records:
+                added = True
+            self.records[key] = app
+            count += 1
+        if added and ordered and all(kind == "id" for kind, _ in self.records):
+            self.records = OrderedDict(
+                sorted(self.records.items(), key=lambda item: item[0][1])
+            )
+        return count
+
+    def save(self) -> None:
+        """原子写入快照文件"""
+        data = {
+            "watermark": self.watermark,
+            "full_synced_at": self.full_synced_at,
+            "keys": list(self.records),
+            "records": list(self.records.values()),
+        }
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=to_json)
+        os.replace(temp_file, self.path)
+
+
+def sync_snapshot(
+    data_source: DataSource, snapshot_file: str, full_sync_hours: float = 24
+) -> List[Dict[str, Any]]:
+    """
+    增量同步数据源到本地快照，返回合并后的全部应用数据
+
+    快照不存在、数据源不支持增量同步或距上次全量同步超过full_sync_hours时执行全量同步，
+    全量同步可以清除数据源中已删除的记录。
+
+    Args:
+        data_source: 数据源实例
+        snapshot_file: 快照文件路径
+        full_sync_hours: 全量同步的间隔（小时），小于等于0时不定期全量同步
+
+    Returns:
+        合并后的应用数据列表
+    """
+    snapshot = Snapshot.load(snapshot_file)
+
+    full_sync = (
+        not data_source.supports_incremental
+        or snapshot.watermark is None
+        or (
+            full_sync_hours > 0
+            and time.time() - snapshot.full_synced_at > full_sync_hours * 3600
+        )
+    )
+
+    if not data_source.supports_incremental:
+        snapshot.replace(data_source.fetch_data())
+        print(f"数据源不支持增量同步，已全量同步{len(snapshot.records)}个应用")
+    elif full_sync:
+        watermark, apps = data_source.fetch_changes(None)
+        count = snapshot.replace(apps)
+        snapshot.watermark = watermark
+        print(f"全量同步{count}个应用")
+    else:
+        watermark, apps = data_source.fetch_changes(snapshot.watermark)
+        count = snapshot.merge(apps, ordered=data_source.source_ids_ordered)
+        # 全部变化的记录合并后才推进水位；获取失败时抛出异常，快照和水位都不保存
+        snapshot.watermark = watermark
+        print(f"增量同步{count}个变化的应用，共{len(snapshot.records)}个应用")
+
+    if snapshot.records:
+        snapshot.save()
+    return list(snapshot.records.values())
@@ -0,0 +1,215 @@
+"""多数据源模块
+
+按配置创建数据源实例；配置了多个数据源时每个数据源在各自的工作线程中并发获取，
+全部完成后按internalName去重合并为一个应用列表，供生成同一个repo.xml使用。
+"""
+
+import datetime
+import os
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from config import Config
+import data_sources
+from data_sources import DataSource
+from snapshot import record_key, sync_snapshot
+
+# 数据源名称 -> 类名，类在创建实例时才导入（见data_sources.__getattr__）
+DATA_SOURCE_CLASSES = {
+    "feishu": "FeishuDataSource",
+    "sqlite": "SQLiteDataSource",
+    "mysql": "MySQLDataSource",
+}
+
+# 去重时的优先规则
+# order: 按data_source列表顺序，靠前的数据源优先
+# newest: publishedDate较新的记录优先；按时间比较（见_parse_published_date），
+#         相同或任一方无法解析时按列表顺序
+MERGE_PRECEDENCE = ("order", "newest")
+
+# publishedDate除ISO 8601格式（datetime.fromisoformat）外可以识别的格式
+PUBLISHED_DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+    "%Y%m%d%H%M%S",
+    "%Y%m%d%H%M",
+    "%Y%m%d",
+)
+
+
+def create_data_source(name: str, config: Config) -> DataSource:
+    """按名称创建数据源实例，只导入所选数据源的模块"""
+    return getattr(data_sources, DATA_SOURCE_CLASSES[name])(config)
+
+
+def snapshot_path(snapshot_file: str, name: str) -> str:
+    """多数据源增量同步时每个数据源使用独立的快照文件，如snapshot.feishu.json"""
+    root, ext = os.path.splitext(snapshot_file)
+    return f"{root}.{name}{ext}"
+
+
+def close_data_source(data_source: DataSource) -> None:
+    """关闭数据源持有的连接（如果有）"""
+    close = getattr(data_source, "close", None)
+    if close:
+        close()
+
+
+class SourceWorker:
+    """在专用线程中创建并使用一个数据源
+
+    数据库连接（如sqlite3）只能在创建它的线程中使用，
+    因此数据源的创建、读取和关闭都在同一个工作线程中执行，
+    守护模式下可在多次构建之间复用数据源及其连接。
+    """
+
+    def __init__(self, name: str, config: Config):
+        self.name = name
+        self.config = config
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"source-{name}"
+        )
+        # 各数据源并发创建（如建立数据库连接）
+        self._created: Future = self._executor.submit(
+            create_data_source, name, config
+        )
+
+    @property
+    def data_source(self) -> DataSource:
+        return self._created.result()
+
+    def submit(self) -> Future:
+        """在工作线程中读取全部记录"""
+        return self._executor.submit(self._fetch)
+
+    def _fetch(self) -> List[Dict[str, Any]]:
+        data_source = self.data_source
+        if self.config.incremental:
+            apps = sync_snapshot(
+                data_source,
+                snapshot_path(self.config.snapshot_file, self.name),
+                self.config.full_sync_hours,
+            )
+        else:
+            apps = list(data_source.fetch_data())
+        print(f"数据源{self.name}获取到{len(apps)}个应用")
+        return apps
+
+    def close(self) -> None:
+        """在工作线程中关闭数据源，然后结束线程"""
+        try:
+            if self._created.exception() is None:
+                self._executor.submit(close_data_source, self.data_source).result()
+        finally:
+            self._executor.shutdown()
+
+
+def fetch_sources(workers: Sequence[SourceWorker]) -> List[List[Dict[str, Any]]]:
+    """
+    并发获取多个数据源的全部记录
+
+    每个数据源在自己的工作线程中读取，
+    总耗时取决于最慢的数据源而不是各数据源耗时之和。
+
+    Args:
+        workers: 数据源工作线程列表
+
+    Returns:
+        与workers顺序一致的应用数据列表，任一数据源失败时抛出其异常
+    """
+    futures = [worker.submit() for worker in workers]
+    return [future.result() for future in futures]
+
+
+def _is_preferred(
+    candidate: Dict[str, Any], current: Dict[str, Any], precedence: str
+) -> bool:
+    """candidate是否应替换已保留的current（current来自列表中靠前的数据源）"""
+    if precedence == "newest":
+        new = _parse_published_date(candidate.get("publishedDate"))
+        old = _parse_published_date(current.get("publishedDate"))
+        return new is not None and old is not None and new > old
+    return False
+
+
+def _parse_published_date(value: Any) -> Optional[datetime.datetime]:
+    """
+    将各数据源的publishedDate解析为本地时间（不带时区），无法解析时返回None
+
+    支持ISO 8601格式（如飞书数据源的"2024-01-02 10:30"，带时区时转换为本地时间）、
+    PUBLISHED_DATE_FORMATS中的格式，以及10位（秒）或13位（毫秒）的时间戳。
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return _from_timestamp(value)
+    text = str(value).strip()
+    if not text:
+        return None
+    if text.isdigit() and len(text) in (10, 13):
+        return _from_timestamp(int(text))
+    try:
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        parsed = None
+        for date_format in PUBLISHED_DATE_FORMATS:
+            try:
+                parsed = datetime.datetime.strptime(text, date_format)
+                break
+            except ValueError:
+                continue
+    if parsed is not None and parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _from_timestamp(value: float) -> Optional[datetime.datetime]:
+    """秒或毫秒级时间戳（大于1e11时视为毫秒）"""
+    try:
+        return datetime.datetime.fromtimestamp(value / 1000 if value > 1e11 else value)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def merge_apps(
+    results: Iterable[Iterable[Dict[str, Any]]], precedence: str = "order"
+) -> List[Dict[str, Any]]:
+    """
+    按internalName合并多个数据源的应用数据
+
+    合并结果与数据源完成的先后无关：应用按数据源列表顺序及各自的原有顺序排列，
+    重复的应用保留首次出现的位置，内容由precedence决定。
+    同一数据源内的重复记录按原有行为以后出现的为准。
+
+    Args:
+        results: 按数据源列表顺序排列的应用数据
+        precedence: 优先规则，取值见MERGE_PRECEDENCE
+
+    Returns:
+        去重后的应用数据列表
+    """
+    if precedence not in MERGE_PRECEDENCE:
+        raise ValueError(f"不支持的合并优先规则: {precedence}")
+
+    merged: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    duplicates = 0
+    for apps in results:
+        # 先在数据源内部去重，再与靠前数据源的记录比较
+        source_apps = OrderedDict((record_key(app), app) for app in apps)
+        for key, app in source_apps.items():
+            current = merged.get(key)
+            if current is None:
+                merged[key] = app
+                continue
+            duplicates += 1
+            if _is_preferred(app, current, precedence):
+                merged[key] = app
+
+    if duplicates:
+        print(f"合并时发现{duplicates}个重复的应用，已按{precedence}规则去重")
+    return list(merged.values())
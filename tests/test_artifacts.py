@@ -0,0 +1,111 @@
+"""artifacts.py 的测试
+
+检查预压缩文件和清单与repo.xml一致，以及先后在安装和未安装brotli时构建，
+旧的repo.xml.br会被删除。
+
+用法：
+    python -m pytest tests/test_artifacts.py
+"""
+
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import artifacts  # noqa: E402
+from pipeline import run_pipeline  # noqa: E402
+
+
+def _apps(version: str) -> list:
+    return [
+        {
+            "name": "示例应用",
+            "internalName": "example",
+            "version": version,
+            "platform": [{"platformID": "TS-NASX86", "location": "http://x/a.qpkg"}],
+        }
+    ]
+
+
+class ArtifactsTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.xml_file = os.path.join(self.workdir.name, "repo.xml")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def build(self, version: str) -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_pipeline(
+                _apps(version), xml_file=self.xml_file, json_file=None, precompress=True
+            )
+        self.assertTrue(result.changed)
+
+    def read(self, suffix: str = "") -> bytes:
+        with open(self.xml_file + suffix, "rb") as f:
+            return f.read()
+
+    def manifest(self) -> dict:
+        with open(artifacts.manifest_path(self.xml_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def assert_consistent(self) -> dict:
+        xml = self.read()
+        manifest = self.manifest()
+        self.assertEqual(manifest["sha256"], hashlib.sha256(xml).hexdigest())
+        self.assertEqual(manifest["etag"], f'"{manifest["sha256"]}"')
+        self.assertEqual(gzip.decompress(self.read(".gz")), xml)
+        self.assertEqual(
+            [name for name in os.listdir(self.workdir.name) if name.endswith(".tmp")],
+            [],
+        )
+        return manifest
+
+    def test_gzip_without_brotli(self):
+        with mock.patch.object(artifacts, "brotli", None):
+            self.build("1.0")
+        manifest = self.assert_consistent()
+        self.assertEqual(list(manifest["encodings"]), ["gzip"])
+        self.assertFalse(os.path.exists(self.xml_file + ".br"))
+
+    @unittest.skipIf(artifacts.brotli is None, "未安装brotli")
+    def test_stale_brotli_removed(self):
+        self.build("1.0")
+        manifest = self.assert_consistent()
+        self.assertEqual(sorted(manifest["encodings"]), ["br", "gzip"])
+        self.assertEqual(artifacts.brotli.decompress(self.read(".br")), self.read())
+
+        # 之后的构建未安装brotli：旧的.br与新的repo.xml不一致，必须删除
+        with mock.patch.object(artifacts, "brotli", None):
+            self.build("2.0")
+        manifest = self.assert_consistent()
+        self.assertIn(b"2.0", self.read())
+        self.assertEqual(list(manifest["encodings"]), ["gzip"])
+        self.assertFalse(os.path.exists(self.xml_file + ".br"))
+
+        # 重新安装brotli后再次生成
+        self.build("3.0")
+        manifest = self.assert_consistent()
+        self.assertEqual(sorted(manifest["encodings"]), ["br", "gzip"])
+        self.assertEqual(artifacts.brotli.decompress(self.read(".br")), self.read())
+
+    def test_write_artifacts_in_place(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_pipeline(_apps("1.0"), xml_file=self.xml_file, json_file=None)
+            manifest = artifacts.write_artifacts(self.xml_file, "202401010000")
+        self.assertEqual(manifest, self.assert_consistent())
+        self.assertEqual(manifest["cachechk"], "202401010000")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+"""linkcheck.py 的测试
+
+在本地启动一个 http.server，提供200、404、重定向、慢响应、不支持HEAD、条件请求
+及非ASCII路径等情况，检查LinkChecker的结果、按主机的并发限制和TTL缓存。
+
+用法：
+    python -m pytest tests/test_linkcheck.py
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from linkcheck import LinkChecker, LinkCollector, _request_target  # noqa: E402
+
+# 慢响应的等待秒数，大于测试中LinkChecker的超时
+SLOW_DELAY = 1.0
+ETAG = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """按路径返回不同响应的测试服务器"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond()
+
+    def do_GET(self):
+        self._respond()
+
+    def _respond(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, dict(self.headers)))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            path = self.path
+            if path == "/ok":
+                self._send(200)
+            elif path == "/missing":
+                self._send(404)
+            elif path == "/redirect":
+                self._send(302, Location="/ok")
+            elif path == "/loop":
+                self._send(302, Location="/loop")
+            elif path == "/slow":
+                time.sleep(SLOW_DELAY)
+                self._send(200)
+            elif path == "/nohead":
+                self._send(405 if self.command == "HEAD" else 206)
+            elif path == "/etag":
+                if self.headers.get("If-None-Match") == ETAG:
+                    self._send(304)
+                else:
+                    self._send(200, ETag=ETAG)
+            elif path.startswith("/hold/"):
+                time.sleep(0.1)
+                self._send(200)
+            elif path == "/%E4%B8%AD%E6%96%87%20x.qpkg?v=%E5%80%BC":
+                self._send(200)
+            else:
+                self._send(404)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, status, **headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class LinkCheckTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.active = 0
+        self.server.max_active = 0
+        self.workdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.workdir.name, "link_cache.json")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def checker(self, **kwargs):
+        kwargs.setdefault("timeout", 0.5)
+        kwargs.setdefault("cache_file", self.cache_file)
+        return LinkChecker(**kwargs)
+
+    def url(self, path):
+        return self.base + path
+
+    def test_statuses(self):
+        results = self.checker().check(
+            [self.url(p) for p in ("/ok", "/missing", "/redirect", "/slow", "/nohead")]
+        )
+        ok = results[self.url("/ok")]
+        self.assertTrue(ok["ok"])
+        self.assertEqual(ok["status"], 200)
+        self.assertFalse(ok["cached"])
+
+        missing = results[self.url("/missing")]
+        self.assertFalse(missing["ok"])
+        self.assertEqual(missing["status"], 404)
+        self.assertEqual(missing["error"], "HTTP 404")
+
+        redirect = results[self.url("/redirect")]
+        self.assertTrue(redirect["ok"])
+        self.assertEqual(redirect["status"], 200)
+        self.assertEqual(redirect["final_url"], self.url("/ok"))
+
+        slow = results[self.url("/slow")]
+        self.assertFalse(slow["ok"])
+        self.assertIsNone(slow["status"])
+        self.assertIn("TimeoutError", slow["error"])
+
+        # 不支持HEAD时改用只取第一个字节的GET
+        nohead = results[self.url("/nohead")]
+        self.assertTrue(nohead["ok"])
+        self.assertEqual(nohead["status"], 206)
+        get = [r for r in self.server.requests if r[:2] == ("GET", "/nohead")]
+        self.assertEqual(get[0][2].get("Range"), "bytes=0-0")
+
+    def test_redirect_limit(self):
+        results = self.checker(max_redirects=2).check([self.url("/loop")])
+        result = results[self.url("/loop")]
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["status"], 302)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_per_host_limit(self):
+        urls = [self.url(f"/hold/{i}") for i in range(12)]
+        results = self.checker(per_host=3).check(urls)
+        self.assertTrue(all(r["ok"] for r in results.values()))
+        self.assertEqual(len(self.server.requests), 12)
+        self.assertLessEqual(self.server.max_active, 3)
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_ttl_cache(self):
+        urls = [self.url("/ok"), self.url("/missing")]
+        self.checker().check(urls)
+        self.assertEqual(len(self.server.requests), 2)
+
+        # 未过期的可访问链接直接使用缓存，失效的链接每次都重新检查
+        results = self.checker().check(urls)
+        self.assertTrue(results[self.url("/ok")]["cached"])
+        self.assertFalse(results[self.url("/missing")]["cached"])
+        self.assertEqual([r[1] for r in self.server.requests[2:]], ["/missing"])
+
+        # 缓存只保留本次出现的URL
+        self.checker().check([self.url("/ok")])
+        with open(self.cache_file, "r", encoding="utf-8") as f:
+            self.assertEqual(list(json.load(f)), [self.url("/ok")])
+
+    def test_conditional_request_after_ttl(self):
+        url = self.url("/etag")
+        first = self.checker(ttl=0).check([url])[url]
+        self.assertEqual(first["etag"], ETAG)
+
+        second = self.checker(ttl=0).check([url])[url]
+        self.assertFalse(second["cached"])
+        self.assertTrue(second["ok"])
+        self.assertEqual(second["status"], 304)
+        self.assertEqual(second["etag"], ETAG)
+        self.assertEqual(self.server.requests[-1][2].get("If-None-Match"), ETAG)
+
+    def test_non_ascii_url(self):
+        url = self.url("/中文 x.qpkg?v=值")
+        result = self.checker().check([url])[url]
+        self.assertTrue(result["ok"], result)
+        self.assertEqual(
+            self.server.requests[-1][1], "/%E4%B8%AD%E6%96%87%20x.qpkg?v=%E5%80%BC"
+        )
+
+    def test_request_target(self):
+        host, path = _request_target(urlsplit("https://Bücher.example/a%2Fb/ü?q=1&r=ß"))
+        self.assertEqual(host, "xn--bcher-kva.example")
+        self.assertEqual(path, "/a%2Fb/%C3%BC?q=1&r=%C3%9F")
+
+        host, path = _request_target(urlsplit("http://[::1]:8080"))
+        self.assertEqual(host, "::1")
+        self.assertEqual(path, "/")
+
+    def test_invalid_host(self):
+        url = "http://" + "ä" * 70 + ".example/"
+        result = self.checker().check([url])[url]
+        self.assertFalse(result["ok"])
+        self.assertIsNone(result["status"])
+
+    def test_collector(self):
+        collector = LinkCollector()
+        apps = [
+            {
+                "internalName": "a",
+                "platform": [
+                    {"platformID": "TS-X", "location": self.url("/ok")},
+                    {"platformID": "TS-Y", "location": "ftp://ignored"},
+                ],
+                "icon80": self.url("/ok"),
+                "snapshot": None,
+            },
+            {"internalName": "b", "platform": {"platformID": "TS-Z", "location": 1}},
+        ]
+        self.assertEqual(list(collector.collect(apps)), apps)
+        self.assertEqual(
+            dict(collector.urls),
+            {self.url("/ok"): [("a", "location[TS-X]"), ("a", "icon80")]},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""snapshot.py 的测试
+
+用临时SQLite数据库检查增量同步：先全量同步，再修改、插入（包括internalName重复、
+没有名称及rowid位于已有记录之间的行）后增量同步，快照的内容摘要必须与重新全量同步
+及直接读取数据源的结果一致。
+
+用法：
+    python -m pytest tests/test_snapshot.py
+"""
+
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import types
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_sources.records import FIELD_ORDER  # noqa: E402
+from data_sources.sqlite import SQLiteDataSource  # noqa: E402
+from pipeline import CatalogDigest  # noqa: E402
+from snapshot import Snapshot, sync_snapshot  # noqa: E402
+
+INITIAL_ROWS = [
+    (10, {"name": "应用A", "internalName": "a", "publishedDate": "2024-01-01"}),
+    (20, {"name": "应用B", "internalName": "b", "publishedDate": "2024-01-01"}),
+    (30, {"name": "重复1", "internalName": "dup", "publishedDate": "2024-01-01"}),
+    (40, {"name": "重复2", "internalName": "dup", "publishedDate": "2024-01-01"}),
+    (45, {"description": "没有名称", "publishedDate": "2024-01-01"}),
+]
+
+CHANGED_ROWS = [
+    # 修改已有的行
+    (
+        20,
+        {
+            "name": "应用B",
+            "internalName": "b",
+            "version": "2.0",
+            "publishedDate": "2024-02-01",
+        },
+    ),
+    # rowid位于已有记录之间的新行
+    (15, {"name": "应用C", "internalName": "c", "publishedDate": "2024-02-01"}),
+    # internalName重复、没有名称的新行
+    (50, {"name": "重复3", "internalName": "dup", "publishedDate": "2024-02-01"}),
+    (60, {"description": "也没有名称", "publishedDate": "2024-02-01"}),
+    (70, {"description": "也没有名称", "publishedDate": "2024-02-01"}),
+]
+
+
+def _digest(apps) -> str:
+    digest = CatalogDigest()
+    for app in apps:
+        digest.update(app)
+    return digest.hexdigest()
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.workdir.name, name)
+
+    def create_database(self, db_path: str) -> None:
+        with contextlib.closing(sqlite3.connect(db_path)) as conn:
+            columns = ", ".join(f'"{name}" TEXT' for name in FIELD_ORDER)
+            conn.execute(f'CREATE TABLE data ("id" INTEGER PRIMARY KEY, {columns})')
+            conn.commit()
+        self.write_rows(db_path, INITIAL_ROWS)
+
+    def write_rows(self, db_path: str, rows) -> None:
+        with contextlib.closing(sqlite3.connect(db_path)) as conn:
+            for row_id, values in rows:
+                names = ", ".join(f'"{name}"' for name in values)
+                marks = ", ".join("?" for _ in values)
+                conn.execute(
+                    f'INSERT OR REPLACE INTO data ("id", {names}) VALUES (?, {marks})',
+                    (row_id, *values.values()),
+                )
+            conn.commit()
+
+    def data_source(self, db_path: str, **options) -> SQLiteDataSource:
+        config = types.SimpleNamespace(
+            db_path=db_path,
+            sqlite_watermark_column="publishedDate",
+            sqlite_stream=False,
+            sqlite_batch_size=2,
+            sqlite_create_index=True,
+            parallel_normalize=False,
+            normalize_workers=2,
+            normalize_chunk_size=2,
+            normalize_threshold=1,
+        )
+        for name, value in options.items():
+            setattr(config, name, value)
+        return SQLiteDataSource(config)
+
+    def sync(self, data_source, snapshot_file: str) -> list:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return sync_snapshot(data_source, snapshot_file, 0)
+
+    def test_incremental_equals_full(self):
+        variants = {
+            "cursor": {},
+            "stream": {"sqlite_stream": True},
+            "parallel": {"sqlite_stream": True, "parallel_normalize": True},
+        }
+        for name, options in variants.items():
+            with self.subTest(name):
+                db_path = self.path(f"{name}.db")
+                snapshot_file = self.path(f"{name}.incremental.json")
+                self.create_database(db_path)
+                data_source = self.data_source(db_path, **options)
+                try:
+                    initial = self.sync(data_source, snapshot_file)
+                    self.assertEqual(len(initial), len(INITIAL_ROWS))
+
+                    self.write_rows(db_path, CHANGED_ROWS)
+                    incremental = self.sync(data_source, snapshot_file)
+                    full = self.sync(data_source, self.path(f"{name}.full.json"))
+                    direct = list(data_source.fetch_data())
+                finally:
+                    data_source.close()
+
+                # 重复和没有名称的行都各自保留，新行按rowid排列
+                self.assertEqual(len(direct), 9)
+                self.assertEqual(
+                    [app.get("name") for app in direct[:3]], ["应用A", "应用C", "应用B"]
+                )
+                self.assertEqual(_digest(incremental), _digest(full))
+                self.assertEqual(_digest(incremental), _digest(direct))
+
+                # 保存的快照重新读取后顺序和标识不变
+                snapshot = Snapshot.load(snapshot_file)
+                self.assertEqual(_digest(snapshot.records.values()), _digest(full))
+                self.assertEqual(
+                    list(snapshot.records)[:3], [("id", 10), ("id", 15), ("id", 20)]
+                )
+
+    def test_old_snapshot_format(self):
+        """没有记录标识的旧格式快照返回空快照，下次同步为全量同步"""
+        snapshot_file = self.path("snapshot.json")
+        with open(snapshot_file, "w", encoding="utf-8") as f:
+            json.dump({"watermark": "2024-01-01", "records": [{"name": "x"}]}, f)
+        with contextlib.redirect_stdout(io.StringIO()):
+            snapshot = Snapshot.load(snapshot_file)
+        self.assertIsNone(snapshot.watermark)
+        self.assertEqual(len(snapshot.records), 0)
+
+    def test_unnamed_records_kept(self):
+        """没有行标识和名称的记录按内容区分，不合并为一条"""
+        snapshot = Snapshot(self.path("snapshot.json"))
+        apps = [{"description": "甲"}, {"description": "乙"}, {"internalName": "a"}]
+        self.assertEqual(snapshot.replace(apps), 3)
+        snapshot.merge([{"description": "丙"}, {"internalName": "a", "version": "2"}])
+        self.assertEqual(len(snapshot.records), 4)
+        self.assertEqual(snapshot.records[("key", "a")]["version"], "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""XML写入器的差异测试
+
+RepoXmlWriter（lxml流式写入）、FastRepoXmlWriter（直接写出字节）及update_repo()
+一次性构建XML树的输出必须逐字节一致，拆分的平台文件也一致；两种写入器对不合法的
+文本抛出相同类型的异常。大量合成数据的比较见 benchmarks/check_xml.py。
+
+用法：
+    python -m pytest tests/test_xml_writers.py
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_sources.records import AppRecord, PlatformEntry  # noqa: E402
+from update_repo import FastRepoXmlWriter, RepoXmlWriter, update_repo  # noqa: E402
+
+CACHECHK = "202401010000"
+
+EDGE_CASES = [
+    {
+        "name": "A & B <beta> \"quoted\" 'single' ]]>",
+        "changeLog": "line1\nline2\r\nline3\ttab",
+        "description": "中文描述 日本語 한국어 \U0001F600 \u2028 \x7f\x85",
+        "version": "",
+        "platform": [
+            {"platformID": "TS-NASX86", "location": "http://x/?a=1&b=2"},
+            {"platformID": "TS-X41", "location": None, "signature": "abc"},
+            {"platformID": "TS-NASARM_64", "location": "http://x/中文.qpkg"},
+        ],
+        "internalName": "edge1",
+        "publishedDate": 20240101,
+        "language": None,
+    },
+    {
+        "internalName": "edge2",
+        "platform": {"platformID": "TS-X19", "location": "<single>"},
+        "publishedDate": None,
+    },
+    {"internalName": "edge3", "platform": [], "icon80": None, "snapshot": " "},
+    {"name": "", "description": None, "category": "", "fwVersion": None},
+    {},
+]
+
+
+def _records() -> list:
+    """同样的数据以规范化记录（AppRecord/PlatformEntry）表示"""
+    records = []
+    for app in EDGE_CASES[:3]:
+        record = AppRecord()
+        for key, value in app.items():
+            if key == "platform":
+                platforms = value if isinstance(value, list) else [value]
+                value = [PlatformEntry(**platform) for platform in platforms]
+            record[key] = value
+        records.append(record)
+    return records
+
+
+class XmlWritersTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.workdir.name, name)
+
+    def write(self, writer_class: type, apps: list, name: str) -> bytes:
+        with writer_class(self.path(name), CACHECHK) as writer:
+            for app in apps:
+                writer.write(app)
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+    def assert_streams_equal(self, apps: list) -> bytes:
+        expected = self.write(RepoXmlWriter, apps, "lxml.xml")
+        actual = self.write(FastRepoXmlWriter, apps, "fast.xml")
+        self.assertEqual(expected, actual)
+        return expected
+
+    def test_edge_cases(self):
+        xml = self.assert_streams_equal(EDGE_CASES)
+        self.assertIn("中文描述".encode("utf-8"), xml)
+        self.assertIn(b"A &amp; B &lt;beta&gt;", xml)
+
+    def test_empty(self):
+        self.assert_streams_equal([])
+
+    def test_records(self):
+        self.assertEqual(
+            self.assert_streams_equal(_records()),
+            self.write(RepoXmlWriter, EDGE_CASES[:3], "plain.xml"),
+        )
+
+    def test_update_repo(self):
+        """一次性构建XML树（lxml）与快速写入器，同时比较拆分的平台文件"""
+        input_file = self.path("apps.json")
+        with open(input_file, "w", encoding="utf-8") as f:
+            json.dump(EDGE_CASES, f, ensure_ascii=False, indent=2)
+
+        outputs = {}
+        for name in ("lxml", "fast"):
+            output_file = self.path(f"repo_{name}.xml")
+            platform_dir = self.path(f"platforms_{name}")
+            with contextlib.redirect_stdout(io.StringIO()):
+                update_repo(
+                    input_file,
+                    output_file,
+                    cachechk=CACHECHK,
+                    platform_dir=platform_dir,
+                    xml_writer=name,
+                )
+            files = {"repo.xml": output_file}
+            for file_name in sorted(os.listdir(platform_dir)):
+                files[file_name] = os.path.join(platform_dir, file_name)
+            outputs[name] = {}
+            for label, path in files.items():
+                with open(path, "rb") as f:
+                    outputs[name][label] = f.read()
+
+        self.assertEqual(outputs["lxml"], outputs["fast"])
+        self.assertIn("TS-NASARM_64.xml", outputs["fast"])
+        self.assertEqual(
+            outputs["fast"]["repo.xml"],
+            self.write(RepoXmlWriter, EDGE_CASES, "stream.xml"),
+        )
+
+    def test_same_exceptions(self):
+        for value in ("bad\x01char", "nul\x00", "\ufffe", 123, ["list"]):
+            with self.subTest(value=value):
+                app = {"internalName": "invalid", "description": value}
+                raised = []
+                for writer_class in (RepoXmlWriter, FastRepoXmlWriter):
+                    try:
+                        self.write(writer_class, [app], f"{writer_class.__name__}.xml")
+                        raised.append(None)
+                    except Exception as e:
+                        raised.append(type(e))
+                self.assertIsNotNone(raised[0])
+                self.assertIs(raised[0], raised[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,91 +1,585 @@
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
 from lxml import etree
+import os
+import re
 import time
 import json
 
+from data_sources.records import field_getter
+
+CACHECHK_PATTERN = re.compile(rb"<cachechk>([^<]*)</cachechk>")
+# 记录PlatformRepoWriter生成的平台文件，清理时只删除其中列出的文件
+PLATFORM_MANIFEST = ".platforms.json"
+# 文本中需要转义或不允许出现的字符，大多数字段不含这些字符，可直接写出
+XML_SPECIAL_PATTERN = re.compile("[&<>\r\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+# XML 1.0中不允许出现的字符，与lxml设置text时的检查一致
+XML_INVALID_PATTERN = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;"})
+# platformID中不能用作文件名的字符
+UNSAFE_FILENAME_PATTERN = re.compile(r"[^\w.-]")
+
+
+def _build_item(app: Dict[str, Any]) -> etree._Element:
+    """根据单个应用数据构建<item>元素"""
+    # 记录类型直接读取属性，比逐个调用Mapping.get快
+    get = field_getter(app)
+    item = etree.Element("item")
+    etree.SubElement(item, "name").text = get("name", "")
+    etree.SubElement(item, "changeLog").text = get("changeLog", "")
+    etree.SubElement(item, "category").text = get("category", "")
+    etree.SubElement(item, "type").text = get("type", "")
+    etree.SubElement(item, "icon80").text = get(
+        "icon80", "https://help.qnapclub.cn/upload/logo_80x80.png"
+    )
+    etree.SubElement(item, "icon100").text = get(
+        "icon100", "https://help.qnapclub.cn/upload/logo_100x100.png"
+    )
+    etree.SubElement(item, "description").text = get("description", "QnapclubCN")
+    etree.SubElement(item, "fwVersion").text = get("fwVersion", "")
+    etree.SubElement(item, "version").text = get("version", "")
+    # 支持 platform 为列表
+    for platform_data in _platform_list(app):
+        platform = etree.SubElement(item, "platform")
+        platform_get = field_getter(platform_data)
+        etree.SubElement(platform, "platformID").text = platform_get("platformID", "")
+        etree.SubElement(platform, "location").text = platform_get("location", "")
+        etree.SubElement(platform, "signature").text = platform_get("signature", "")
+    etree.SubElement(item, "internalName").text = get("internalName", "")
+    # 确保publishedDate为字符串类型，不修改原始值，仅在XML生成时转换
+    published_date = get("publishedDate", "")
+    etree.SubElement(item, "publishedDate").text = (
+        str(published_date) if published_date is not None else ""
+    )
+    etree.SubElement(item, "maintainer").text = get("maintainer", "")
+    etree.SubElement(item, "developer").text = get("developer", "")
+    etree.SubElement(item, "forumLink").text = get("forumLink", "")
+    etree.SubElement(item, "language").text = get("language", "")
+    etree.SubElement(item, "snapshot").text = get("snapshot", "")
+    etree.SubElement(item, "bannerImg").text = get("bannerImg", "")
+    etree.SubElement(item, "tutorialLink").text = get("tutorialLink", "")
+    return item
+
+
+class RepoXmlWriter:
+    """流式写入仓库XML文件
+
+    基于 etree.xmlfile 增量写入，每次只在内存中保留一个<item>，
+    输出内容与一次性构建整棵树后序列化的结果完全一致。
+
+    使用方法：
+        with RepoXmlWriter("repo.xml") as writer:
+            for app in apps:
+                writer.write(app)
+    """
+
+    def __init__(self, output_file: str, cachechk: Optional[str] = None):
+        self.output_file = output_file
+        self.cachechk = cachechk or time.strftime("%Y%m%d%H%M")
+        self.count = 0
+        self._file = None
+        self._stack: Optional[ExitStack] = None
+        self._xf = None
+
+    def __enter__(self) -> "RepoXmlWriter":
+        self._file = open(self.output_file, "wb")
+        self._stack = ExitStack()
+        try:
+            self._xf = self._stack.enter_context(
+                etree.xmlfile(self._file, encoding="utf-8")
+            )
+            self._xf.write_declaration()
+            self._stack.enter_context(self._xf.element("plugins"))
+            cachechk = etree.Element("cachechk")
+            cachechk.text = self.cachechk
+            self._xf.write("\n  ")
+            self._xf.write(cachechk)
+        except BaseException:
+            self._stack.close()
+            self._file.close()
+            raise
+        return self
+
+    def write(self, app: Dict[str, Any]) -> None:
+        """写入单个应用"""
+        item = _build_item(app)
+        etree.indent(item, space="  ", level=1)
+        self._xf.write("\n  ")
+        self._xf.write(item)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                # 闭合<plugins>前换行，与 pretty_print 的输出保持一致
+                self._xf.write("\n")
+                self._stack.close()
+                self._file.write(b"\n")
+            else:
+                self._stack.__exit__(exc_type, exc, tb)
+        finally:
+            self._file.close()
+
+
+def _platform_list(app: Dict[str, Any]) -> list:
+    """应用的platform列表，与_build_item的处理方式一致"""
+    platforms = app.get("platform", [])
+    if isinstance(platforms, dict):
+        platforms = [platforms]
+    return platforms
+
+
+def _escape_text(value: Any) -> Optional[str]:
+    """转义元素文本，与lxml对text的处理一致：None表示空元素，非字符串抛出TypeError"""
+    if value.__class__ is not str:
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        elif not isinstance(value, str):
+            raise TypeError(
+                f"Argument must be bytes or unicode, got '{type(value).__name__}'"
+            )
+    if XML_SPECIAL_PATTERN.search(value) is None:
+        return value
+    if XML_INVALID_PATTERN.search(value) is not None:
+        raise ValueError(
+            "All strings must be XML compatible: Unicode or ASCII, "
+            "no NULL bytes or control characters"
+        )
+    return value.translate(XML_ESCAPES)
 
-def update_repo(input_file="apps.json", output_file=None):
+
+def _field_tags(
+    names: Iterable[str], level: int, before: str = "", after: str = ""
+) -> List[Tuple[str, str, str]]:
+    """
+    预先生成一组子元素的(开始标签, 结束标签, 空元素)
+
+    开始标签和空元素包含缩进，before合并到第一个元素之前，after合并到最后一个元素之后
+    （父元素的开始和结束标签），写入时每个字段只需拼接一次。
+    """
+    indent = "\n" + "  " * level
+    tags = [(f"{indent}<{n}>", f"</{n}>", f"{indent}<{n}/>") for n in names]
+    start, end, empty = tags[0]
+    tags[0] = (before + start, end, before + empty)
+    start, end, empty = tags[-1]
+    tags[-1] = (start, end + after, empty + after)
+    return tags
+
+
+class FastRepoXmlWriter:
+    """直接写出字节的仓库XML写入器
+
+    仓库XML的结构是固定的，因此不构建lxml元素树：各字段的标签和缩进预先生成，
+    每个<item>的全部文本一次扫描判断是否需要转义（绝大多数不需要），拼接成一个字符串
+    后编码写入带缓冲的文件。输出与RepoXmlWriter（以及非流式的update_repo）逐字节一致，
+    可用 benchmarks/check_xml.py 比较两者的输出。接口与RepoXmlWriter相同。
+    """
+
+    # <item>中<platform>之前和之后的字段及默认值，与_build_item一致
+    HEAD_FIELDS = (
+        ("name", ""),
+        ("changeLog", ""),
+        ("category", ""),
+        ("type", ""),
+        ("icon80", "https://help.qnapclub.cn/upload/logo_80x80.png"),
+        ("icon100", "https://help.qnapclub.cn/upload/logo_100x100.png"),
+        ("description", "QnapclubCN"),
+        ("fwVersion", ""),
+        ("version", ""),
+    )
+    TAIL_FIELDS = (
+        ("internalName", ""),
+        ("publishedDate", ""),
+        ("maintainer", ""),
+        ("developer", ""),
+        ("forumLink", ""),
+        ("language", ""),
+        ("snapshot", ""),
+        ("bannerImg", ""),
+        ("tutorialLink", ""),
+    )
+    PLATFORM_FIELDS = (("platformID", ""), ("location", ""), ("signature", ""))
+    # publishedDate在TAIL_FIELDS中的位置（从末尾数）
+    PUBLISHED_DATE = 1 - len(TAIL_FIELDS)
+
+    HEAD_TAGS = _field_tags((n for n, _ in HEAD_FIELDS), 2, before="\n  <item>")
+    TAIL_TAGS = _field_tags((n for n, _ in TAIL_FIELDS), 2, after="\n  </item>")
+    PLATFORM_TAGS = _field_tags(
+        (n for n, _ in PLATFORM_FIELDS),
+        3,
+        before="\n    <platform>",
+        after="\n    </platform>",
+    )
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, output_file: str, cachechk: Optional[str] = None):
+        self.output_file = output_file
+        self.cachechk = cachechk or time.strftime("%Y%m%d%H%M")
+        self.count = 0
+        self._file = None
+
+    def __enter__(self) -> "FastRepoXmlWriter":
+        cachechk = _escape_text(self.cachechk)
+        self._file = open(self.output_file, "wb", buffering=self.BUFFER_SIZE)
+        self._file.write(
+            "<?xml version='1.0' encoding='utf-8'?>\n<plugins>\n  "
+            f"<cachechk>{cachechk}</cachechk>".encode("utf-8")
+        )
+        return self
+
+    def write(self, app: Dict[str, Any]) -> None:
+        """写入单个应用"""
+        get = field_getter(app)
+        values = [get(name, default) for name, default in self.HEAD_FIELDS]
+        tags = self.HEAD_TAGS
+        platforms = _platform_list(app)
+        if platforms:
+            tags = tags + self.PLATFORM_TAGS * len(platforms)
+            for platform_data in platforms:
+                platform_get = field_getter(platform_data)
+                values += [platform_get(n, d) for n, d in self.PLATFORM_FIELDS]
+        tags = tags + self.TAIL_TAGS
+        values += [get(name, default) for name, default in self.TAIL_FIELDS]
+        # 与_build_item一致：publishedDate转换为字符串，None写为空字符串
+        published_date = values[self.PUBLISHED_DATE]
+        values[self.PUBLISHED_DATE] = (
+            str(published_date) if published_date is not None else ""
+        )
+
+        try:
+            # 全部为字符串且不含需要转义的字符时直接写出
+            plain = XML_SPECIAL_PATTERN.search("".join(values)) is None
+        except TypeError:
+            plain = False
+        texts = values if plain else [_escape_text(value) for value in values]
+        item = "".join(
+            [
+                empty if text is None else start + text + end
+                for (start, end, empty), text in zip(tags, texts)
+            ]
+        )
+        self._file.write(item.encode("utf-8"))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self._file.write(b"\n</plugins>\n")
+        finally:
+            self._file.close()
+
+
+# XML写入方式（build.xml_writer）
+XML_WRITERS = {"lxml": RepoXmlWriter, "fast": FastRepoXmlWriter}
+
+
+def xml_writer_class(name: str) -> type:
+    """按名称返回XML写入器类"""
+    try:
+        return XML_WRITERS[name or "lxml"]
+    except KeyError:
+        raise ValueError(f"不支持的XML写入方式: {name}") from None
+
+
+class PlatformRepoWriter:
+    """按platformID拆分的仓库XML文件
+
+    与合并的repo.xml在同一次遍历中写出：每个platformID对应一个XML文件，
+    只保留该平台的<platform>，没有该平台的应用不写入。
+    文件先写入临时文件，commit()时替换正式文件并删除上次生成、本次不再出现的平台文件。
+    生成的文件名记录在输出目录的.platforms.json中，目录中的其他文件不会被删除；
+    输出目录仍应专用，不能与repo.xml所在的目录相同。
+
+    使用方法：
+        with PlatformRepoWriter("platforms", cachechk) as writer:
+            for app in apps:
+                writer.write(app)
+        writer.commit()
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        cachechk: Optional[str] = None,
+        writer_class: type = RepoXmlWriter,
+        main_output: Optional[str] = None,
+    ):
+        if main_output and _same_dir(output_dir, os.path.dirname(main_output) or "."):
+            raise ValueError(
+                f"platform_dir（{output_dir}）不能是{main_output}所在的目录，请使用专用目录"
+            )
+        self.output_dir = output_dir
+        self.cachechk = cachechk or time.strftime("%Y%m%d%H%M")
+        # 各平台文件使用的XML写入器类
+        self.writer_class = writer_class
+        # platformID -> RepoXmlWriter
+        self.writers: "OrderedDict[str, RepoXmlWriter]" = OrderedDict()
+        self._stack = ExitStack()
+
+    def output_file(self, platform_id: str) -> str:
+        """平台对应的XML文件路径"""
+        name = UNSAFE_FILENAME_PATTERN.sub("_", platform_id)
+        return os.path.join(self.output_dir, f"{name}.xml")
+
+    @property
+    def temp_files(self) -> List[str]:
+        return [writer.output_file for writer in self.writers.values()]
+
+    def __enter__(self) -> "PlatformRepoWriter":
+        os.makedirs(self.output_dir, exist_ok=True)
+        return self
+
+    def write(self, app: Dict[str, Any]) -> None:
+        """按平台拆分并写入单个应用"""
+        grouped: "OrderedDict[str, list]" = OrderedDict()
+        for platform_data in _platform_list(app):
+            platform_id = platform_data.get("platformID", "")
+            if platform_id:
+                grouped.setdefault(platform_id, []).append(platform_data)
+
+        for platform_id, platforms in grouped.items():
+            writer = self.writers.get(platform_id)
+            if writer is None:
+                temp_file = f"{self.output_file(platform_id)}.tmp"
+                writer = self._stack.enter_context(
+                    self.writer_class(temp_file, self.cachechk)
+                )
+                self.writers[platform_id] = writer
+            writer.write({**app, "platform": platforms})
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stack.__exit__(exc_type, exc, tb)
+        if exc_type is not None:
+            self.discard()
+
+    def discard(self) -> None:
+        """删除临时文件，保留原有的平台文件"""
+        for temp_file in self.temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def patch_cachechk(self, cachechk: str) -> None:
+        """替换所有临时文件中的<cachechk>"""
+        for temp_file in self.temp_files:
+            patch_cachechk(temp_file, cachechk)
+        self.cachechk = cachechk
+
+    def commit(self) -> List[str]:
+        """替换正式文件，删除上次生成、本次没有出现的平台文件，返回生成的文件列表"""
+        previous = self._load_manifest()
+        outputs = []
+        for platform_id, writer in self.writers.items():
+            output_file = self.output_file(platform_id)
+            os.replace(writer.output_file, output_file)
+            outputs.append(output_file)
+
+        names = [os.path.basename(path) for path in outputs]
+        self._save_manifest(names)
+        for name in set(previous) - set(names):
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except FileNotFoundError:
+                pass
+        return outputs
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.output_dir, PLATFORM_MANIFEST)
+
+    def _load_manifest(self) -> List[str]:
+        """上次生成的平台文件名，只接受本写入器会生成的文件名"""
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                names = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            print(f"读取{self._manifest_path()}失败: {e}")
+            return []
+        if not isinstance(names, list):
+            return []
+        return [
+            name
+            for name in names
+            if isinstance(name, str)
+            and name.endswith(".xml")
+            and name == os.path.basename(name)
+            and not UNSAFE_FILENAME_PATTERN.search(name)
+        ]
+
+    def _save_manifest(self, names: List[str]) -> None:
+        temp_file = f"{self._manifest_path()}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(sorted(names), f, ensure_ascii=False)
+        os.replace(temp_file, self._manifest_path())
+
+
+def _same_dir(a: str, b: str) -> bool:
+    """两个路径是否指向同一目录（目录不存在时比较规范化后的绝对路径）"""
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return os.path.realpath(a) == os.path.realpath(b)
+
+
+def write_repo_xml(
+    apps: Iterable[Dict[str, Any]],
+    output_file: str,
+    cachechk: Optional[str] = None,
+    xml_writer: str = "lxml",
+) -> int:
+    """
+    以流式方式将应用数据写入仓库XML文件
+
+    Args:
+        apps: 任意可迭代的应用数据（列表或生成器）
+        output_file: 输出的XML文件路径
+        cachechk: <cachechk>的值，为None时使用当前时间
+        xml_writer: XML写入方式，"lxml"或"fast"
+
+    Returns:
+        写入的应用数量
+    """
+    with xml_writer_class(xml_writer)(output_file, cachechk) as writer:
+        for app in apps:
+            writer.write(app)
+    return writer.count
+
+
+def read_cachechk(xml_file: str) -> Optional[str]:
+    """读取已有仓库XML文件中的<cachechk>值，文件不存在时返回None"""
+    try:
+        with open(xml_file, "rb") as f:
+            head = f.read(512)
+    except FileNotFoundError:
+        return None
+    match = CACHECHK_PATTERN.search(head)
+    return match.group(1).decode("utf-8") if match else None
+
+
+def patch_cachechk(xml_file: str, cachechk: str) -> None:
+    """
+    原位替换仓库XML文件中的<cachechk>值
+
+    流式写入时<cachechk>位于文件开头，而内容摘要要等全部应用写完才能确定，
+    因此先写入同样长度的占位值，写完后再替换。新旧值的长度必须一致。
+    """
+    with open(xml_file, "r+b") as f:
+        head = f.read(512)
+        match = CACHECHK_PATTERN.search(head)
+        if not match:
+            raise ValueError(f"{xml_file}中未找到<cachechk>")
+        value = cachechk.encode("utf-8")
+        if len(value) != len(match.group(1)):
+            raise ValueError("新旧<cachechk>长度不一致，无法原位替换")
+        f.seek(match.start(1))
+        f.write(value)
+
+
+def update_repo(
+    input_file="apps.json",
+    output_file=None,
+    stream=False,
+    cachechk=None,
+    platform_dir=None,
+    xml_writer="lxml",
+    precompress=False,
+):
     """
     根据应用数据更新仓库XML文件
 
     Args:
         input_file: 输入的apps.json文件路径
         output_file: 输出的XML文件路径，如果为None则自动生成带日期的文件名
+        stream: 是否使用流式写入，不在内存中构建完整的XML树
+        cachechk: <cachechk>的值，为None时使用当前时间
+        platform_dir: 按platformID拆分的XML文件的输出目录，为None或空字符串时不生成
+        xml_writer: XML写入方式，"lxml"使用lxml构建元素，"fast"直接写出字节（总是流式写入）
+        precompress: 由临时文件生成预压缩文件和清单（见artifacts.py），与XML文件一起替换
     """
+    writer_class = xml_writer_class(xml_writer)
+    if writer_class is not RepoXmlWriter:
+        # 不构建元素树，流式写入与一次性写入的输出相同
+        stream = True
+
     apps: list = []
     # 从指定文件读取应用数据
     with open(input_file, "r", encoding="utf-8") as f:
         apps = json.load(f)
 
-    # 创建根元素 <plugins>
-    root = etree.Element("plugins")
-    etree.SubElement(root, "cachechk").text = time.strftime("%Y%m%d%H%M")
-
-    for app in apps:
-        item = etree.SubElement(root, "item")
-        etree.SubElement(item, "name").text = app.get("name", "")
-        etree.SubElement(item, "changeLog").text = app.get("changeLog", "")
-        etree.SubElement(item, "category").text = app.get("category", "")
-        etree.SubElement(item, "type").text = app.get("type", "")
-        etree.SubElement(item, "icon80").text = app.get(
-            "icon80", "https://help.qnapclub.cn/upload/logo_80x80.png"
-        )
-        etree.SubElement(item, "icon100").text = app.get(
-            "icon100", "https://help.qnapclub.cn/upload/logo_100x100.png"
-        )
-        etree.SubElement(item, "description").text = app.get(
-            "description", "QnapclubCN"
-        )
-        etree.SubElement(item, "fwVersion").text = app.get("fwVersion", "")
-        etree.SubElement(item, "version").text = app.get("version", "")
-        # 支持 platform 为列表
-        platforms = app.get("platform", [])
-        if isinstance(platforms, dict):
-            platforms = [platforms]
-        for platform_data in platforms:
-            platform = etree.SubElement(item, "platform")
-            etree.SubElement(platform, "platformID").text = platform_data.get(
-                "platformID", ""
-            )
-            etree.SubElement(platform, "location").text = platform_data.get(
-                "location", ""
-            )
-            etree.SubElement(platform, "signature").text = platform_data.get(
-                "signature", ""
-            )
-        etree.SubElement(item, "internalName").text = app.get("internalName", "")
-        # 确保publishedDate为字符串类型，不修改原始值，仅在XML生成时转换
-        published_date = app.get("publishedDate", "")
-        etree.SubElement(item, "publishedDate").text = (
-            str(published_date) if published_date is not None else ""
-        )
-        etree.SubElement(item, "maintainer").text = app.get("maintainer", "")
-        etree.SubElement(item, "developer").text = app.get("developer", "")
-        etree.SubElement(item, "forumLink").text = app.get("forumLink", "")
-        etree.SubElement(item, "language").text = app.get("language", "")
-        etree.SubElement(item, "snapshot").text = app.get("snapshot", "")
-        etree.SubElement(item, "bannerImg").text = app.get("bannerImg", "")
-        etree.SubElement(item, "tutorialLink").text = app.get("tutorialLink", "")
-
-    # 美化XML（添加换行和缩进）
-    etree.indent(root, space="  ")
-
-    # 生成XML字符串
-    xml_str = etree.tostring(
-        root, encoding="utf-8", xml_declaration=True, pretty_print=True
-    )
-
     # 如果没有指定输出文件名，自动生成带日期的文件名
     if output_file is None:
         output_file = f"repo_build_{time.strftime('%Y%m%d')}.xml"
 
-    # 保存到文件
-    with open(output_file, "wb") as f:
-        f.write(xml_str)
+    # 先写入临时文件再重命名，避免客户端读到写了一半的文件
+    temp_file = f"{output_file}.tmp"
+
+    cachechk = cachechk or time.strftime("%Y%m%d%H%M")
+
+    with ExitStack() as stack:
+        platform_writer = None
+        if platform_dir:
+            platform_writer = stack.enter_context(
+                PlatformRepoWriter(
+                    platform_dir, cachechk, writer_class, main_output=output_file
+                )
+            )
+
+        if stream:
+            with writer_class(temp_file, cachechk) as writer:
+                for app in apps:
+                    writer.write(app)
+                    if platform_writer:
+                        platform_writer.write(app)
+        else:
+            # 创建根元素 <plugins>
+            root = etree.Element("plugins")
+            etree.SubElement(root, "cachechk").text = cachechk
+
+            for app in apps:
+                root.append(_build_item(app))
+                if platform_writer:
+                    platform_writer.write(app)
 
+    if not stream:
+        # 美化XML（添加换行和缩进）
+        etree.indent(root, space="  ")
+
+        # 生成XML字符串
+        xml_str = etree.tostring(
+            root, encoding="utf-8", xml_declaration=True, pretty_print=True
+        )
+
+        # 保存到文件
+        with open(temp_file, "wb") as f:
+            f.write(xml_str)
+    if precompress:
+        # 只在启用预压缩时导入（可能导入brotli）
+        from artifacts import ArtifactWriter
+
+        artifacts = ArtifactWriter(output_file)
+        try:
+            artifacts.prepare(temp_file, cachechk)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+        artifacts.commit(temp_file)
+    else:
+        os.replace(temp_file, output_file)
     print(f"已成功生成仓库文件: {output_file}")
+    _commit_platforms(platform_writer)
     return output_file
 
 
+def _commit_platforms(platform_writer: Optional[PlatformRepoWriter]) -> None:
+    if platform_writer:
+        outputs = platform_writer.commit()
+        print(f"已生成{len(outputs)}个平台的仓库文件: {platform_writer.output_dir}")
+
+
 # 如果直接运行此文件，则执行默认更新
 if __name__ == "__main__":
     update_repo()
@@ -122,6 +122,17 @@ let filteredItems = [];
 let currentPage = 1;
 const itemsPerPage = 20;
 
+// 目录索引模式（加载构建生成的index.json时使用，只下载当前页所在的分片）
+let catalogIndex = null;
+let catalogBaseUrl = '';
+const shardCache = new Map();
+let renderSeq = 0;
+
+// 词项规则与构建脚本catalog_index.py中的tokenize保持一致
+const CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af';
+const WORD_PATTERN = new RegExp(`[0-9a-z\u00c0-\u024f]+|[${CJK_RANGES}]+`, 'g');
+const CJK_PATTERN = new RegExp(`^[${CJK_RANGES}]`);
+
 // 解析XML并创建应用卡片
 function parseAndDisplayApps(xmlString) {
     try {
@@ -145,26 +156,18 @@ function parseAndDisplayApps(xmlString) {
         }
 
         // 保存所有项目
+        catalogIndex = null;
         allItems = Array.from(items);
-        filteredItems = [...allItems]; // 初始时显示所有项目
-        currentPage = 1;
 
         // 显示统计信息
-        displayStats(items, cachechk);
-        
-        // 显示搜索框
-        searchSection.style.display = 'block';
-        searchInfo.style.display = 'none';
-        searchInput.value = '';
-        clearSearchBtn.style.display = 'none';
-        
-        // 初始化分页
-        renderPagination();
+        const categories = new Set();
+        allItems.forEach(item => {
+            const category = getElementText(item, 'category');
+            if (category) categories.add(category);
+        });
+        displayStats(allItems.length, categories.size, cachechk);
 
-        // 显示结果
-        emptyState.style.display = 'none';
-        appsGrid.style.display = 'grid';
-        hideError();
+        showAppList();
 
     } catch (error) {
         showError('解析失败：' + error.message);
@@ -174,12 +177,163 @@ function parseAndDisplayApps(xmlString) {
     }
 }
 
+// 显示应用列表、搜索框和分页
+function showAppList() {
+    filteredItems = [...allItems]; // 初始时显示所有项目
+    currentPage = 1;
+
+    // 显示搜索框
+    searchSection.style.display = 'block';
+    searchInfo.style.display = 'none';
+    searchInput.value = '';
+    clearSearchBtn.style.display = 'none';
+
+    // 初始化分页
+    renderPagination();
+
+    // 显示结果
+    emptyState.style.display = 'none';
+    appsGrid.style.display = 'grid';
+    hideError();
+}
+
+// 加载目录索引（index.json）
+async function loadCatalog(url) {
+    const indexUrl = new URL(url, window.location.href);
+    const response = await fetch(indexUrl, { method: 'GET', mode: 'cors' });
+    if (!response.ok) {
+        throw new Error(`HTTP错误: ${response.status}`);
+    }
+
+    catalogIndex = await response.json();
+    catalogBaseUrl = new URL('.', indexUrl).href;
+    shardCache.clear();
+
+    if (!catalogIndex.count) {
+        showError('目录索引中没有应用数据');
+        pagination.style.display = 'none';
+        searchSection.style.display = 'none';
+        searchInfo.style.display = 'none';
+        return;
+    }
+
+    // 目录索引模式下，列表中保存的是应用序号
+    allItems = Array.from({ length: catalogIndex.count }, (_, i) => i);
+    displayStats(catalogIndex.count, catalogIndex.categories.length, catalogIndex.cachechk || '');
+    showAppList();
+}
+
+// 查询词切分：连续的字母数字为一个词，中日韩文字取相邻两字（单字时取单字）
+function queryTokens(keyword) {
+    const normalized = keyword.normalize('NFKC').toLowerCase();
+    const tokens = [];
+    (normalized.match(WORD_PATTERN) || []).forEach(word => {
+        if (CJK_PATTERN.test(word) && word.length > 1) {
+            for (let i = 0; i < word.length - 1; i++) {
+                tokens.push(word.slice(i, i + 2));
+            }
+        } else {
+            tokens.push(word);
+        }
+    });
+    return tokens;
+}
+
+// 在有序词项表中按前缀查找，返回匹配的应用序号
+function lookupPrefix(prefix) {
+    const tokens = catalogIndex.tokens;
+    let low = 0;
+    let high = tokens.length;
+    while (low < high) {
+        const mid = (low + high) >> 1;
+        if (tokens[mid] < prefix) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+
+    const ids = new Set();
+    for (let i = low; i < tokens.length && tokens[i].startsWith(prefix); i++) {
+        catalogIndex.postings[i].forEach(id => ids.add(id));
+    }
+    return ids;
+}
+
+// 使用倒排索引搜索，多个词项取交集
+function searchCatalog(keyword) {
+    const tokens = queryTokens(keyword);
+    if (tokens.length === 0) {
+        return [];
+    }
+
+    let result = null;
+    for (const token of tokens) {
+        const ids = lookupPrefix(token);
+        result = result === null ? ids : new Set([...result].filter(id => ids.has(id)));
+        if (result.size === 0) {
+            break;
+        }
+    }
+    return [...result].sort((a, b) => a - b);
+}
+
+// 加载分片，同一分片只请求一次
+function loadShard(shardIndex) {
+    if (!shardCache.has(shardIndex)) {
+        const url = new URL(catalogIndex.shards[shardIndex], catalogBaseUrl);
+        const request = fetch(url, { method: 'GET', mode: 'cors' }).then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP错误: ${response.status}`);
+            }
+            return response.json();
+        });
+        // 请求失败时允许重试
+        request.catch(() => shardCache.delete(shardIndex));
+        shardCache.set(shardIndex, request);
+    }
+    return shardCache.get(shardIndex);
+}
+
+// 根据应用序号获取应用数据
+async function getCatalogApp(id) {
+    const shardSize = catalogIndex.shardSize;
+    const shard = await loadShard(Math.floor(id / shardSize));
+    return shard[id % shardSize];
+}
+
+// 渲染目录索引模式的当前页
+async function renderCatalogPage(ids, startIndex) {
+    const seq = ++renderSeq;
+    try {
+        const apps = await Promise.all(ids.map(getCatalogApp));
+        // 加载期间已切换到其他页或重新搜索
+        if (seq !== renderSeq) {
+            return;
+        }
+        appsGrid.innerHTML = '';
+        apps.forEach((app, index) => {
+            appsGrid.appendChild(createAppCardFromData(app, startIndex + index));
+        });
+    } catch (error) {
+        showError('加载应用数据失败：' + error.message);
+    }
+}
+
 // 执行搜索
 function performSearch(keyword) {
     if (!keyword.trim()) {
         filteredItems = [...allItems];
         searchInfo.style.display = 'none';
         clearSearchBtn.style.display = 'none';
+    } else if (catalogIndex) {
+        filteredItems = searchCatalog(keyword);
+
+        // 显示搜索结果信息
+        searchKeyword.textContent = keyword;
+        searchCount.textContent = filteredItems.length;
+        searchInfo.style.display = 'block';
+        clearSearchBtn.style.display = 'block';
     } else {
         const lowerKeyword = keyword.toLowerCase();
         filteredItems = allItems.filter(item => {
@@ -212,6 +366,11 @@ function renderCurrentPage() {
     const startIndex = (currentPage - 1) * itemsPerPage;
     const endIndex = startIndex + itemsPerPage;
     const currentItems = filteredItems.slice(startIndex, endIndex);
+
+    if (catalogIndex) {
+        renderCatalogPage(currentItems, startIndex);
+        return;
+    }
     
     // 清空现有内容
     appsGrid.innerHTML = '';
@@ -405,15 +564,9 @@ function formatDate(dateString) {
 }
 
 // 显示统计信息
-function displayStats(items, cachechk) {
-    const categories = new Set();
-    Array.from(items).forEach(item => {
-        const category = getElementText(item, 'category');
-        if (category) categories.add(category);
-    });
-
-    document.getElementById('totalCount').textContent = items.length;
-    document.getElementById('categories').textContent = categories.size;
+function displayStats(totalCount, categoryCount, cachechk) {
+    document.getElementById('totalCount').textContent = totalCount;
+    document.getElementById('categories').textContent = categoryCount;
     
     if (cachechk) {
         const formattedDate = cachechk.replace(/(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})/, '$1-$2-$3 $4:$5');
@@ -507,8 +660,13 @@ parseBtn.addEventListener('click', async () => {
     parseBtn.disabled = true;
 
     try {
-        const xmlText = await fetchXML(url);
-        parseAndDisplayApps(xmlText);
+        // 以.json结尾的网址视为构建生成的目录索引
+        if (new URL(url).pathname.endsWith('.json')) {
+            await loadCatalog(url);
+        } else {
+            const xmlText = await fetchXML(url);
+            parseAndDisplayApps(xmlText);
+        }
     } catch (error) {
         showError(error.message);
     } finally {
@@ -548,29 +706,47 @@ document.addEventListener('click', (e) => {
     }
 });
 
+// 从XML的<item>元素读取卡片所需的应用数据
+function appDataFromItem(item) {
+    const app = {};
+    ['name', 'version', 'description', 'category', 'type', 'maintainer', 'developer',
+        'publishedDate', 'fwVersion', 'icon80', 'icon100'].forEach(field => {
+        app[field] = getElementText(item, field);
+    });
+    app.platform = Array.from(item.getElementsByTagName('platform')).map(platform => ({
+        platformID: getElementText(platform, 'platformID'),
+        location: getElementText(platform, 'location')
+    }));
+    return app;
+}
+
 // 修改createAppCard函数中的下载按钮处理
 function createAppCardFixed(item, index) {
-    const name = getElementText(item, 'name');
-    const version = getElementText(item, 'version');
-    const description = getElementText(item, 'description');
-    const category = getElementText(item, 'category');
-    const type = getElementText(item, 'type');
-    const maintainer = getElementText(item, 'maintainer');
-    const developer = getElementText(item, 'developer');
-    const publishedDate = getElementText(item, 'publishedDate');
-    const fwVersion = getElementText(item, 'fwVersion');
+    return createAppCardFromData(appDataFromItem(item), index);
+}
+
+// 根据应用数据创建应用卡片（XML和目录索引两种模式共用）
+function createAppCardFromData(app, index) {
+    const name = app.name || '';
+    const version = app.version || '';
+    const description = app.description || '';
+    const category = app.category || '';
+    const type = app.type || '';
+    const maintainer = app.maintainer || '';
+    const developer = app.developer || '';
+    const publishedDate = app.publishedDate || '';
+    const fwVersion = app.fwVersion || '';
     
     // 获取图标，优先使用100x100，如果没有则使用80x80
-    const icon100 = getElementText(item, 'icon100');
-    const icon80 = getElementText(item, 'icon80');
+    const icon100 = app.icon100 || '';
+    const icon80 = app.icon80 || '';
     const icon = icon100 || icon80 || `https://picsum.photos/seed/${name}/100/100.jpg`;
     
     // 获取平台信息
     const platforms = [];
-    const platformElements = item.getElementsByTagName('platform');
-    Array.from(platformElements).forEach(platform => {
-        const platformID = getElementText(platform, 'platformID');
-        const location = getElementText(platform, 'location');
+    (app.platform || []).forEach(platform => {
+        const platformID = platform.platformID;
+        const location = platform.location;
         if (platformID && location) {
             platforms.push({ id: platformID, url: location });
         }